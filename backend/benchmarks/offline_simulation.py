@@ -0,0 +1,170 @@
+"""
+Offline end-to-end driver for the GD simulator.
+
+Runs start_simulation -> next_round (with one human interrupt) ->
+submit_human_input -> end_discussion against the stub providers, so the
+orchestration overhead can be measured and regressed without network access.
+
+Usage (from backend/):
+    python benchmarks/offline_simulation.py --sims 10 --rounds 2 --agents 4
+
+The app is served by an in-process uvicorn server on a free local port and
+driven with httpx (both must be installed), so SSE events arrive as they are produced. The SQLite
+database is created in a temporary directory and thrown away afterwards.
+"""
+import argparse
+import concurrent.futures
+import json
+import os
+import statistics
+import sys
+import socket
+import tempfile
+import threading
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentile(values, p):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+def serve_in_background(app):
+    """Start uvicorn on a free port in a daemon thread; returns the base URL."""
+    import uvicorn
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    return f"http://127.0.0.1:{port}"
+
+
+def run_simulation(client, rounds, agents, ack_playback=False):
+    """Drive one full discussion; returns per-phase timings in seconds."""
+    timings = {"first_event": [], "round": [], "event_bytes": [], "audio_fetch": [], "interrupt": [], "handoff": []}
+
+    started = time.perf_counter()
+    sim = client.post("/start_simulation", json={
+        "topic": "Remote work for students",
+        "num_agents": agents,
+        "rounds": rounds,
+    }).json()
+    sim_id = sim["simulation_id"]
+    timings["start"] = time.perf_counter() - started
+
+    for round_number in range(rounds):
+        round_started = time.perf_counter()
+        first_event = None
+        interrupted = False
+        interrupt_sent = submit_sent = None
+        with client.stream("POST", f"/next_round/{sim_id}") as response:
+            for line in response.iter_lines():
+                if not line.startswith("data: "):
+                    continue
+                event = json.loads(line[len("data: "):])
+                if first_event is None and event["type"] == "response":
+                    first_event = time.perf_counter() - round_started
+                if event["type"] == "response":
+                    timings["event_bytes"].append(len(line))
+                    # Fetch the clip like the browser would
+                    if event.get("audio_url"):
+                        fetch_started = time.perf_counter()
+                        client.get(event["audio_url"]).raise_for_status()
+                        timings["audio_fetch"].append(time.perf_counter() - fetch_started)
+                        if ack_playback:
+                            # Pretend playback ended at once; the server should move on immediately
+                            client.post(f"/playback_finished/{sim_id}", params={"utterance_id": event["utterance_id"]})
+                # Interrupt once, during the first agent of the first round
+                if round_number == 0 and event["type"] == "agent_speaking" and not interrupted:
+                    interrupt_sent = time.perf_counter()
+                    client.post(f"/reserve_interrupt/{sim_id}")
+                    interrupted = True
+                elif event["type"] == "human_start":
+                    if interrupt_sent is not None:
+                        timings["interrupt"].append(time.perf_counter() - interrupt_sent)
+                    submit_sent = time.perf_counter()
+                    client.post(
+                        f"/submit_human_input/{sim_id}",
+                        params={"text": "I think flexible schedules help, but only with clear goals."}
+                    )
+                elif event["type"] == "human_response" and submit_sent is not None:
+                    timings["handoff"].append(time.perf_counter() - submit_sent)
+        timings["first_event"].append(first_event or 0.0)
+        timings["round"].append(time.perf_counter() - round_started)
+
+    end_started = time.perf_counter()
+    result = client.post(f"/end_discussion/{sim_id}").json()
+    timings["end"] = time.perf_counter() - end_started
+    timings["ok"] = "error" not in result
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sims", type=int, default=10, help="number of simulations")
+    parser.add_argument("--concurrency", type=int, default=4, help="simulations run at once")
+    parser.add_argument("--rounds", type=int, default=2)
+    parser.add_argument("--agents", type=int, default=4)
+    parser.add_argument("--llm-latency-ms", default="0,0", help="stub LLM latency 'mean,jitter'")
+    parser.add_argument("--ack-playback", action="store_true",
+                        help="ack each clip via /playback_finished (use with PLAYBACK_SYNC_SCALE=1)")
+    args = parser.parse_args()
+
+    os.environ.setdefault("GD_PROVIDERS", "stub")
+    os.environ.setdefault("PLAYBACK_SYNC_SCALE", "0")
+    os.environ.setdefault("LLM_CACHE_ENABLED", "0")
+    os.environ.setdefault("API_KEY", "offline")
+    os.environ["STUB_LLM_LATENCY_MS"] = args.llm_latency_ms
+
+    os.chdir(tempfile.mkdtemp(prefix="gd_bench_"))
+    sys.path.insert(0, BACKEND_DIR)
+
+    import_started = time.perf_counter()
+    import database
+    import models
+    models.Base.metadata.create_all(bind=database.engine)
+    from utils import gd_simulator
+    import_time = time.perf_counter() - import_started
+
+    import httpx
+    client = httpx.Client(base_url=serve_in_background(gd_simulator.app), timeout=300)
+    wall_started = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(pool.map(
+            lambda _: run_simulation(client, args.rounds, args.agents, args.ack_playback), range(args.sims)
+        ))
+    wall = time.perf_counter() - wall_started
+
+    rounds = [t for r in results for t in r["round"]]
+    first_events = [t for r in results for t in r["first_event"]]
+    ends = [r["end"] for r in results]
+    event_bytes = [b for r in results for b in r["event_bytes"]]
+    audio_fetches = [t for r in results for t in r["audio_fetch"]]
+    interrupts = [t for r in results for t in r["interrupt"]]
+    handoffs = [t for r in results for t in r["handoff"]]
+
+    print(f"\n📊 {args.sims} simulations x {args.rounds} rounds x {args.agents} agents "
+          f"(concurrency {args.concurrency}, stub LLM latency {args.llm_latency_ms} ms)")
+    print(f"  import + setup:      {import_time * 1000:8.1f} ms")
+    print(f"  wall time:           {wall * 1000:8.1f} ms")
+    print(f"  round      p50/p95:  {percentile(rounds, 50) * 1000:8.1f} / {percentile(rounds, 95) * 1000:.1f} ms")
+    print(f"  first turn p50/p95:  {percentile(first_events, 50) * 1000:8.1f} / {percentile(first_events, 95) * 1000:.1f} ms")
+    print(f"  response event mean: {statistics.mean(event_bytes) if event_bytes else 0:8.0f} bytes")
+    print(f"  audio fetch p50/p95: {percentile(audio_fetches, 50) * 1000:8.1f} / {percentile(audio_fetches, 95) * 1000:.1f} ms")
+    print(f"  interrupt→human_start p50/p95: {percentile(interrupts, 50) * 1000:8.1f} / {percentile(interrupts, 95) * 1000:.1f} ms")
+    print(f"  submit→human_response p50/p95: {percentile(handoffs, 50) * 1000:8.1f} / {percentile(handoffs, 95) * 1000:.1f} ms")
+    print(f"  end_discussion mean: {statistics.mean(ends) * 1000:8.1f} ms")
+    print(f"  failed evaluations:  {sum(not r['ok'] for r in results)}")
+    print(f"  metrics: {json.dumps(client.get('/metrics').json())}")
+
+
+if __name__ == "__main__":
+    main()
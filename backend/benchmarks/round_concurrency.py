@@ -0,0 +1,183 @@
+"""
+Load test: how many simulations can stream a round at the same time.
+
+For each concurrency level N, starts N simulations and opens all N
+/next_round streams at once against a fresh uvicorn server (stub providers,
+real playback waits, no playback acks), then reports how long the batch took,
+time to each stream's first agent turn, how many rounds were streaming at the
+same moment, and the latency of a plain endpoint (/simulation_status) probed
+while the rounds run. A round engine that holds a worker thread per stream
+stalls once N passes the threadpool size; one that doesn't keeps the batch
+time close to a single round's.
+
+The LLM gateway and speculation limits are raised for the stub (see
+SERVER_ENV) so the round engine, not the fake model, is what's measured. To
+compare against another revision, check it out (e.g. `git worktree add`) and
+point --backend-dir at its backend/ directory.
+
+Usage (from backend/):
+    python benchmarks/round_concurrency.py --levels 10,40,80,160,320
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+from offline_simulation import percentile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SERVER_ENV = {
+    "GD_PROVIDERS": "stub",
+    "API_KEY": "offline",
+    "LLM_CACHE_ENABLED": "0",
+    "LLM_MAX_CONCURRENCY": "1024",
+    "LLM_RPM": "1000000",
+    "LLM_TPM": "1000000000",
+    "SPECULATION_WORKERS": "64",
+    "MODEL_LOAD_MODE": "lazy",
+}
+
+SERVER_MAIN = """
+import sys, uvicorn
+import database, models
+models.Base.metadata.create_all(bind=database.engine)
+from utils.gd_simulator import app
+uvicorn.run(app, host="127.0.0.1", port=int(sys.argv[1]), log_level="warning", backlog=4096)
+"""
+
+
+def start_server(backend_dir, env):
+    """Run the app in its own process and working directory; returns (process, base URL)."""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    proc = subprocess.Popen(
+        [sys.executable, "-c", SERVER_MAIN, str(port)],
+        cwd=tempfile.mkdtemp(prefix="gd_load_"),
+        env=dict(os.environ, PYTHONPATH=backend_dir, **env),
+        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+    )
+    deadline = time.monotonic() + 120
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(proc.stderr.read().decode(errors="replace").strip().splitlines()[-1])
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.2):
+                return proc, f"http://127.0.0.1:{port}"
+        except OSError:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError("server did not start")
+
+
+async def run_round(client, sim_id, live, stats):
+    """Stream one round; returns (seconds to first agent turn, seconds to complete, completed)."""
+    started = time.perf_counter()
+    first, completed, streaming = None, False, False
+    try:
+        async with client.stream("POST", f"/next_round/{sim_id}") as response:
+            async for line in response.aiter_lines():
+                if not line.startswith("data: "):
+                    continue
+                event = json.loads(line[len("data: "):])
+                if event["type"] == "response" and first is None:
+                    first = time.perf_counter() - started
+                    streaming = True
+                    live[0] += 1
+                    stats["peak"] = max(stats["peak"], live[0])
+                elif event["type"] == "complete":
+                    completed = True
+    except Exception as e:
+        stats["errors"].append(f"{type(e).__name__}: {e}")
+    finally:
+        if streaming:
+            live[0] -= 1
+    return first, time.perf_counter() - started, completed
+
+
+async def probe(client, sim_id, done, latencies):
+    """Time a cheap threadpool-served endpoint until the rounds finish."""
+    while not done.is_set():
+        t = time.perf_counter()
+        try:
+            await client.get(f"/simulation_status/{sim_id}")
+            latencies.append(time.perf_counter() - t)
+        except Exception:
+            latencies.append(float("inf"))
+        await asyncio.sleep(0.1)
+
+
+async def run_level(base_url, n, agents, timeout):
+    import httpx
+
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+        sim_ids = []
+        for _ in range(n):
+            sim = (await client.post("/start_simulation", json={
+                "topic": "Remote work for students", "num_agents": agents, "rounds": 1,
+            })).json()
+            sim_ids.append(sim["simulation_id"])
+
+        live, stats, probes = [0], {"peak": 0, "errors": []}, []
+        done = asyncio.Event()
+        prober = asyncio.create_task(probe(client, sim_ids[0], done, probes))
+        started = time.perf_counter()
+        results = await asyncio.gather(*(run_round(client, sim_id, live, stats) for sim_id in sim_ids))
+        wall = time.perf_counter() - started
+        done.set()
+        await prober
+        metrics = (await client.get("/metrics")).json()
+
+    firsts = [r[0] for r in results if r[0] is not None]
+    rounds = [r[1] for r in results if r[2]]
+    return {
+        "wall": wall,
+        "first_p50": percentile(firsts, 50), "first_p95": percentile(firsts, 95),
+        "round_p95": percentile(rounds, 95),
+        "completed": sum(r[2] for r in results),
+        "peak": stats["peak"],
+        "probe_p95": percentile(probes, 95), "probe_max": max(probes, default=0.0),
+        "errors": stats["errors"],
+        "engine": metrics.get("rounds"),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--levels", default="10,40,80,160,320", help="concurrent simulations per batch")
+    parser.add_argument("--agents", type=int, default=3)
+    parser.add_argument("--llm-latency-ms", default="300,50", help="stub LLM latency 'mean,jitter'")
+    parser.add_argument("--playback-scale", default="0.25",
+                        help="PLAYBACK_SYNC_SCALE for the server (how long each turn waits for playback)")
+    parser.add_argument("--timeout", type=float, default=600, help="per-request client timeout")
+    parser.add_argument("--backend-dir", default=BACKEND_DIR, help="backend/ directory of the revision to test")
+    args = parser.parse_args()
+
+    env = dict(SERVER_ENV, STUB_LLM_LATENCY_MS=args.llm_latency_ms, PLAYBACK_SYNC_SCALE=args.playback_scale)
+    print(f"\n📊 Concurrent rounds, {args.agents} agents each (stub LLM {args.llm_latency_ms} ms, "
+          f"playback scale {args.playback_scale}), {os.path.abspath(args.backend_dir)}")
+    print(f"  {'sims':>5} {'wall':>8} {'1st turn p50/p95':>17} {'round p95':>10} {'peak live':>10} "
+          f"{'status p95/max':>15} {'done':>6}")
+    for n in [int(level) for level in args.levels.split(",")]:
+        # A fresh server per level, so one batch's backlog can't slow the next
+        proc, base_url = start_server(os.path.abspath(args.backend_dir), env)
+        try:
+            r = asyncio.run(run_level(base_url, n, args.agents, args.timeout))
+        finally:
+            proc.kill()
+            proc.wait()
+        print(f"  {n:>5} {r['wall']:7.1f}s {r['first_p50']:7.1f}s /{r['first_p95']:6.1f}s {r['round_p95']:9.1f}s "
+              f"{r['peak']:>10} {r['probe_p95'] * 1000:7.0f}/{r['probe_max'] * 1000:.0f}ms {r['completed']:>3}/{n}")
+        if r["errors"]:
+            print(f"        {len(r['errors'])} stream error(s), e.g. {r['errors'][0]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Startup benchmark: app import time and first-request latency per MODEL_LOAD_MODE.
+
+Each mode runs in a fresh interpreter that imports the app, then times the
+first /health call, the first text-only request (/start_simulation) and how
+long until every model has finished loading (ready or failed), all measured
+from the start of the import. Uses the live providers by default, since
+those are the ones with models to load.
+
+Usage (from backend/):
+    python benchmarks/startup_latency.py --modes eager,background,lazy
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def child(settle_timeout):
+    """Runs inside the fresh interpreter; prints one JSON line of timings."""
+    os.chdir(tempfile.mkdtemp(prefix="gd_startup_"))
+    sys.path.insert(0, BACKEND_DIR)
+
+    started = time.perf_counter()
+    import database
+    import models
+    models.Base.metadata.create_all(bind=database.engine)
+    from utils import gd_simulator
+    timings = {"import": time.perf_counter() - started}
+
+    from fastapi.testclient import TestClient
+    client = TestClient(gd_simulator.app)
+
+    t = time.perf_counter()
+    health = client.get("/health").json()
+    timings["first_health"] = time.perf_counter() - t
+
+    t = time.perf_counter()
+    client.post("/start_simulation", json={"topic": "Startup benchmark", "num_agents": 2, "rounds": 1})
+    timings["first_text_request"] = time.perf_counter() - t
+
+    # Lazy mode leaves models pending until a voice request needs them
+    waiting = ("loading",) if os.getenv("MODEL_LOAD_MODE") == "lazy" else ("pending", "loading")
+
+    def unsettled(health):
+        return [name for name, m in health["models"].items() if m["state"] in waiting]
+
+    deadline = time.perf_counter() + settle_timeout
+    while unsettled(health) and time.perf_counter() < deadline:
+        time.sleep(0.1)
+        health = client.get("/health").json()
+    settled = not unsettled(health) and not health["models_loading"]
+    timings["models_settled"] = time.perf_counter() - started if settled else None
+    timings["models"] = {name: m["state"] for name, m in health["models"].items()}
+    print("RESULT " + json.dumps(timings))
+
+
+def run_mode(mode, args):
+    env = dict(os.environ, MODEL_LOAD_MODE=mode)
+    if args.stub:
+        env.setdefault("GD_PROVIDERS", "stub")
+    started = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child", "--settle-timeout", str(args.settle_timeout)],
+        env=env, capture_output=True, text=True, timeout=args.settle_timeout + 600
+    )
+    total = time.perf_counter() - started
+    for line in proc.stdout.splitlines():
+        if line.startswith("RESULT "):
+            result = json.loads(line[len("RESULT "):])
+            result["process"] = total
+            return result
+    raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "no result")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--modes", default="eager,background,lazy")
+    parser.add_argument("--stub", action="store_true", help="use the offline stub providers")
+    parser.add_argument("--settle-timeout", type=float, default=300, help="max seconds to wait for models")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.settle_timeout)
+        return
+
+    def ms(value):
+        return f"{value * 1000:9.0f}ms" if value is not None else f"{'-':>11}"
+
+    print("\n📊 Startup latency (from start of import)")
+    print(f"  {'mode':<11} {'import':>11} {'1st health':>11} {'1st text':>11} {'models':>11}  states")
+    for mode in args.modes.split(","):
+        mode = mode.strip()
+        try:
+            r = run_mode(mode, args)
+        except Exception as e:
+            print(f"  {mode:<11} failed: {e}")
+            continue
+        states = ", ".join(f"{k}={v}" for k, v in r["models"].items()) or "none"
+        print(f"  {mode:<11} {ms(r['import'])} {ms(r['first_health'])} {ms(r['first_text_request'])} "
+              f"{ms(r['models_settled'])}  {states}")
+
+
+if __name__ == "__main__":
+    main()
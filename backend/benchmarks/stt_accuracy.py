@@ -0,0 +1,140 @@
+"""
+STT accuracy/latency benchmark: Whisper engines, model sizes and beam sizes.
+
+Transcribes every recording in the fixture directory (<name>.wav, or any
+format FFmpeg reads, next to a <name>.txt reference transcript) with each
+configuration and reports load + warm-up time, real-time factor (processing
+time / audio length, lower is faster) and word error rate. Configurations
+whose engine isn't installed are reported and skipped.
+
+Recordings aren't checked in; record the reference sentences yourself or
+synthesize them with a local TTS engine:
+    python benchmarks/stt_accuracy.py --make-fixtures --tts piper
+
+Usage (from backend/):
+    python benchmarks/stt_accuracy.py --configs openai:small,faster:small:int8,faster:base:int8 --beams 1,5
+"""
+import argparse
+import glob
+import os
+import re
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURES_DIR = os.path.join(BACKEND_DIR, "benchmarks", "fixtures", "stt")
+AUDIO_EXTENSIONS = (".wav", ".webm", ".ogg", ".mp3", ".m4a", ".flac")
+
+
+def normalize_words(text):
+    return re.sub(r"[^a-z0-9' ]+", " ", text.lower()).split()
+
+
+def word_errors(reference, hypothesis):
+    """Word-level edit distance (substitutions + deletions + insertions)."""
+    ref, hyp = normalize_words(reference), normalize_words(hypothesis)
+    row = list(range(len(hyp) + 1))
+    for i, r in enumerate(ref, 1):
+        prev, row[0] = row[0], i
+        for j, h in enumerate(hyp, 1):
+            prev, row[j] = row[j], min(row[j] + 1, row[j - 1] + 1, prev + (r != h))
+    return row[-1], len(ref)
+
+
+def load_fixtures(stt, fixtures_dir):
+    fixtures = []
+    for ref_path in sorted(glob.glob(os.path.join(fixtures_dir, "*.txt"))):
+        stem = ref_path[:-len(".txt")]
+        audio_path = next((stem + ext for ext in AUDIO_EXTENSIONS if os.path.exists(stem + ext)), None)
+        if audio_path is None:
+            continue
+        with open(audio_path, "rb") as f:
+            pcm = stt.decode_audio(f.read())
+        if pcm is None:
+            print(f"  skipping {os.path.basename(audio_path)}: could not decode")
+            continue
+        with open(ref_path, encoding="utf-8") as f:
+            reference = f.read().strip()
+        fixtures.append((os.path.basename(stem), pcm.astype("float32") / 32768.0, reference))
+    return fixtures
+
+
+def make_fixtures(fixtures_dir, tts_kind):
+    """Synthesize a recording for every reference transcript that doesn't have one yet."""
+    from utils.providers import create_tts_provider
+    provider = create_tts_provider(tts_kind)
+    extension = ".wav" if provider.mime_type == "audio/wav" else ".mp3"
+    for ref_path in sorted(glob.glob(os.path.join(fixtures_dir, "*.txt"))):
+        stem = ref_path[:-len(".txt")]
+        if any(os.path.exists(stem + ext) for ext in AUDIO_EXTENSIONS):
+            continue
+        with open(ref_path, encoding="utf-8") as f:
+            audio = provider.synthesize(f.read().strip(), "Agent 1")
+        with open(stem + extension, "wb") as f:
+            f.write(audio)
+        print(f"  wrote {os.path.basename(stem + extension)} ({provider.name})")
+
+
+def bench(stt, backend, size, compute_type, beams, fixtures):
+    started = time.perf_counter()
+    model = stt.create_whisper_model(backend, size, compute_type)
+    stt.warm_up_whisper(model, backend)
+    load_seconds = time.perf_counter() - started
+
+    audio_seconds = sum(len(audio) for _, audio, _ in fixtures) / stt.SAMPLE_RATE
+    results = []
+    for beam in beams:
+        processing, errors, words = 0.0, 0, 0
+        for _, audio, reference in fixtures:
+            t = time.perf_counter()
+            text = stt.run_whisper(model, backend, audio, beam_size=beam)
+            processing += time.perf_counter() - t
+            e, n = word_errors(reference, text)
+            errors, words = errors + e, words + n
+        results.append((beam, processing / audio_seconds, errors / max(1, words)))
+    return load_seconds, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--configs", default="openai:small,faster:small:int8,faster:base:int8,faster:tiny:int8",
+                        help="comma-separated backend:size[:compute_type]")
+    parser.add_argument("--beams", default="1,5", help="beam sizes to try per config")
+    parser.add_argument("--fixtures", default=FIXTURES_DIR)
+    parser.add_argument("--make-fixtures", action="store_true", help="synthesize missing recordings and exit")
+    parser.add_argument("--tts", default="piper", help="TTS provider for --make-fixtures")
+    args = parser.parse_args()
+
+    sys.path.insert(0, BACKEND_DIR)
+    from utils import stt
+
+    if args.make_fixtures:
+        make_fixtures(args.fixtures, args.tts)
+        return
+
+    stt.ffmpeg_available = stt.setup_ffmpeg()
+    fixtures = load_fixtures(stt, args.fixtures)
+    if not fixtures:
+        print(f"No recordings found in {args.fixtures} (see --make-fixtures)")
+        return
+    audio_seconds = sum(len(audio) for _, audio, _ in fixtures) / stt.SAMPLE_RATE
+    beams = [int(b) for b in args.beams.split(",")]
+
+    print(f"\n📊 STT accuracy, {len(fixtures)} recordings, {audio_seconds:.1f}s of audio")
+    print(f"  {'config':<22} {'load+warm':>10} {'beam':>5} {'RTF':>7} {'WER':>7}")
+    for config in args.configs.split(","):
+        parts = config.strip().split(":")
+        backend, size = parts[0], parts[1] if len(parts) > 1 else stt.WHISPER_MODEL
+        compute_type = parts[2] if len(parts) > 2 else stt.WHISPER_COMPUTE_TYPE
+        label = config.strip()
+        try:
+            load_seconds, results = bench(stt, backend, size, compute_type, beams, fixtures)
+        except Exception as e:
+            print(f"  {label:<22} unavailable: {e}")
+            continue
+        for beam, rtf, wer in results:
+            print(f"  {label:<22} {load_seconds:9.1f}s {beam:>5} {rtf:7.3f} {wer * 100:6.1f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+TTS latency benchmark: local engines (Piper, espeak-ng) against gTTS.
+
+Synthesizes the same short agent-style sentences with each provider and
+reports startup/warm-up time, per-sentence p50/p95 latency and clip size.
+Providers that can't start (missing binary, voice files or network) are
+reported and skipped.
+
+Usage (from backend/):
+    python benchmarks/tts_latency.py --providers gtts,piper,espeak --runs 3
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SENTENCES = [
+    "Honestly, I think remote work gives students more control over their time.",
+    "To be fair, not everyone has a quiet place to study at home.",
+    "I agree, but we should talk about how teams stay connected.",
+    "That's a good point.",
+    "I feel like schools could offer both options and let students choose what works best for them.",
+]
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+def bench(provider_cls, runs):
+    started = time.perf_counter()
+    provider = provider_cls()
+    startup = time.perf_counter() - started
+
+    latencies, sizes = [], []
+    for run in range(runs):
+        for i, sentence in enumerate(SENTENCES):
+            voice = f"Agent {i % 4 + 1}"
+            t = time.perf_counter()
+            audio = provider.synthesize(sentence, voice)
+            latencies.append(time.perf_counter() - t)
+            sizes.append(len(audio))
+    return startup, latencies, sizes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--providers", default="gtts,piper,espeak,tone")
+    parser.add_argument("--runs", type=int, default=3, help="passes over the sentence set")
+    args = parser.parse_args()
+
+    sys.path.insert(0, BACKEND_DIR)
+    from utils.providers import EspeakTTS, GTTSProvider, PiperTTS, ToneTTS
+    classes = {"gtts": GTTSProvider, "piper": PiperTTS, "espeak": EspeakTTS, "tone": ToneTTS}
+
+    print(f"\n📊 TTS latency, {args.runs} x {len(SENTENCES)} sentences")
+    print(f"  {'provider':<8} {'startup':>10} {'first':>10} {'p50':>10} {'p95':>10} {'avg clip':>10}")
+    for name in args.providers.split(","):
+        name = name.strip()
+        if name not in classes:
+            print(f"  {name:<8} unknown provider")
+            continue
+        try:
+            startup, latencies, sizes = bench(classes[name], args.runs)
+        except Exception as e:
+            print(f"  {name:<8} unavailable: {e}")
+            continue
+        print(f"  {name:<8} {startup * 1000:8.1f}ms {latencies[0] * 1000:8.1f}ms "
+              f"{percentile(latencies, 50) * 1000:8.1f}ms {percentile(latencies, 95) * 1000:8.1f}ms "
+              f"{statistics.mean(sizes) / 1024:8.1f}KB")
+
+
+if __name__ == "__main__":
+    main()
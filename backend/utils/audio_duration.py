@@ -0,0 +1,85 @@
+import io
+import wave
+
+# MPEG audio frame header tables (ISO 11172-3 / 13818-3), layer III only
+_BITRATES_KBPS = {
+    1: [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],   # MPEG-1
+    2: [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],       # MPEG-2 / 2.5
+}
+_SAMPLE_RATES = {
+    3: [44100, 48000, 32000],  # MPEG-1
+    2: [22050, 24000, 16000],  # MPEG-2
+    0: [11025, 12000, 8000],   # MPEG-2.5
+}
+
+
+def _skip_id3(data):
+    """Offset of the first byte after a leading ID3v2 tag."""
+    if len(data) >= 10 and data[:3] == b"ID3":
+        size = (data[6] & 0x7F) << 21 | (data[7] & 0x7F) << 14 | (data[8] & 0x7F) << 7 | (data[9] & 0x7F)
+        footer = 10 if data[5] & 0x10 else 0
+        return 10 + size + footer
+    return 0
+
+
+def mp3_duration(data):
+    """
+    Exact duration of an MP3 (layer III) stream by walking its frame headers.
+    Works for concatenated clips (e.g. joined sentence chunks) since every
+    frame is counted. Returns seconds, or None if no frames were found.
+    """
+    pos = _skip_id3(data)
+    end = len(data)
+    seconds = 0.0
+    frames = 0
+    while pos + 4 <= end:
+        b1, b2 = data[pos + 1], data[pos + 2]
+        if data[pos] != 0xFF or (b1 & 0xE0) != 0xE0:
+            # Not at a frame: resync (also skips ID3 tags between joined clips)
+            if data[pos:pos + 3] == b"ID3":
+                pos += max(1, _skip_id3(data[pos:pos + 10]))
+            else:
+                pos += 1
+            continue
+        version = (b1 >> 3) & 0x03    # 3 = MPEG-1, 2 = MPEG-2, 0 = MPEG-2.5
+        layer = (b1 >> 1) & 0x03      # 1 = layer III
+        bitrate_index = (b2 >> 4) & 0x0F
+        rate_index = (b2 >> 2) & 0x03
+        padding = (b2 >> 1) & 0x01
+        if version == 1 or layer != 1 or bitrate_index in (0, 15) or rate_index == 3:
+            pos += 1
+            continue
+        sample_rate = _SAMPLE_RATES[version][rate_index]
+        bitrate = _BITRATES_KBPS[1 if version == 3 else 2][bitrate_index] * 1000
+        samples = 1152 if version == 3 else 576
+        frame_length = samples // 8 * bitrate // sample_rate + padding
+        if frame_length < 4:
+            pos += 1
+            continue
+        seconds += samples / sample_rate
+        frames += 1
+        pos += frame_length
+    return seconds if frames else None
+
+
+def wav_duration(data):
+    """Counts the frames actually present: piped WAVs (espeak-ng --stdout) carry a bogus length."""
+    try:
+        with wave.open(io.BytesIO(data), "rb") as wf:
+            rate = wf.getframerate()
+            frame_size = wf.getsampwidth() * wf.getnchannels()
+            frames = len(wf.readframes(wf.getnframes())) // frame_size if frame_size else 0
+            return frames / rate if rate else None
+    except (wave.Error, EOFError):
+        return None
+
+
+def clip_duration(data, mime_type):
+    """Playback length of a clip in seconds, or None if it can't be determined."""
+    if not data:
+        return None
+    if mime_type in ("audio/wav", "audio/x-wav", "audio/wave"):
+        return wav_duration(data)
+    if mime_type in ("audio/mpeg", "audio/mp3"):
+        return mp3_duration(data)
+    return None
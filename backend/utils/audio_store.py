@@ -0,0 +1,236 @@
+import collections
+import hashlib
+import itertools
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+
+# -------------------------
+# ⚙️ Audio Store Settings
+# -------------------------
+AUDIO_STORE_MAX_BYTES = int(os.getenv("AUDIO_STORE_MAX_BYTES", str(128 * 1024 * 1024)))
+AUDIO_STORE_TTL = float(os.getenv("AUDIO_STORE_TTL", str(2 * 3600)))  # Seconds a clip stays fetchable
+AUDIO_STORE_DIR = os.getenv("AUDIO_STORE_DIR", "./gd_audio")  # Clips shared between workers (SIMULATION_STORE=sqlite)
+
+_SAFE_ID = re.compile(r"[\w-]+")  # Ids that are safe to use as path components
+
+
+class AudioClip:
+    __slots__ = ("sim_id", "utterance_id", "data", "mime_type", "etag", "stored_at")
+
+    def __init__(self, sim_id, utterance_id, data, mime_type, stored_at=None):
+        self.sim_id = sim_id
+        self.utterance_id = utterance_id
+        self.data = data
+        self.mime_type = mime_type
+        self.etag = '"' + hashlib.sha1(data).hexdigest() + '"'
+        self.stored_at = stored_at or time.time()
+
+
+class AudioStore:
+    """
+    Agent clips held as raw bytes and served from /audio/{sim_id}/{utterance_id}.
+
+    SSE events only carry the clip URL, so the browser fetches and decodes the
+    audio in parallel with the event stream. Clips are bounded by total bytes
+    (least recently fetched go first) and by age.
+
+    With `shared_dir` (several workers on one shared simulation store), each
+    clip is also written to `shared_dir/<sim_id>/`, and a worker that doesn't
+    hold a requested clip reads it from there, so any worker can serve the
+    fetch. Those files go with drop_simulation() or once they pass the TTL.
+    """
+
+    def __init__(self, max_bytes=AUDIO_STORE_MAX_BYTES, ttl=AUDIO_STORE_TTL, shared_dir=None):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.shared_dir = shared_dir or None
+        self._lock = threading.Lock()
+        self._clips = collections.OrderedDict()  # (sim_id, utterance_id) -> AudioClip
+        self._bytes = 0
+        self._ids = itertools.count(1)
+        self._counts = collections.Counter()
+        # Clip ids are only unique per process; a shared directory needs them unique per worker
+        self._prefix = f"{uuid.uuid4().hex[:8]}-" if self.shared_dir else ""
+
+        if self.shared_dir:
+            try:
+                os.makedirs(self.shared_dir, exist_ok=True)
+                print(f"[INFO] ✅ Audio clips shared across workers at: {self.shared_dir}")
+            except OSError as e:
+                self.shared_dir = None
+                print(f"[WARNING] ⚠️ Shared audio directory disabled, clips stay per worker: {e}")
+
+    def _drop(self, key):
+        """Caller holds the lock."""
+        clip = self._clips.pop(key)
+        self._bytes -= len(clip.data)
+
+    def _expire(self, now):
+        """Drop clips past their TTL. Caller holds the lock."""
+        while self._clips and self.ttl > 0:
+            key, clip = next(iter(self._clips.items()))
+            if now - clip.stored_at <= self.ttl:
+                break
+            self._drop(key)
+            self._counts["expired"] += 1
+
+    def _insert(self, clip):
+        """Add a clip and evict past the budget. Caller holds the lock."""
+        self._clips[(clip.sim_id, clip.utterance_id)] = clip
+        self._bytes += len(clip.data)
+        self._expire(time.time())
+        while self._clips and self._bytes > self.max_bytes:
+            self._drop(next(iter(self._clips)))
+            self._counts["evictions"] += 1
+
+    def put(self, sim_id, data, mime_type):
+        """Store a clip; returns its utterance id, or None when there is no audio."""
+        if not data:
+            return None
+        with self._lock:
+            utterance_id = f"{self._prefix}{next(self._ids)}"
+            self._insert(AudioClip(sim_id, utterance_id, data, mime_type))
+            self._counts["stored"] += 1
+            sweep = self.shared_dir and self._counts["stored"] % 200 == 0
+        if self.shared_dir:
+            # Written before the id is handed out, so the fetch can land on any worker
+            self._write_shared(sim_id, utterance_id, data, mime_type)
+            if sweep:
+                self._sweep_shared()
+        return utterance_id
+
+    def get(self, sim_id, utterance_id):
+        with self._lock:
+            key = (sim_id, utterance_id)
+            clip = self._clips.get(key)
+            if clip is not None and self.ttl > 0 and time.time() - clip.stored_at > self.ttl:
+                self._drop(key)
+                self._counts["expired"] += 1
+                clip = None
+            elif clip is not None:
+                self._clips.move_to_end(key)
+                self._counts["served"] += 1
+                return clip
+        # Stored by another worker (or evicted here): read the shared copy
+        clip = self._read_shared(sim_id, utterance_id) if self.shared_dir else None
+        with self._lock:
+            if clip is None:
+                self._counts["not_found"] += 1
+                return None
+            if key not in self._clips:
+                self._insert(clip)
+            self._counts["served"] += 1
+            self._counts["shared_reads"] += 1
+            return clip
+
+    def _shared_path(self, sim_id, utterance_id=None):
+        """Path in the shared directory, or None for ids that aren't safe path components."""
+        if not _SAFE_ID.fullmatch(sim_id):
+            return None
+        if utterance_id is None:
+            return os.path.join(self.shared_dir, sim_id)
+        if not _SAFE_ID.fullmatch(utterance_id):
+            return None
+        return os.path.join(self.shared_dir, sim_id, f"{utterance_id}.clip")
+
+    def _write_shared(self, sim_id, utterance_id, data, mime_type):
+        path = self._shared_path(sim_id, utterance_id)
+        if path is None:
+            return
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp, "wb") as f:
+                f.write(mime_type.encode("utf-8") + b"\n" + data)  # MIME type on the first line
+            os.replace(tmp, path)  # Atomic: other workers never see half a clip
+        except OSError as e:
+            print(f"[WARNING] ⚠️ Shared audio write failed: {e}")
+
+    def _read_shared(self, sim_id, utterance_id):
+        path = self._shared_path(sim_id, utterance_id)
+        if path is None:
+            return None
+        try:
+            stored_at = os.path.getmtime(path)
+            if self.ttl > 0 and time.time() - stored_at > self.ttl:
+                return None
+            with open(path, "rb") as f:
+                mime_type, _, data = f.read().partition(b"\n")
+        except OSError:
+            return None
+        return AudioClip(sim_id, utterance_id, data, mime_type.decode("utf-8"), stored_at)
+
+    def _sweep_shared(self):
+        """Remove shared clip directories of simulations idle past the TTL."""
+        if self.ttl <= 0:
+            return
+        cutoff = time.time() - self.ttl
+        try:
+            entries = list(os.scandir(self.shared_dir))
+        except OSError:
+            return
+        for entry in entries:
+            try:
+                if entry.is_dir() and entry.stat().st_mtime < cutoff:
+                    shutil.rmtree(entry.path, ignore_errors=True)
+                    with self._lock:
+                        self._counts["expired"] += 1
+            except OSError:
+                pass
+
+    def url(self, sim_id, utterance_id):
+        return f"/audio/{sim_id}/{utterance_id}" if utterance_id else None
+
+    def drop_simulation(self, sim_id):
+        with self._lock:
+            for key in [k for k in self._clips if k[0] == sim_id]:
+                self._drop(key)
+        if self.shared_dir:
+            path = self._shared_path(sim_id)
+            if path:
+                shutil.rmtree(path, ignore_errors=True)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "clips": len(self._clips),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl,
+                "shared_dir": self.shared_dir,
+                "stored": self._counts.get("stored", 0),
+                "served": self._counts.get("served", 0),
+                "not_found": self._counts.get("not_found", 0),
+                "shared_reads": self._counts.get("shared_reads", 0),
+                "evictions": self._counts.get("evictions", 0),
+                "expired": self._counts.get("expired", 0),
+            }
+
+
+def parse_range(header, size):
+    """
+    Parse a single `bytes=` range against a resource of `size` bytes.
+    Returns (start, end) inclusive, None for no/unsupported range, or
+    "unsatisfiable".
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    start_s, _, end_s = header[len("bytes="):].strip().partition("-")
+    try:
+        if start_s == "":
+            # Suffix range: the last N bytes
+            length = int(end_s)
+            if length <= 0:
+                return "unsatisfiable"
+            return max(0, size - length), size - 1
+        start = int(start_s)
+        end = int(end_s) if end_s else size - 1
+    except ValueError:
+        return None
+    if start >= size or end < start:
+        return "unsatisfiable"
+    return start, min(end, size - 1)
@@ -0,0 +1,102 @@
+import collections
+import os
+import random
+import threading
+
+# -------------------------
+# ⚙️ Retry / Hedge Settings
+# -------------------------
+LLM_HEDGING = os.getenv("LLM_HEDGING", "1") != "0"
+LLM_HEDGE_BUDGET = float(os.getenv("LLM_HEDGE_BUDGET", "0.1"))   # Max share of a site's calls that may hedge
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))  # Latency samples before hedging starts
+LLM_RETRY_BASE = float(os.getenv("LLM_RETRY_BASE", "0.5"))       # Seconds, doubled per attempt
+LLM_RETRY_MAX = float(os.getenv("LLM_RETRY_MAX", "4"))           # Backoff cap in seconds
+SITE_LATENCY_WINDOW = 200
+
+TRANSIENT_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+
+class CallSitePolicy:
+    """Retry and hedging budget for one kind of LLM call."""
+
+    def __init__(self, retries, hedge):
+        self.retries = retries
+        self.hedge = hedge and LLM_HEDGING
+
+
+# Agent turns are latency-critical and short, so they may hedge; evaluations
+# are long and expensive, so they only retry.
+CALL_SITE_POLICIES = {
+    "agent_turn": CallSitePolicy(retries=2, hedge=True),
+    "feedback": CallSitePolicy(retries=2, hedge=False),
+    "evaluation": CallSitePolicy(retries=3, hedge=False),
+    "default": CallSitePolicy(retries=1, hedge=False),
+}
+
+
+def policy_for(site):
+    return CALL_SITE_POLICIES.get(site, CALL_SITE_POLICIES["default"])
+
+
+def is_transient_error(error):
+    """Errors worth retrying: provider 429/5xx/timeouts and dropped connections."""
+    code = getattr(error, "code", None) or getattr(error, "status_code", None)
+    if code in TRANSIENT_STATUS_CODES:
+        return True
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    # httpx transport errors (used by google-genai) without importing httpx here
+    return type(error).__name__ in ("ConnectError", "ReadError", "ReadTimeout", "WriteError",
+                                    "RemoteProtocolError", "PoolTimeout", "ConnectTimeout")
+
+
+def backoff_delay(attempt):
+    """Exponential backoff with full jitter around the nominal delay."""
+    nominal = min(LLM_RETRY_MAX, LLM_RETRY_BASE * (2 ** attempt))
+    return nominal * random.uniform(0.5, 1.5)
+
+
+class SiteStats:
+    """Per-call-site attempt latencies and retry/hedge counters."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._latencies = collections.defaultdict(lambda: collections.deque(maxlen=SITE_LATENCY_WINDOW))
+        self._counts = collections.defaultdict(collections.Counter)
+
+    def record_latency(self, site, seconds):
+        with self._lock:
+            self._latencies[site].append(seconds)
+
+    def count(self, site, field):
+        with self._lock:
+            self._counts[site][field] += 1
+
+    def hedge_delay(self, site):
+        """p95 attempt latency of the site, or None while there is too little data."""
+        with self._lock:
+            samples = sorted(self._latencies[site])
+        if len(samples) < LLM_HEDGE_MIN_SAMPLES:
+            return None
+        return samples[int(0.95 * (len(samples) - 1))]
+
+    def hedge_allowed(self, site):
+        with self._lock:
+            counts = self._counts[site]
+            return counts["hedges_fired"] < LLM_HEDGE_BUDGET * max(1, counts["calls"])
+
+    def snapshot(self):
+        with self._lock:
+            sites = set(self._counts) | set(self._latencies)
+            result = {}
+            for site in sorted(sites):
+                samples = sorted(self._latencies[site])
+                counts = self._counts[site]
+                result[site] = {
+                    "calls": counts["calls"],
+                    "retries": counts["retries"],
+                    "hedges_fired": counts["hedges_fired"],
+                    "hedges_won": counts["hedges_won"],
+                    "p95_ms": round(samples[int(0.95 * (len(samples) - 1))] * 1000, 1) if samples else None,
+                }
+            return result
@@ -0,0 +1,181 @@
+import collections
+import concurrent.futures
+import os
+import threading
+import time
+import uuid
+
+# -------------------------
+# ⚙️ Job Queue Settings
+# -------------------------
+FEEDBACK_WORKERS = int(os.getenv("FEEDBACK_WORKERS", "4"))
+FEEDBACK_JOB_RETENTION = int(os.getenv("FEEDBACK_JOB_RETENTION", "1000"))  # Finished jobs kept for lookup
+FEEDBACK_DRAIN_TIMEOUT = float(os.getenv("FEEDBACK_DRAIN_TIMEOUT", "120"))  # Max wait for a simulation's jobs at the end
+
+
+class FeedbackJobQueue:
+    """
+    Background queue for per-response feedback scoring.
+
+    Jobs run on a small worker pool so request handlers can answer right away.
+    Each job is tracked by id (status: queued -> running -> done | failed) and
+    finished jobs are also queued per simulation so the round stream can
+    announce them. `release()` drops a finished simulation's announcements;
+    ones nobody collects are dropped with their jobs past the retention limit.
+
+    With a shared simulation `store`, every status change is also published
+    as a `feedback_job` signal on the simulation. Lookups, `wait()` and
+    announcements then read those signals, so they see jobs run by any
+    worker. Job ids start with the simulation id, so `get()` knows where to
+    look; store calls block, so async callers go through `store.arun()`.
+    """
+
+    def __init__(self, workers=FEEDBACK_WORKERS, retention=FEEDBACK_JOB_RETENTION, store=None):
+        self.workers = workers
+        self.retention = retention
+        self.store = store if store is not None and store.shared else None
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="feedback"
+        )
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)  # Notified whenever a job finishes
+        self._jobs = collections.OrderedDict()  # job_id -> job dict
+        self._announce = collections.defaultdict(list)  # sim_id -> finished job ids
+        self._counts = collections.Counter()
+
+    def submit(self, sim_id, fn, *args):
+        """Queue `fn(*args)` for a simulation; returns the job id."""
+        job_id = f"{sim_id}-{uuid.uuid4().hex}"
+        with self._lock:
+            job = self._jobs[job_id] = {
+                "job_id": job_id,
+                "sim_id": sim_id,
+                "status": "queued",
+                "result": None,
+                "error": None,
+                "created_at": time.time(),
+                "finished_at": None,
+            }
+            self._counts["submitted"] += 1
+            self._trim()
+            shared = dict(job)
+        # Published before the job can run, so no worker sees it finish before it was queued
+        self._publish(shared)
+        self._executor.submit(self._run, job_id, fn, args)
+        return job_id
+
+    def _publish(self, job):
+        if self.store:
+            self.store.publish(job["sim_id"], "feedback_job", job)
+
+    def _run(self, job_id, fn, args):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            job["status"] = "running"
+        try:
+            result, error, status = fn(*args), None, "done"
+        except Exception as e:
+            print(f"[ERROR] ❌ Feedback job {job_id} failed: {e}")
+            result, error, status = None, str(e), "failed"
+        with self._lock:
+            job.update(status=status, result=result, error=error, finished_at=time.time())
+            self._counts[status] += 1
+            if not self.store:
+                self._announce[job["sim_id"]].append(job_id)
+            self._idle.notify_all()
+            shared = dict(job)
+        self._publish(shared)
+
+    def _trim(self):
+        """Forget the oldest finished jobs past the retention limit. Caller holds the lock."""
+        excess = len(self._jobs) - self.retention
+        for job_id in list(self._jobs):
+            if excess <= 0:
+                break
+            if self._jobs[job_id]["status"] in ("done", "failed"):
+                sim_id = self._jobs.pop(job_id)["sim_id"]
+                announce = self._announce.get(sim_id)
+                if announce is not None and job_id in announce:
+                    announce.remove(job_id)
+                    if not announce:
+                        del self._announce[sim_id]
+                excess -= 1
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job or not self.store:
+                return dict(job) if job else None
+        # Submitted on another worker: its latest published status
+        sim_id = job_id.rpartition("-")[0]
+        return self._shared_jobs(sim_id)[0].get(job_id) if sim_id else None
+
+    def _shared_jobs(self, sim_id, after=0, jobs=None):
+        """({job_id: latest job}, newest signal seq) from the simulation's feedback_job signals."""
+        jobs = {} if jobs is None else jobs
+        for signal in self.store.wait(sim_id, ("feedback_job",), after, 0):
+            jobs[signal.data["job_id"]] = signal.data
+            after = signal.seq
+        return jobs, after
+
+    def pop_finished(self, sim_id):
+        """Jobs of a simulation that finished since the last call."""
+        if self.store:
+            return self._pop_shared(sim_id)
+        with self._lock:
+            job_ids = self._announce.pop(sim_id, [])
+            return [dict(self._jobs[j]) for j in job_ids if j in self._jobs]
+
+    def _pop_shared(self, sim_id):
+        """Finished jobs not announced yet (the cursor is kept in the simulation state)."""
+        after = self.store.field(sim_id, "feedback_announced", 0)
+        signals = self.store.wait(sim_id, ("feedback_job",), after, 0)
+        if not signals:
+            return []
+        newest = signals[-1].seq
+
+        def advance(state):
+            state["feedback_announced"] = max(newest, state.get("feedback_announced", 0))
+        self.store.update(sim_id, advance)
+        return [s.data for s in signals if s.data["status"] in ("done", "failed")]
+
+    def _pending(self, sim_id):
+        return any(job["sim_id"] == sim_id and job["status"] in ("queued", "running")
+                   for job in self._jobs.values())
+
+    def wait(self, sim_id, timeout=FEEDBACK_DRAIN_TIMEOUT):
+        """Block until the simulation has no queued or running jobs; False on timeout."""
+        if self.store:
+            return self._wait_shared(sim_id, timeout)
+        with self._idle:
+            return self._idle.wait_for(lambda: not self._pending(sim_id), timeout)
+
+    def _wait_shared(self, sim_id, timeout):
+        deadline = time.monotonic() + timeout
+        jobs, after = self._shared_jobs(sim_id)
+        while any(job["status"] in ("queued", "running") for job in jobs.values()):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            self.store.wait(sim_id, ("feedback_job",), after, remaining)
+            jobs, after = self._shared_jobs(sim_id, after, jobs)
+        return True
+
+    def release(self, sim_id):
+        """Forget a finished simulation's uncollected announcements."""
+        with self._lock:
+            self._announce.pop(sim_id, None)
+
+    def stats(self):
+        with self._lock:
+            statuses = collections.Counter(job["status"] for job in self._jobs.values())
+            return {
+                "workers": self.workers,
+                "queued": statuses.get("queued", 0),
+                "running": statuses.get("running", 0),
+                "submitted": self._counts.get("submitted", 0),
+                "done": self._counts.get("done", 0),
+                "failed": self._counts.get("failed", 0),
+            }
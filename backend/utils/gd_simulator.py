@@ -1,27 +1,36 @@
 import time
 import random
+import asyncio
+import collections
 import concurrent.futures
-from fastapi import FastAPI, UploadFile, File
+from fastapi import FastAPI, UploadFile, File, Request, Response, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from google import genai
 # import google.generativeai as genai
 from typing import List, Dict, Optional
 import json
-from gtts import gTTS
-import io
-import base64
+import re
 import os
-import tempfile
 from dotenv import load_dotenv
-import wave
-from vosk import Model, KaldiRecognizer
-import subprocess
-import shutil
-import whisper
 from database import SessionLocal
 from models import Discussion, HumanResponse
+from utils.llm_gateway import LLMGateway, LLM_MODEL
+from utils.llm_cache import LLMCache, LLM_CACHE_ENABLED
+from utils.rate_limiter import RateLimitExceeded
+from utils.providers import create_llm_provider, create_tts_provider, create_stt_provider
+from utils.transcript import Transcript
+from utils.speculation import SpeculativePipeline, speculation_stats
+from utils.feedback_jobs import FeedbackJobQueue
+from utils.tts_cache import CachedTTS, TTSCache, TTS_CACHE_ENABLED
+from utils.audio_store import AUDIO_STORE_DIR, AudioStore, parse_range
+from utils.tts_pipeline import SentenceTTSPipeline, asynthesize_sentences, synthesize_sentences, tts_pipeline_stats
+from utils.audio_duration import clip_duration
+from utils.stt_stream import STTStreamRegistry
+from utils.simulation_store import create_simulation_store
+from utils.structured_output import (
+    DiscussionEvaluation, HumanFeedback, generate_structured, parse_json_list, structured_output_stats
+)
 
 # -------------------------
 # 🔐 Gemini Setup
@@ -29,71 +38,38 @@ from models import Discussion, HumanResponse
 load_dotenv()
 API_KEY = os.getenv("API_KEY")
 
-# ✅ IMPROVED: Better FFmpeg detection
-def setup_ffmpeg():
-    """Detect and setup FFmpeg path"""
-    # Check if ffmpeg is already in PATH
-    if shutil.which("ffmpeg"):
-        print("[INFO] ✅ FFmpeg found in system PATH")
-        return True
-    
-    # Common FFmpeg installation paths
-    common_paths = [
-        r"C:\ffmpeg\bin",
-        r"C:\Program Files\ffmpeg\bin",
-        r"/usr/local/bin",
-        r"/usr/bin"
-    ]
-    
-    for path in common_paths:
-        if os.path.exists(os.path.join(path, "ffmpeg.exe" if os.name == 'nt' else "ffmpeg")):
-            os.environ["PATH"] += os.pathsep + path
-            print(f"[INFO] ✅ FFmpeg found at: {path}")
-            return True
-    
-    print("[ERROR] ❌ FFmpeg not found!")
-    print("[INFO] 💡 Install FFmpeg:")
-    print("  Windows: Download from https://ffmpeg.org/download.html")
-    print("  Linux: sudo apt-get install ffmpeg")
-    print("  Mac: brew install ffmpeg")
-    return False
-
-ffmpeg_available = setup_ffmpeg()
-client = genai.Client(api_key=API_KEY)
-
+llm_cache = LLMCache() if LLM_CACHE_ENABLED else None
+llm_gateway = LLMGateway(create_llm_provider(API_KEY, LLM_MODEL), cache=llm_cache)
 
 # -------------------------
-# 🎤 Whisper Model Setup
+# 🔌 Speech Providers (gTTS + Whisper/Vosk by default, offline stubs with GD_PROVIDERS=stub)
 # -------------------------
-print("[INFO] 🧠 Loading Whisper model...")
-try:
-    whisper_model = whisper.load_model("small")
-    print("[INFO] ✅ Whisper model loaded successfully")
-except Exception as e:
-    whisper_model = None
-    print(f"[ERROR] ❌ Failed to load Whisper model: {e}")
+# Repeated lines (cached turns, regenerated turns) are synthesized once
+tts_cache = TTSCache() if TTS_CACHE_ENABLED else None
+tts_provider = CachedTTS(create_tts_provider(), tts_cache) if tts_cache else create_tts_provider()
+stt_provider = create_stt_provider()
 
 # -------------------------
-# 🎤 Vosk Model Setup (Offline Speech Recognition - Fallback)
+# 🗂️ Live simulations
 # -------------------------
+# In-process by default; SIMULATION_STORE=sqlite shares state and signals
+# (interrupt, human_input, playback_finished, stt_final, feedback_job) across uvicorn workers.
+simulation_store = create_simulation_store()
 
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-VOSK_MODEL_PATH = os.path.join(BASE_DIR, "vosk-model-small-en-us-0.15")
+# Live-recognized human turns, picked up by /submit_human_input?stream_id=
+stt_streams = STTStreamRegistry(store=simulation_store)
 
-print("[INFO] Loading Vosk speech recognition model...")
-print("[DEBUG] Looking for model at:", VOSK_MODEL_PATH)
-print("[DEBUG] Exists:", os.path.exists(VOSK_MODEL_PATH))
+# Agent clips are served by URL from here instead of riding inside SSE JSON
+audio_store = AudioStore(shared_dir=AUDIO_STORE_DIR if simulation_store.shared else None)
+
+# Per-response feedback scoring runs here instead of on the request path
+feedback_jobs = FeedbackJobQueue(store=simulation_store)
+
+# Scale for the post-utterance playback wait; 0 drives rounds at full speed (benchmarks/CI)
+PLAYBACK_SYNC_SCALE = float(os.getenv("PLAYBACK_SYNC_SCALE", "1"))
+PLAYBACK_MARGIN = float(os.getenv("PLAYBACK_MARGIN", "0.5"))        # Seconds after the clip ends
+PLAYBACK_ACK_GRACE = float(os.getenv("PLAYBACK_ACK_GRACE", "3"))    # Extra wait for a client that acks playback
 
-if os.path.exists(VOSK_MODEL_PATH):
-    try:
-        vosk_model = Model(VOSK_MODEL_PATH)
-        print(f"[INFO] ✅ Vosk model loaded from: {VOSK_MODEL_PATH}")
-    except Exception as e:
-        vosk_model = None
-        print(f"[ERROR] ❌ Failed to load Vosk model: {e}")
-else:
-    vosk_model = None
-    print(f"[WARNING] ⚠️ Vosk model not found at: {VOSK_MODEL_PATH}")
 
 # -------------------------
 #  Personas
@@ -110,39 +86,54 @@ PERSONAS = [
 # -------------------------
 # 🧩 Helper Functions
 # -------------------------
-def safe_generate(prompt, timeout=60, is_json=False):
-    """Call Gemini safely with timeout and debugging."""
-
-    def call_gemini():
-        kwargs = {}
-        if is_json:
-            kwargs["config"] = {"response_mime_type": "application/json"}
-            
-        response = client.models.generate_content(
-            model="gemini-2.5-flash",
-            contents=prompt,
-            **kwargs
+def safe_generate(prompt, timeout=60, is_json=False, use_cache=True, site="default"):
+    """
+    Call Gemini through the shared gateway with a per-call deadline.
+    Identical prompts are served from the response cache unless use_cache=False;
+    `site` selects the retry/hedge budget (agent_turn, feedback, evaluation).
+    """
+    try:
+        text = llm_gateway.generate(prompt, is_json=is_json, timeout=timeout, use_cache=use_cache, site=site)
+    except Exception as e:
+        return generation_error(e)
+    return generated_text(text)
+
+
+async def asafe_generate(prompt, timeout=60, is_json=False, use_cache=True, site="default"):
+    """safe_generate() for the async round engine; cancelling it cancels the request."""
+    try:
+        text = await asyncio.wait_for(
+            llm_gateway.agenerate(prompt, is_json=is_json, timeout=timeout, use_cache=use_cache, site=site),
+            timeout + 1  # The gateway enforces the deadline; the grace only covers hand-off
         )
-        return response.text if response and hasattr(response, "text") else None
+    except Exception as e:
+        return generation_error(e)
+    return generated_text(text)
 
-    with concurrent.futures.ThreadPoolExecutor() as executor:
-        future = executor.submit(call_gemini)
 
-        try:
-            text = future.result(timeout=timeout)
-            if text:
-                text = text.strip()
-                print(f"[DEBUG] Generated response: {text}")
-                return text
-            return "[No response from Gemini]"
+def generated_text(text):
+    if text:
+        text = text.strip()
+        print(f"[DEBUG] Generated response: {text}")
+        return text
+    return "[No response from Gemini]"
+
+
+def generation_error(e):
+    """The bracketed placeholder shown instead of model text when a call fails."""
+    if isinstance(e, concurrent.futures.TimeoutError):
+        print("[TIMEOUT] Gemini took too long for this prompt.")
+        return "[Timeout error]"
+    if isinstance(e, RateLimitExceeded):
+        print(f"[BUSY] {e}")
+        return "[Busy: rate limit reached]"
+    print(f"[ERROR] During Gemini generation: {e}")
+    return f"[Error: {e}]"
 
-        except concurrent.futures.TimeoutError:
-            print("[TIMEOUT] Gemini took too long for this prompt.")
-            return "[Timeout error]"
 
-        except Exception as e:
-            print(f"[ERROR] During Gemini generation: {e}")
-            return f"[Error: {e}]" 
+def is_error_marker(text):
+    """True for the bracketed placeholders safe_generate returns instead of model text."""
+    return not text or (text.startswith("[") and text.endswith("]"))
 
 
 def generate_human_feedback(text: str, topic: str):
@@ -177,278 +168,46 @@ Return strictly in JSON:
 No extra text.
 """
 
-    response_text = safe_generate(prompt)
-
-    try:
-        cleaned = response_text.strip().replace("```json", "").replace("```", "")
-        return json.loads(cleaned)
-    except:
-        return None
-
-def text_to_audio_base64(text, agent_name):
-    """Convert text to audio with agent-specific accent."""
-    try:
-        accent_map = {
-            "Agent 1": "co.in",
-            "Agent 2": "com",
-            "Agent 3": "co.uk",
-            "Agent 4": "com.au"
-        }
-        tld = accent_map.get(agent_name, "com")
-        tts = gTTS(text, lang="en", tld=tld, slow=False)
-        audio_bytes = io.BytesIO()
-        tts.write_to_fp(audio_bytes)
-        audio_bytes.seek(0)
-        return base64.b64encode(audio_bytes.read()).decode("utf-8")
-    except Exception as e:
-        print(f"[ERROR] TTS failed: {e}")
-        return None
+    feedback, _ = generate_structured(
+        lambda p, fixup: safe_generate(p, site="feedback", use_cache=not fixup),
+        prompt, HumanFeedback, is_error=is_error_marker
+    )
+    return feedback.model_dump() if feedback else None
 
-def transcribe_audio_whisper(audio_file):
+def text_to_audio_bytes(text, agent_name):
     """
-    ✅ PRIMARY: Transcribe audio using Whisper (more accurate)
+    Synthesize text with the agent's voice via the configured TTS provider.
+    Sentences are synthesized in parallel and joined into one clip.
     """
-    temp_path = None
+    if is_error_marker(text):
+        # Never read "[Timeout error]" and friends aloud
+        return None
+    clips = synthesize_sentences(tts_provider.synthesize, text, agent_name)
+    if not clips:
+        return None
     try:
-        # Check prerequisites
-        if whisper_model is None:
-            print("[ERROR] ❌ Whisper model not loaded")
-            return None
-        
-        if not ffmpeg_available:
-            print("[ERROR] ❌ FFmpeg not available (required for Whisper)")
-            return None
-        
-        # Read uploaded audio
-        audio_data = audio_file.read()
-        audio_file.seek(0)
-        print(f"[DEBUG] 🎤 Received audio: {len(audio_data)} bytes")
-        
-        if len(audio_data) < 1000:
-            print("[ERROR] ❌ Audio file too small (likely empty recording)")
-            return None
-        
-        # Create temp file
-        temp_dir = tempfile.gettempdir()
-        timestamp = int(time.time() * 1000)
-        temp_path = os.path.join(temp_dir, f"whisper_audio_{timestamp}.webm")
-        
-        with open(temp_path, 'wb') as f:
-            f.write(audio_data)
-        
-        print(f"[DEBUG] 💾 Saved audio to: {temp_path}")
-        print("[DEBUG] 🧠 Transcribing with Whisper...")
-        
-        # Transcribe with Whisper
-        result = whisper_model.transcribe(temp_path)
-        transcribed_text = result["text"].strip()
-        
-        if transcribed_text:
-            print(f"[SUCCESS] ✅ Whisper transcribed: '{transcribed_text}'")
-            return transcribed_text
-        else:
-            print("[ERROR] ❌ Whisper returned empty transcription")
-            return None
-            
+        return tts_provider.concat(clips)
     except Exception as e:
-        print(f"[ERROR] ❌ Whisper transcription failed: {e}")
-        import traceback
-        print(f"[ERROR] Full traceback:\n{traceback.format_exc()}")
+        print(f"[ERROR] TTS failed: {e}")
         return None
-    finally:
-        # Cleanup temp file
-        if temp_path and os.path.exists(temp_path):
-            try:
-                os.remove(temp_path)
-                print(f"[DEBUG] 🗑️ Cleaned up: {temp_path}")
-            except Exception as e:
-                print(f"[WARNING] ⚠️ Could not delete {temp_path}: {e}")
 
-def transcribe_audio_vosk(audio_file):
-    """
-    ✅ FALLBACK: Enhanced transcription with Vosk (used if Whisper fails)
-    """
-    webm_path = None
-    wav_path = None
-    try:
-        # Check prerequisites
-        if vosk_model is None:
-            print("[ERROR] ❌ Vosk model not loaded")
-            return None
-        
-        if not ffmpeg_available:
-            print("[ERROR] ❌ FFmpeg not available")
-            return None
-        
-        # Read uploaded audio
-        audio_data = audio_file.read()
-        audio_file.seek(0)
-        print(f"[DEBUG] 🎤 Received audio: {len(audio_data)} bytes")
-        
-        if len(audio_data) < 1000:
-            print("[ERROR] ❌ Audio file too small (likely empty recording)")
-            return None
-        
-        # Create temp directory if it doesn't exist
-        temp_dir = tempfile.gettempdir()
-        print(f"[DEBUG] 📁 Using temp directory: {temp_dir}")
-        
-        # Save WebM temporarily with unique filename
-        timestamp = int(time.time() * 1000)
-        webm_path = os.path.join(temp_dir, f"recording_{timestamp}.webm")
-        wav_path = os.path.join(temp_dir, f"recording_{timestamp}.wav")
-        
-        with open(webm_path, 'wb') as f:
-            f.write(audio_data)
-        
-        print(f"[DEBUG] 💾 Saved WebM to: {webm_path}")
-        
-        # 🔄 Convert WebM → WAV using FFmpeg
-        print("[DEBUG] 🔄 Converting WebM → WAV using FFmpeg...")
-        ffmpeg_cmd = [
-            "ffmpeg",
-            "-y",  # Overwrite output file
-            "-i", webm_path,  # Input file
-            "-ac", "1",  # Mono audio
-            "-ar", "16000",  # 16kHz sample rate
-            "-sample_fmt", "s16",  # 16-bit PCM
-            "-f", "wav",  # Force WAV format
-            wav_path
-        ]
-        
-        print(f"[DEBUG] Running: {' '.join(ffmpeg_cmd)}")
-        result = subprocess.run(
-            ffmpeg_cmd,
-            capture_output=True,
-            text=True,
-            timeout=30
-        )
-        
-        if result.returncode != 0:
-            print(f"[ERROR] ❌ FFmpeg failed with code {result.returncode}")
-            print(f"[ERROR] FFmpeg stderr: {result.stderr}")
-            return None
-        
-        print(f"[DEBUG] ✅ FFmpeg conversion successful")
-        
-        # Verify WAV file exists and has content
-        if not os.path.exists(wav_path):
-            print("[ERROR] ❌ WAV file was not created")
-            return None
-        
-        wav_size = os.path.getsize(wav_path)
-        print(f"[DEBUG] 📊 WAV file size: {wav_size} bytes")
-        
-        if wav_size < 1000:
-            print("[ERROR] ❌ WAV file too small (conversion likely failed)")
-            return None
-        
-        # Open WAV file
-        wf = wave.open(wav_path, "rb")
-        print(f"[DEBUG] 📊 WAV properties:")
-        print(f"  - Channels: {wf.getnchannels()}")
-        print(f"  - Sample width: {wf.getsampwidth()}")
-        print(f"  - Frame rate: {wf.getframerate()}")
-        print(f"  - Frames: {wf.getnframes()}")
-        print(f"  - Duration: {wf.getnframes() / wf.getframerate():.2f}s")
-        
-        # Validate WAV format
-        if wf.getnchannels() != 1 or wf.getsampwidth() != 2:
-            print("[ERROR] ❌ Invalid WAV format for Vosk")
-            print(f"  Expected: 1 channel, 2 bytes sample width")
-            print(f"  Got: {wf.getnchannels()} channels, {wf.getsampwidth()} bytes")
-            wf.close()
-            return None
-        
-        # Create recognizer
-        print("[DEBUG] 🎯 Creating Vosk recognizer...")
-        rec = KaldiRecognizer(vosk_model, wf.getframerate())
-        rec.SetWords(True)
-        
-        result_text = ""
-        frames_processed = 0
-        
-        print("[DEBUG] 🔍 Starting transcription...")
-        while True:
-            data = wf.readframes(4000)
-            if len(data) == 0:
-                break
-            
-            frames_processed += 1
-            
-            if rec.AcceptWaveform(data):
-                part_result = json.loads(rec.Result())
-                part_text = part_result.get("text", "")
-                if part_text:
-                    print(f"[DEBUG] 📝 Partial result: '{part_text}'")
-                    result_text += part_text + " "
-        
-        # Get final result
-        final_result = json.loads(rec.FinalResult())
-        final_text = final_result.get("text", "")
-        if final_text:
-            print(f"[DEBUG] 📝 Final result: '{final_text}'")
-            result_text += final_text
-        
-        wf.close()
-        
-        result_text = result_text.strip()
-        print(f"[DEBUG] 📊 Processed {frames_processed} frame chunks")
-        
-        if result_text:
-            print(f"[SUCCESS] ✅ Vosk transcribed: '{result_text}'")
-            return result_text
-        else:
-            print("[ERROR] ❌ No speech detected in audio")
-            print("[INFO] 💡 Possible causes:")
-            print("  - Audio too quiet")
-            print("  - Background noise too loud")
-            print("  - Recording too short")
-            print("  - Microphone not working properly")
-            return None
-            
-    except subprocess.TimeoutExpired:
-        print("[ERROR] ❌ FFmpeg conversion timeout (>30s)")
+async def atext_to_audio_bytes(text, agent_name):
+    """text_to_audio_bytes() for the async round engine; waits without holding a thread."""
+    if is_error_marker(text):
         return None
-    except subprocess.CalledProcessError as e:
-        print(f"[ERROR] ❌ FFmpeg failed: {e}")
+    clips = await asynthesize_sentences(tts_provider.synthesize, text, agent_name)
+    if not clips:
         return None
+    try:
+        return tts_provider.concat(clips)
     except Exception as e:
-        print(f"[ERROR] ❌ Vosk transcription failed: {e}")
-        import traceback
-        print(f"[ERROR] Full traceback:\n{traceback.format_exc()}")
+        print(f"[ERROR] TTS failed: {e}")
         return None
-    finally:
-        # Cleanup temp files
-        for path in [webm_path, wav_path]:
-            if path and os.path.exists(path):
-                try:
-                    os.remove(path)
-                    print(f"[DEBUG] 🗑️ Cleaned up: {path}")
-                except Exception as e:
-                    print(f"[WARNING] ⚠️ Could not delete {path}: {e}")
 
-def transcribe_audio(audio_file):
-    """
-    ✅ HYBRID: Try Whisper first (more accurate), fallback to Vosk
-    """
-    print("[INFO] 🎯 Attempting transcription with Whisper (primary)...")
-    
-    # Try Whisper first
-    if whisper_model is not None:
-        result = transcribe_audio_whisper(audio_file)
-        if result:
-            return result
-        print("[WARNING] ⚠️ Whisper failed, trying Vosk fallback...")
-    else:
-        print("[WARNING] ⚠️ Whisper not available, using Vosk...")
-    
-    # Fallback to Vosk
-    if vosk_model is not None:
-        return transcribe_audio_vosk(audio_file)
-    
-    print("[ERROR] ❌ Both Whisper and Vosk unavailable")
-    return None
+def store_audio(sim_id, audio):
+    """Put a clip in the audio store; returns (utterance_id, url), both None without audio."""
+    utterance_id = audio_store.put(sim_id, audio, tts_provider.mime_type)
+    return utterance_id, audio_store.url(sim_id, utterance_id)
 
 # -------------------------
 # 🗣️ Agent Class
@@ -458,15 +217,14 @@ class Agent:
         self.name = name
         self.persona = persona
     
-    def prepare_prompt(self, topic, utterances, is_first=False, human_just_spoke=False):
-        full_discussion = "\n".join(
-            f"- {u['agent']}: {u['text']}" for u in utterances
-        )
+    def prepare_prompt(self, topic, transcript, is_first=False, human_just_spoke=False):
+        """`transcript` is a TranscriptView snapshot of the discussion so far."""
+        full_discussion = transcript.rendered
         
-        last_remark = utterances[-1]["text"] if utterances else ""
-        last_speaker = utterances[-1]["agent"] if utterances else ""
+        last_remark = transcript.last_text
+        last_speaker = transcript.last_speaker
         
-        if is_first and not utterances:
+        if is_first and not transcript:
             return f"""
 You are {self.name}, a participant in a group discussion.
 Your style: {self.persona}.
@@ -523,10 +281,57 @@ You may naturally use phrases like: "I think", "Honestly", "I feel", "To be fair
     
     def generate_response(self, prompt):
         print(f"[DEBUG] {self.name} is generating response...")
-        text = safe_generate(prompt)
+        # Discussion turns skip the response cache, so simulations with the same topic
+        # and personas don't replay word-for-word identical utterances
+        text = safe_generate(prompt, site="agent_turn", use_cache=False)
         print(f"[DEBUG] {self.name} finished response.")
         return text
 
+    async def agenerate_response(self, prompt):
+        print(f"[DEBUG] {self.name} is generating response...")
+        text = await asafe_generate(prompt, site="agent_turn", use_cache=False)
+        print(f"[DEBUG] {self.name} finished response.")
+        return text
+
+    async def astream_response(self, prompt, timeout=60):
+        """
+        Stream a turn as it is generated. Yields ("partial", text_delta) for
+        each token chunk, ("audio_chunk", clip_bytes) in sentence order as
+        soon as each sentence is synthesized, and finally ("done", full_text).
+        Synthesis runs on the TTS pool while the LLM keeps generating.
+        """
+        print(f"[DEBUG] {self.name} is streaming response...")
+        parts = []
+        speech = SentenceTTSPipeline(tts_provider.synthesize, self.name)
+        try:
+            try:
+                async for piece in llm_gateway.astream(prompt, timeout=timeout, use_cache=False, site="agent_turn"):
+                    parts.append(piece)
+                    yield "partial", piece
+                    speech.feed(piece)
+                    for audio in speech.drain():
+                        yield "audio_chunk", audio
+            except concurrent.futures.TimeoutError:
+                print("[TIMEOUT] Gemini took too long for this prompt.")
+                if not parts:
+                    parts = ["[Timeout error]"]
+            except Exception as e:
+                print(f"[ERROR] During Gemini streaming: {e}")
+                if not parts:
+                    parts = [f"[Error: {e}]"]
+            if not is_error_marker("".join(parts).strip()):
+                # Speak whatever was generated, even if the stream broke off
+                speech.close()
+                async for audio in speech.adrain():
+                    yield "audio_chunk", audio
+        finally:
+            # Client went away mid-turn: stop synthesizing
+            speech.cancel()
+
+        text = "".join(parts).strip() or "[No response from Gemini]"
+        print(f"[DEBUG] {self.name} finished streaming response.")
+        yield "done", text
+
 # -------------------------
 # ⚙️ FastAPI setup
 # -------------------------
@@ -540,10 +345,44 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# -------------------------
-# 🗂️ In-memory simulations
-# -------------------------
-SIMULATIONS = {}
+# Transcripts are rebuilt from the stored utterances, so any worker can pick a simulation up
+TRANSCRIPTS = {}
+
+
+def sync_transcript(sim_id, utterances, start=0):
+    """
+    This worker's transcript for a simulation, caught up with `utterances`,
+    the simulation's utterances from index `start` on.
+    """
+    transcript = TRANSCRIPTS.get(sim_id)
+    if transcript is None or not start <= len(transcript) <= start + len(utterances):
+        if start:
+            # Missing lines before `start`: rebuild from the full history
+            return sync_transcript(sim_id, simulation_store.field(sim_id, "utterances") or [])
+        transcript = TRANSCRIPTS[sim_id] = Transcript()
+    for u in utterances[len(transcript) - start:]:
+        transcript.append(u["agent"], u["text"])
+    return transcript
+
+
+def release_simulation(sim_id):
+    """Drop this worker's per-simulation caches once the discussion is over."""
+    TRANSCRIPTS.pop(sim_id, None)
+    feedback_jobs.release(sim_id)
+    # The feedback page doesn't replay clips, so they needn't wait for LRU/TTL eviction
+    audio_store.drop_simulation(sim_id)
+
+
+def append_utterance(sim_id, utterance):
+    """Store an utterance; returns the simulation's transcript including it."""
+    transcript = TRANSCRIPTS.get(sim_id)
+    known = len(transcript) if transcript is not None else 0
+
+    def add(state):
+        state["utterances"].append(utterance)
+        # Only the lines this worker hasn't seen, not a copy of the whole history
+        return state["utterances"][known:]
+    return sync_transcript(sim_id, simulation_store.update(sim_id, add) or [], start=known)
 
 class SimulationRequest(BaseModel):
     topic: str
@@ -598,9 +437,9 @@ def start_simulation(req: SimulationRequest):
     # -------------------------
     # SIMULATION STRUCTURE WITH INTERRUPT SUPPORT
     # -------------------------
-    SIMULATIONS[sim_id] = {
+    simulation_store.create(sim_id, {
         "topic": req.topic,
-        "agents": agents,
+        "agents": [{"name": agent.name, "persona": agent.persona} for agent in agents],
         "utterances": [],
         "current_round": 0,
         "total_rounds": req.rounds,
@@ -609,8 +448,10 @@ def start_simulation(req: SimulationRequest):
         # Interrupt system fields
         "interrupt_reserved": False,
         "human_interrupt_count": 0,
-        "current_speaker": None
-    }
+        "current_speaker": None,
+        # Set once the client acks playback (see /playback_finished)
+        "playback_acks": False
+    })
     
     print(f"\n✅ Simulation ID: {sim_id}")
     print("👥 Agent Lineup:")
@@ -622,6 +463,19 @@ def start_simulation(req: SimulationRequest):
     return {"simulation_id": sim_id, "agents": agent_list}
 
 
+@app.post("/playback_finished/{sim_id}")
+def playback_finished(sim_id: str, utterance_id: Optional[str] = None):
+    """
+    Optional client ack that an agent's clip finished playing, so the next
+    turn starts right away instead of after the server-side duration wait.
+    """
+    if sim_id not in simulation_store:
+        return {"error": "Simulation ID not found."}
+    simulation_store.update(sim_id, lambda state: state.update(playback_acks=True))
+    simulation_store.publish(sim_id, "playback_finished", {"utterance_id": utterance_id})
+    return {"success": True}
+
+
 @app.post("/reserve_interrupt/{sim_id}")
 def reserve_interrupt(sim_id: str):
     """Allow human to interrupt and reserve the next speaking turn."""
@@ -629,82 +483,45 @@ def reserve_interrupt(sim_id: str):
     print(f"🔔 INTERRUPT RESERVED")
     print(f"{'='*60}")
     
-    if sim_id not in SIMULATIONS:
+    if sim_id not in simulation_store:
         print("❌ ERROR: Simulation ID not found")
         return {"error": "Simulation ID not found."}
     
-    sim = SIMULATIONS[sim_id]
-    
-    if sim["interrupt_reserved"]:
+    def reserve(state):
+        # Check-and-set in one store update, so two workers can't both reserve
+        if state["interrupt_reserved"]:
+            return None
+        state["interrupt_reserved"] = True
+        state["human_interrupt_count"] += 1
+        return state["human_interrupt_count"]
+
+    interrupt_count = simulation_store.update(sim_id, reserve)
+    if interrupt_count is None:
         print("⚠️ Interrupt already reserved")
         return {"message": "Interrupt already reserved", "success": False}
+    simulation_store.publish(sim_id, "interrupt")
     
-    sim["interrupt_reserved"] = True
-    sim["human_interrupt_count"] += 1
-    
-    print(f"✅ Interrupt #{sim['human_interrupt_count']} reserved by human")
+    print(f"✅ Interrupt #{interrupt_count} reserved by human")
     print(f"Current speaker will finish, then human gets next turn")
     print(f"{'='*60}\n")
     
     return {
         "success": True,
         "interrupt_reserved": True,
-        "interrupt_count": sim["human_interrupt_count"],
+        "interrupt_count": interrupt_count,
         "message": "Next chance reserved"
     }
 
 
-@app.post("/submit_human_input/{sim_id}")
-async def submit_human_input(sim_id: str, audio: Optional[UploadFile] = File(None), text: Optional[str] = None):
-    """Accept human input via voice or text."""
-    print(f"\n{'='*60}")
-    print(f"👤 HUMAN INPUT RECEIVED")
-    print(f"{'='*60}")
-    
-    if sim_id not in SIMULATIONS:
-        print("❌ ERROR: Simulation ID not found")
-        return {"error": "Simulation ID not found."}
-    
-    sim = SIMULATIONS[sim_id]
-    
-    # Get human input
-    human_text = None
-    if audio:
-        print("🎤 Processing voice input (Whisper primary, Vosk fallback)...")
-        human_text = transcribe_audio(audio.file)
-    elif text:
-        print(f"⌨️ Processing text input: '{text}'")
-        human_text = text
-    
-    if not human_text:
-        error_msg = "Could not transcribe audio. "
-        if not whisper_model and not vosk_model:
-            error_msg += "No speech recognition models loaded. "
-        if not ffmpeg_available:
-            error_msg += "FFmpeg not available. "
-        error_msg += "Please use text input instead."
-        print(f"❌ ERROR: {error_msg}")
-        return {"error": error_msg}
-    
-    print(f"\n💬 HUMAN SAID: \"{human_text}\"")
-    print(f"{'='*60}\n")
-    
-    # Add human utterance to discussion
-    sim["utterances"].append({
-        "agent": "You",
-        "text": human_text,
-        "audio": None,
-        "timestamp": time.time()
-    })
-    sim["awaiting_human"] = False
-
-    # --------------------------------------------------
-    # 🧠 GENERATE FEEDBACK USING GEMINI
-    # --------------------------------------------------
+# -------------------------
+# 🧩 Helper: Score a human response (runs as a background job)
+# -------------------------
+def human_response_scores(human_text, topic):
+    """Scores + feedback for one submitted response (the prompt /submit_human_input has always used)."""
     feedback_prompt = f"""
 You are an English communication evaluator.
 
-Topic: {sim['topic']}
+Topic: {topic}
 
 Student Response:
 "{human_text}"
@@ -728,29 +545,30 @@ Return strictly in JSON:
 Do NOT add extra text.
 """
 
-    feedback_data = None
-    response_text = safe_generate(feedback_prompt)
+    feedback, _ = generate_structured(
+        lambda p, fixup: safe_generate(p, site="feedback", use_cache=not fixup),
+        feedback_prompt, HumanFeedback, is_error=is_error_marker
+    )
+    return feedback.model_dump() if feedback else None
 
-    if response_text:
-        try:
-            cleaned = response_text.replace("```json", "").replace("```", "").strip()
-            feedback_data = json.loads(cleaned)
-        except Exception as e:
-            print("⚠️ Failed to parse Gemini JSON:", e)
 
-    # --------------------------------------------------
-    # 💾 SAVE RESPONSE + SCORES IN DATABASE
-    # --------------------------------------------------
+def score_human_response(sim_id, topic, round_number, human_text):
+    """Generate feedback scores for one human response and store them."""
+    feedback_data = human_response_scores(human_text, topic)
+    if not feedback_data:
+        print("⚠️ Failed to parse Gemini JSON for human feedback")
+        return None
+
     db = SessionLocal()
     try:
         discussion = db.query(Discussion).filter(
             Discussion.id == int(sim_id)
         ).first()
 
-        if discussion and feedback_data:
+        if discussion:
             human_response = HumanResponse(
                 discussion_id=discussion.id,
-                round_number=sim["current_round"] + 1,
+                round_number=round_number,
                 text=human_text,
                 grammar_score=feedback_data.get("grammar_score"),
                 clarity_score=feedback_data.get("clarity_score"),
@@ -768,47 +586,178 @@ Do NOT add extra text.
     except Exception as e:
         print("❌ DB ERROR:", e)
         db.rollback()
+        raise
     finally:
         db.close()
+
+    return feedback_data
+
+
+@app.websocket("/stt_stream/{sim_id}")
+async def stt_stream(websocket: WebSocket, sim_id: str):
+    """
+    Live speech recognition for the human turn.
+
+    Binary messages are audio chunks (MediaRecorder WebM/Opus, in order);
+    the server answers with {"type": "partial", "text"} whenever the interim
+    transcript changes. A text message {"type": "stop"} ends the recording:
+    the server replies {"type": "final", "stream_id", "text"} and the
+    stream_id can then be passed to /submit_human_input.
+    """
+    await websocket.accept()
+    if await simulation_store.aget(sim_id) is None:
+        await websocket.send_json({"type": "error", "error": "Simulation ID not found."})
+        await websocket.close()
+        return
+
+    stream = await stt_provider.aopen_stream()
+    stream_id = stt_streams.open(sim_id, stream.kind)
+    print(f"🎙️ STT stream {stream_id} opened ({stream.kind})")
+    await websocket.send_json({"type": "ready", "stream_id": stream_id, "mode": stream.kind})
+    finished = False
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            if message.get("bytes"):
+                partial = stream.feed(message["bytes"])
+                if partial is not None:
+                    stt_streams.record_interim()
+                    await websocket.send_json({"type": "partial", "text": partial})
+                continue
+            try:
+                command = json.loads(message.get("text") or "{}")
+            except json.JSONDecodeError:
+                command = {}
+            if command.get("type") == "stop":
+                started = time.perf_counter()
+                try:
+                    text = await stream.afinish()
+                except Exception as e:
+                    print(f"[ERROR] ❌ STT stream {stream_id} failed: {e}")
+                    text = None
+                elapsed = time.perf_counter() - started
+                await stt_streams.afinish(sim_id, stream_id, text, elapsed)
+                finished = True
+                print(f"🎙️ STT stream {stream_id} final in {elapsed * 1000:.0f}ms: '{text}'")
+                await websocket.send_json({"type": "final", "stream_id": stream_id, "text": text})
+                await websocket.close()
+                break
+    except WebSocketDisconnect:
+        pass
+    finally:
+        stream.close()
+        if not finished:
+            stt_streams.abandon(stream_id)
+            print(f"🎙️ STT stream {stream_id} abandoned")
+
+
+@app.post("/submit_human_input/{sim_id}")
+async def submit_human_input(sim_id: str, audio: Optional[UploadFile] = File(None), text: Optional[str] = None,
+                             stream_id: Optional[str] = None):
+    """
+    Accept human input via voice, a finished /stt_stream recording, or text.
+    Returns the transcript right away; feedback scoring runs as a background
+    job (see /feedback_job/{job_id}).
+    """
+    print(f"\n{'='*60}")
+    print(f"👤 HUMAN INPUT RECEIVED")
+    print(f"{'='*60}")
+    
+    sim = await simulation_store.aget(sim_id)
+    if sim is None:
+        print("❌ ERROR: Simulation ID not found")
+        return {"error": "Simulation ID not found."}
+    
+    # Get human input
+    human_text = None
+    if stream_id:
+        print(f"🎙️ Using live transcript from stream {stream_id}...")
+        human_text = await stt_streams.result(sim_id, stream_id)
+    elif audio:
+        print("🎤 Processing voice input (Whisper primary, Vosk fallback)...")
+        # Transcription is blocking; keep it off the event loop
+        human_text = await stt_provider.atranscribe(audio.file)
+    elif text:
+        print(f"⌨️ Processing text input: '{text}'")
+        human_text = text
+    
+    if audio and human_text == "":
+        print("❌ ERROR: No speech detected in recording")
+        return {"error": "No speech detected in your recording. Please speak up or use text input."}
+
+    if not human_text and stream_id:
+        print(f"❌ ERROR: No transcript for stream {stream_id}")
+        return {"error": "No speech was recognized in that recording (or it expired). Please try again or use text input."}
+
+    if not human_text:
+        error_msg = "Could not transcribe audio. "
+        stt_status = stt_provider.status()
+        if not stt_status["stt_available"]:
+            error_msg += "No speech recognition models loaded. "
+        if stt_provider.name == "whisper_vosk" and not stt_status["ffmpeg_available"]:
+            error_msg += "FFmpeg not available. "
+        error_msg += "Please use text input instead."
+        print(f"❌ ERROR: {error_msg}")
+        return {"error": error_msg}
     
-    return {"success": True, "transcribed_text": human_text}
+    print(f"\n💬 HUMAN SAID: \"{human_text}\"")
+    print(f"{'='*60}\n")
+    
+    # Add human utterance to discussion and wake the round waiting for it (on whichever worker)
+    def add_human(state):
+        state["utterances"].append({
+            "agent": "You",
+            "text": human_text,
+            "utterance_id": None,
+            "timestamp": time.time()
+        })
+        state["awaiting_human"] = False
+    await simulation_store.aupdate(sim_id, add_human)
+    await simulation_store.apublish(sim_id, "human_input")
+
+    # --------------------------------------------------
+    # 🧠 SCORE IN THE BACKGROUND (Gemini feedback + DB write)
+    # --------------------------------------------------
+    job_id = await simulation_store.arun(
+        feedback_jobs.submit, sim_id, score_human_response,
+        sim_id, sim["topic"], sim["current_round"] + 1, human_text
+    )
+    print(f"📨 Feedback job queued: {job_id}")
+
+    return {"success": True, "transcribed_text": human_text, "feedback_job_id": job_id}
 
 
 # -------------------------
 # 🧩 Helper: Pre-generate agent response
 # -------------------------
-def generate_agent_response(agent, topic, utterances_snapshot, human_just_spoke):
-    """Pre-generate an agent's response text and audio."""
+def generate_agent_text(agent, topic, transcript_snapshot, human_just_spoke=False):
+    """Generate an agent's response text for a (possibly speculated) transcript."""
     prompt = agent.prepare_prompt(
         topic,
-        utterances_snapshot,
+        transcript_snapshot,
         human_just_spoke=human_just_spoke
     )
-    text = agent.generate_response(prompt)
-    audio = text_to_audio_base64(text, agent.name)
-    return text, audio
+    return agent.generate_response(prompt)
 
 
-@app.post("/next_round/{sim_id}")
-def next_round(sim_id: str):
-    if sim_id not in SIMULATIONS:
-        return {"error": "Simulation ID not found."}
-    
-    sim = SIMULATIONS[sim_id]
-    
-    if sim["current_round"] >= sim["total_rounds"]:
-
-        db = SessionLocal()
+def final_discussion_feedback(sim_id):
+    """Print the end-of-discussion coaching summary of the human's responses (DB + LLM, blocking)."""
+    # Per-turn scores are written by background jobs; let the last ones land first
+    if not feedback_jobs.wait(sim_id):
+        print("[WARNING] ⚠️ Feedback jobs still running; final feedback may miss the last turn")
+    db = SessionLocal()
 
-        try:
-            responses = db.query(HumanResponse).filter(
-                HumanResponse.discussion_id == int(sim_id)
-            ).all()
+    try:
+        responses = db.query(HumanResponse).filter(
+            HumanResponse.discussion_id == int(sim_id)
+        ).all()
 
-            if responses:
-                combined_text = "\n".join([r.text for r in responses])
+        if responses:
+            combined_text = "\n".join([r.text for r in responses])
 
-                final_prompt = f"""
+            final_prompt = f"""
     You are a communication coach.
 
     Here are all responses from a student in a group discussion:
@@ -824,79 +773,151 @@ def next_round(sim_id: str):
     Keep it constructive.
     """
 
-                final_feedback = safe_generate(final_prompt)
+            final_feedback = safe_generate(final_prompt, site="evaluation")
 
-                print("\n🎓 FINAL DISCUSSION FEEDBACK:")
-                print(final_feedback)
+            print("\n🎓 FINAL DISCUSSION FEEDBACK:")
+            print(final_feedback)
+
+    finally:
+        db.close()
+        release_simulation(sim_id)
 
-        finally:
-            db.close()
 
+# Rounds streamed by this worker; every key exists up front, so /metrics can copy it from another thread
+ROUND_STATS = collections.Counter(active=0, started=0, completed=0, cancelled=0, failed=0)
+
+
+@app.post("/next_round/{sim_id}")
+async def next_round(sim_id: str, stream: bool = False):
+    """
+    Run one round as an SSE stream. With `stream=true`, live turns also emit
+    `partial` text events as tokens arrive and `audio_chunk` events per
+    finished sentence, ahead of the usual `response` event.
+
+    The round runs as an async generator on the event loop: LLM and TTS calls
+    are awaited and every wait (speculated turn, human reply, playback) sleeps
+    on a store signal, so an idle round holds no thread. If the client
+    disconnects, the round is cancelled where it stands and its in-flight
+    requests with it.
+    """
+    sim = await simulation_store.aget(sim_id)
+    if sim is None:
+        return {"error": "Simulation ID not found."}
+    
+    if sim["current_round"] >= sim["total_rounds"]:
+        # DB query + LLM call; keep them off the event loop
+        await asyncio.get_running_loop().run_in_executor(None, final_discussion_feedback, sim_id)
         return {"message": "Simulation completed.", "utterances": sim["utterances"]}
         
-    utterances = sim["utterances"]
-    agents = sim["agents"]
+    transcript = sync_transcript(sim_id, sim["utterances"])
+    agents = [Agent(a["name"], a["persona"]) for a in sim["agents"]]
     topic = sim["topic"]
+    current_round = sim["current_round"]
+
+    async def interrupt_reserved():
+        return await simulation_store.afield(sim_id, "interrupt_reserved")
     
     # ✅ SPEAKING ORDER: FIXED SEQUENTIAL AGENTS ONLY (NO RANDOM, NO HUMAN)
     speaking_order = agents  # Agents always speak in the same order each round
     
     print(f"\n{'='*60}")
-    print(f"🔄 ROUND {sim['current_round'] + 1} STARTING")
+    print(f"🔄 ROUND {current_round + 1} STARTING")
     print(f"{'='*60}")
     print(f"📢 Speaking order: {[a.name for a in speaking_order]}")
     print(f"ℹ️ Human can interrupt anytime via button")
     print(f"{'='*60}\n")
     
-    def generate():
-        nonlocal utterances
+    async def live_turn(agent, prompt, turn):
+        """
+        Generate a turn now. Streamed turns forward their SSE frames as they
+        come; either way (text, audio bytes) are left in `turn`.
+        """
+        if not stream:
+            turn["text"] = await agent.agenerate_response(prompt)
+            turn["audio"] = await atext_to_audio_bytes(turn["text"], agent.name)
+            return
+        yield f"data: {json.dumps({'type': 'agent_speaking', 'agent': agent.name})}\n\n"
+        text, audio_chunks = "", []
+        async for kind, value in agent.astream_response(prompt):
+            if kind == "partial":
+                yield f"data: {json.dumps({'type': 'partial', 'agent': agent.name, 'text': value})}\n\n"
+            elif kind == "audio_chunk":
+                _, chunk_url = store_audio(sim_id, value)
+                yield f"data: {json.dumps({'type': 'audio_chunk', 'agent': agent.name, 'index': len(audio_chunks), 'audio_url': chunk_url})}\n\n"
+                audio_chunks.append(value)
+            else:
+                text = value
+        turn["text"] = text
+        turn["audio"] = tts_provider.concat(audio_chunks) if audio_chunks else None
+
+    async def announce_feedback():
+        """SSE frames for feedback jobs of this simulation that finished since the last check."""
+        return [
+            f"data: {json.dumps({'type': 'feedback_ready', 'job_id': job['job_id'], 'status': job['status'], 'feedback': job['result']})}\n\n"
+            for job in await simulation_store.arun(feedback_jobs.pop_finished, sim_id)
+        ]
+
+    async def generate():
+        nonlocal transcript
         human_just_spoke = False
-        next_agent_future = None
-        next_agent_index = 0  # ✅ Track which agent to prepare
+        # Speculates up to SPECULATION_DEPTH agents ahead, each built on the turns before it
+        pipeline = SpeculativePipeline(
+            speaking_order,
+            generate_text=lambda a, view: generate_agent_text(a, topic, view),
+            synthesize=text_to_audio_bytes,
+            # A finished speculated turn wakes the wait below, like an interrupt does
+            on_done=lambda _: simulation_store.wake(sim_id)
+        )
+        ROUND_STATS["active"] += 1
+        ROUND_STATS["started"] += 1
+        outcome = "failed"
 
-        with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+        try:
             for i, agent in enumerate(speaking_order):
-                sim["current_speaker"] = agent.name
-                text, audio_base64 = None, None
-
-                # ── WAIT FOR PRE-GENERATED TEXT (if any) AND CHECK FOR INTERRUPTS ──
-                if next_agent_future is not None:
-                    wait_time = 0
-                    while wait_time < 90:
-                        if sim["interrupt_reserved"]:
-                            print(f"\n🔔 INTERRUPT DETECTED! Discarding pre-generated text for {agent.name}")
-                            next_agent_future = None
-                            # We break immediately here because the agent hasn't started speaking yet,
-                            # so we can switch to the human right away.
-                            break
-                        try:
-                            text, audio_base64 = next_agent_future.result(timeout=0.5)
+                for frame in await announce_feedback():
+                    yield frame
+                await simulation_store.aupdate(sim_id, lambda state: state.update(current_speaker=agent.name))
+                text, audio = None, None
+                announced = False
+
+                # ── WAIT FOR SPECULATED TEXT (if any) AND CHECK FOR INTERRUPTS ──
+                if pipeline.has(i):
+                    # Sleeps until the speculated turn finishes or an interrupt is reserved (max 90 seconds)
+                    cursor = await simulation_store.acursor(sim_id)
+                    interrupted = await interrupt_reserved() or bool(await simulation_store.await_signals(
+                        sim_id, ("interrupt",), cursor, 90, until=lambda: pipeline.ready(i)
+                    ))
+                    if interrupted:
+                        print(f"\n🔔 INTERRUPT DETECTED! Discarding pre-generated text for {agent.name}")
+                        # The agent hasn't started speaking yet, so we can switch to the human right away.
+                    elif pipeline.ready(i):
+                        speculated = pipeline.result(i, timeout=0)
+                        if speculated is not None and not is_error_marker(speculated[0]):
+                            text, audio = speculated
                             print(f"✅ Using pre-generated text for {agent.name}")
-                            break
-                        except concurrent.futures.TimeoutError:
-                            wait_time += 0.5
-                            continue
+                    if text is None:
+                        # Later speculated turns were built on this one; they are stale now
+                        pipeline.invalidate(i)
 
                 # ── HANDLE INTERRUPT: HUMAN TURN BEFORE THIS AGENT SPEAKS ──
-                if sim["interrupt_reserved"]:
-                    sim["interrupt_reserved"] = False
+                if await interrupt_reserved():
+                    # Mark the human turn open before announcing it, so a fast reply isn't missed
+                    cursor = await simulation_store.acursor(sim_id)
+                    await simulation_store.aupdate(sim_id, lambda state: state.update(interrupt_reserved=False, awaiting_human=True))
                     
                     # Signal human turn immediately
                     yield f"data: {json.dumps({'type': 'human_start'})}\n\n"
-                    sim["awaiting_human"] = True
 
-                    # Wait for human input (max 120 seconds)
-                    max_wait = 120
-                    waited = 0
-                    while sim["awaiting_human"] and waited < max_wait:
-                        time.sleep(1)
-                        waited += 1
+                    # Sleep until submit_human_input signals (max 120 seconds)
+                    await simulation_store.await_signals(sim_id, ("human_input",), cursor, 120)
 
-                    if waited >= max_wait:
+                    if await simulation_store.afield(sim_id, "awaiting_human"):
                         print("⏰ TIMEOUT: Human took too long to respond")
                         yield f"data: {json.dumps({'type': 'error', 'message': 'Timeout waiting for human input'})}\n\n"
                     else:
-                        human_utterance = sim["utterances"][-1]
+                        utterances = await simulation_store.afield(sim_id, "utterances")
+                        transcript = sync_transcript(sim_id, utterances)
+                        human_utterance = utterances[-1]
                         print(f"✅ Human submitted: \"{human_utterance['text']}\"")
                         yield f"data: {json.dumps({'type': 'human_response', 'text': human_utterance['text']})}\n\n"
                         human_just_spoke = True
@@ -904,115 +925,231 @@ def next_round(sim_id: str):
                     # RE-GENERATE THIS AGENT'S TEXT NOW (incorporating human input)
                     print(f"🔄 Re-generating {agent.name}'s text (incorporating human input)...")
                     prompt = agent.prepare_prompt(
-                        topic, list(utterances),
-                        is_first=(i == 0 and sim["current_round"] == 0),
+                        topic, transcript.snapshot(),
+                        is_first=(i == 0 and current_round == 0),
                         human_just_spoke=human_just_spoke
                     )
-                    text = agent.generate_response(prompt)
-                    audio_base64 = text_to_audio_base64(text, agent.name)
+                    turn = {}
+                    async for frame in live_turn(agent, prompt, turn):
+                        yield frame
+                    text, audio, announced = turn["text"], turn["audio"], stream
                     human_just_spoke = False
-                    
-                    # ✅ Clear next_agent_future when human interrupts
-                    next_agent_future = None
+                    pipeline.record_miss()
 
                 # ── IF NOT INTERRUPTED AND NO PRE-GENERATED TEXT ──
                 elif text is None:
                     print(f"\n💭 {agent.name} is thinking...")
                     prompt = agent.prepare_prompt(
-                        topic, list(utterances),
-                        is_first=(i == 0 and sim["current_round"] == 0),
+                        topic, transcript.snapshot(),
+                        is_first=(i == 0 and current_round == 0),
                         human_just_spoke=human_just_spoke
                     )
-                    text = agent.generate_response(prompt)
-                    audio_base64 = text_to_audio_base64(text, agent.name)
+                    turn = {}
+                    async for frame in live_turn(agent, prompt, turn):
+                        yield frame
+                    text, audio, announced = turn["text"], turn["audio"], stream
+                    pipeline.record_miss()
+
+                # ── A FAILED CALL (rate limit, timeout, provider error) IS NOT A TURN ──
+                if is_error_marker(text):
+                    print(f"[WARNING] ⚠️ {agent.name}'s turn failed ({text or 'empty response'}); skipping it")
+                    yield f"data: {json.dumps({'type': 'error', 'agent': agent.name, 'message': f'{agent.name} could not respond this turn'})}\n\n"
+                    # Speculated turns after this one were conditioned on the failed text
+                    pipeline.invalidate(i + 1)
+                    continue
 
                 # ── ADD TO UTTERANCES AND SEND TO FRONTEND ──
+                utterance_id, audio_url = store_audio(sim_id, audio)
+                duration = clip_duration(audio, tts_provider.mime_type)
                 utterance_data = {
                     "agent": agent.name,
                     "text": text,
-                    "audio": audio_base64,
+                    "utterance_id": utterance_id,
                     "timestamp": time.time()
                 }
-                utterances.append(utterance_data)
+                transcript = await simulation_store.arun(append_utterance, sim_id, utterance_data)
 
                 print(f"🗣️ {agent.name}: \"{text}\"")
-                yield f"data: {json.dumps({'type': 'agent_speaking', 'agent': agent.name})}\n\n"
-                yield f"data: {json.dumps({'type': 'response', 'agent': agent.name, 'text': text, 'audio': audio_base64})}\n\n"
-
-                # ── START PRE-GENERATING ONLY THE NEXT AGENT IN SEQUENCE ──
-                next_i = i + 1
-                if next_i < len(speaking_order):
-                    next_agent = speaking_order[next_i]
-                    print(f"⏳ Pre-generating text for {next_agent.name} (next in sequence)...")
-                    next_agent_future = executor.submit(
-                        generate_agent_response,
-                        next_agent, topic, list(utterances), False
-                    )
+                if not announced:
+                    yield f"data: {json.dumps({'type': 'agent_speaking', 'agent': agent.name})}\n\n"
+                playback_cursor = await simulation_store.acursor(sim_id)  # Acks for earlier clips don't count
+                yield f"data: {json.dumps({'type': 'response', 'agent': agent.name, 'text': text, 'audio_url': audio_url, 'utterance_id': utterance_id, 'duration': round(duration, 2) if duration else None, 'streamed': announced})}\n\n"
+
+                # ── KEEP SPECULATING THE NEXT AGENTS IN SEQUENCE ──
+                pipeline.advance(i, transcript.snapshot())
 
                 # ── SYNC BACKEND LOOP WITH FRONTEND AUDIO PLAYBACK ──
+                # Waits for the real clip length, or less if the client acks playback
                 if text:
-                    word_count = len(text.split())
-                    estimated_audio_duration = word_count / 1.8 
-                    sleep_time = estimated_audio_duration + 1.5
+                    if duration:
+                        sleep_time = (duration + PLAYBACK_MARGIN) * PLAYBACK_SYNC_SCALE
+                        if await simulation_store.afield(sim_id, "playback_acks"):
+                            # This client reports when audio really ends; allow for fetch/decode delay
+                            sleep_time += PLAYBACK_ACK_GRACE * PLAYBACK_SYNC_SCALE
+                    else:
+                        # No clip (TTS failed): leave time to read the text
+                        word_count = len(text.split())
+                        sleep_time = (word_count / 1.8 + 1.5) * PLAYBACK_SYNC_SCALE
                     
                     print(f"⏳ Backend syncing with frontend audio playback ({sleep_time:.1f}s)...")
-                    slept = 0
-                    interrupt_notified = False
-                    while slept < sleep_time:
-                        if sim["interrupt_reserved"] and not interrupt_notified:
+                    deadline = time.monotonic() + sleep_time
+                    # Reserved while this turn was generated (before the cursor was taken)
+                    interrupt_notified = await interrupt_reserved()
+                    if interrupt_notified:
+                        pipeline.invalidate(i + 1)
+                    while True:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        # Wakes up as soon as the client acks this clip or an interrupt is reserved (on any worker)
+                        signals = await simulation_store.await_signals(sim_id, ("playback_finished", "interrupt"), playback_cursor, remaining)
+                        if not signals:
+                            break
+                        playback_cursor = signals[-1].seq
+                        if not interrupt_notified and any(s.kind == "interrupt" for s in signals):
                             print(f"\n🔔 INTERRUPT DETECTED during {agent.name}'s audio playback sync! Will switch to human after audio finishes.")
                             interrupt_notified = True
+                            # The human speaks next, so every speculated turn after this one is stale
+                            pipeline.invalidate(i + 1)
                             # ✅ FIX: Do NOT break here, let the audio finish playing!
-                            
-                        # If a new client connects or something, we still sleep the exact amount.
-                        time.sleep(0.5)
-                        slept += 0.5
+                        if any(s.kind == "playback_finished" and s.data["utterance_id"] in (None, utterance_id) for s in signals):
+                            print(f"✅ Client finished playing {agent.name}'s audio")
+                            break
 
             # ✅ ROUND COMPLETE
-            sim["current_round"] += 1
-            print(f"\n🎉 Round {sim['current_round']} completed!\n")
-            yield f"data: {json.dumps({'type': 'complete', 'round': sim['current_round']})}\n\n"
+            for frame in await announce_feedback():
+                yield frame
+            def finish_round(state):
+                state["current_round"] += 1
+                return state["current_round"]
+            completed = await simulation_store.aupdate(sim_id, finish_round)
+            print(f"\n🎉 Round {completed} completed!\n")
+            yield f"data: {json.dumps({'type': 'complete', 'round': completed})}\n\n"
+            outcome = "completed"
+        except (asyncio.CancelledError, GeneratorExit):
+            # Client disconnected: the awaited LLM/TTS call is cancelled with us; don't leave the human turn open
+            print(f"🔌 Client left during round {current_round + 1} of simulation {sim_id}; round cancelled")
+            # A closing generator can't await, so the write is handed off rather than awaited
+            simulation_store.submit(
+                simulation_store.update, sim_id, lambda state: state.update(awaiting_human=False, current_speaker=None)
+            )
+            outcome = "cancelled"
+            raise
+        finally:
+            # Client disconnects and early exits drop whatever is still speculated
+            pipeline.close()
+            ROUND_STATS["active"] -= 1
+            ROUND_STATS[outcome] += 1
     
     return StreamingResponse(generate(), media_type="text/event-stream")
 
+@app.get("/audio/{sim_id}/{utterance_id}")
+def get_audio(sim_id: str, utterance_id: str, request: Request):
+    """Serve a stored agent clip with Range, ETag and long-lived cache headers."""
+    clip = audio_store.get(sim_id, utterance_id)
+    if clip is None:
+        return Response(status_code=404)
+
+    size = len(clip.data)
+    headers = {
+        "Accept-Ranges": "bytes",
+        # Clip ids are never reused, so browsers may keep them as long as they like
+        "Cache-Control": "private, max-age=86400, immutable",
+        "ETag": clip.etag,
+    }
+    if request.headers.get("if-none-match") == clip.etag:
+        return Response(status_code=304, headers=headers)
+
+    byte_range = parse_range(request.headers.get("range"), size)
+    if byte_range == "unsatisfiable":
+        headers["Content-Range"] = f"bytes */{size}"
+        return Response(status_code=416, headers=headers)
+    if byte_range is not None:
+        start, end = byte_range
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        return Response(clip.data[start:end + 1], status_code=206, media_type=clip.mime_type, headers=headers)
+    return Response(clip.data, media_type=clip.mime_type, headers=headers)
+
+@app.get("/feedback_job/{job_id}")
+def get_feedback_job(job_id: str):
+    """Status and, once done, the scores of a queued feedback job."""
+    job = feedback_jobs.get(job_id)
+    if job is None:
+        return {"error": "Feedback job not found."}
+    return job
+
 @app.get("/simulation_status/{sim_id}")
 def get_status(sim_id: str):
     """Get current simulation status."""
-    if sim_id not in SIMULATIONS:
+    sim = simulation_store.get(sim_id)
+    if sim is None:
         return {"error": "Simulation ID not found."}
     
-    sim = SIMULATIONS[sim_id]
+    stt_status = stt_provider.status()
     return {
         "current_round": sim["current_round"],
         "total_rounds": sim["total_rounds"],
         "awaiting_human": sim["awaiting_human"],
         "utterances_count": len(sim["utterances"]),
-        "whisper_loaded": whisper_model is not None,
-        "ffmpeg_available": ffmpeg_available,
+        "whisper_loaded": stt_status["whisper_loaded"],
+        "ffmpeg_available": stt_status["ffmpeg_available"],
 
         # Optional: derived flag (recommended)
-        "voice_available": whisper_model is not None and ffmpeg_available
+        "voice_available": stt_status["whisper_loaded"] and stt_status["ffmpeg_available"]
     }
 
 @app.get("/health")
 def health_check():
     """Check if all required components are available."""
     status_msg = []
+    stt_status = stt_provider.status()
     
-    if whisper_model is not None:
+    if stt_status["whisper_loaded"]:
         status_msg.append("Whisper (primary)")
-    if vosk_model is not None:
+    if stt_status["vosk_model_loaded"]:
         status_msg.append("Vosk (fallback)")
-    if not whisper_model and not vosk_model:
+    if stt_provider.name != "whisper_vosk" and stt_status["stt_available"]:
+        status_msg.append(f"{stt_provider.name} (stub)")
+    if not stt_status["stt_available"]:
         status_msg.append("No STT available")
     
+    # Per-model load state (loading / ready / failed); text endpoints don't wait for any of them
+    models = {**llm_gateway.provider.readiness(), **stt_provider.readiness()}
+
     return {
         "status": "ok",
+        "models": models,
+        "models_loading": [name for name, m in models.items() if m["state"] in ("pending", "loading")],
         "speech_recognition": " + ".join(status_msg) if status_msg else "unavailable",
-        "whisper_loaded": whisper_model is not None,
-        "vosk_model_loaded": vosk_model is not None,
-        "ffmpeg_available": ffmpeg_available,
-        "vosk_model_path": VOSK_MODEL_PATH if os.path.exists(VOSK_MODEL_PATH) else "Not found"
+        "whisper_loaded": stt_status["whisper_loaded"],
+        "whisper_engine": stt_status.get("whisper_engine"),
+        "vosk_model_loaded": stt_status["vosk_model_loaded"],
+        "ffmpeg_available": stt_status["ffmpeg_available"],
+        "vosk_model_path": stt_status["vosk_model_path"],
+        "providers": {
+            "llm": llm_gateway.provider.name,
+            "tts": tts_provider.name,
+            "stt": stt_provider.name
+        }
+    }
+
+
+@app.get("/metrics")
+def get_metrics():
+    """Runtime stats for the shared services used by every simulation."""
+    return {
+        "llm": llm_gateway.stats(),
+        "llm_cache": llm_cache.stats() if llm_cache else None,
+        "tts_cache": tts_cache.stats() if tts_cache else None,
+        "audio_store": audio_store.stats(),
+        "tts_pipeline": tts_pipeline_stats(),
+        "stt": stt_provider.stats(),
+        "stt_streams": {**stt_streams.stats(), "mode": stt_provider.stream_mode()},
+        "simulation_store": simulation_store.stats(),
+        "rounds": dict(ROUND_STATS),
+        "speculation": speculation_stats(),
+        "feedback_jobs": feedback_jobs.stats(),
+        "structured_output": structured_output_stats()
     }
 
 
@@ -1031,24 +1168,6 @@ def get_discussion_feedback(sim_id: str):
             HumanResponse.discussion_id == int(sim_id)
         ).order_by(HumanResponse.round_number).all()
 
-        def safe_parse_json_list(val):
-            if not val:
-                return []
-            try:
-                return json.loads(val)
-            except Exception:
-                # If the LLM returned garbage at the end (e.g. `]学]`), it throws JSONDecodeError
-                # We can strip the garbage or return it as a single raw string to avoid 500 Error
-                cleaned = str(val).strip()
-                # Find the last closing bracket to attempt rescuing the list
-                last_bracket = cleaned.rfind(']')
-                if last_bracket != -1:
-                    try:
-                        return json.loads(cleaned[:last_bracket+1])
-                    except:
-                        pass
-                return [cleaned]
-
         return {
             "discussion": {
                 "topic": discussion.topic,
@@ -1064,8 +1183,8 @@ def get_discussion_feedback(sim_id: str):
                 "overall": discussion.overall_score if hasattr(discussion, 'overall_score') else None,
                 "human_percentage": discussion.human_percentage if hasattr(discussion, 'human_percentage') else None,
                 "human_interrupt_count": discussion.human_interrupt_count if hasattr(discussion, 'human_interrupt_count') else 0,
-                "strengths": safe_parse_json_list(discussion.strengths if hasattr(discussion, 'strengths') else None),
-                "improvements": safe_parse_json_list(discussion.improvements if hasattr(discussion, 'improvements') else None),
+                "strengths": parse_json_list(discussion.strengths if hasattr(discussion, 'strengths') else None),
+                "improvements": parse_json_list(discussion.improvements if hasattr(discussion, 'improvements') else None),
                 "final_feedback": discussion.final_feedback if hasattr(discussion, 'final_feedback') else None,
                 "topic": discussion.topic,
             },
@@ -1086,12 +1205,28 @@ def get_discussion_feedback(sim_id: str):
         db.close()
 
 
+# What an evaluation field falls back to when the model never supplies it
+# (the values the DB save has always used for missing scores and lists)
+EVALUATION_DEFAULTS = {
+    "grammar": 0,
+    "clarity": 0,
+    "relevance": 0,
+    "politeness": 0,
+    "team_collaboration": 0,
+    "overall": 0,
+    "strengths": [],
+    "improvements": [],
+    "final_feedback": "",
+}
+
+
 @app.post("/end_discussion/{sim_id}")
 def end_discussion(sim_id: str):
-    if sim_id not in SIMULATIONS:
+    sim = simulation_store.get(sim_id)
+    if sim is None:
         return {"error": "Simulation ID not found."}
 
-    sim = SIMULATIONS[sim_id]
+    release_simulation(sim_id)
     utterances = sim["utterances"]
     # -------------------------
     # 📊 Participation Analysis
@@ -1210,39 +1345,20 @@ Return strictly in JSON format. For the score values, YOU MUST ONLY RETURN PURE
     print("📊 GENERATING DISCUSSION FEEDBACK")
     print("==============================")
 
-    result_text = safe_generate(evaluation_prompt, is_json=True)
-
-    # Strip markdown code fences if present (```json ... ```)
-    cleaned = result_text.strip()
-    if cleaned.startswith("```"):
-        # Remove opening fence (```json or ```)
-        first_newline = cleaned.index("\n")
-        cleaned = cleaned[first_newline + 1:]
-        # Remove closing fence
-        if cleaned.endswith("```"):
-            cleaned = cleaned[:-3].strip()
-
-    # Isolate JSON explicitly to ignore conversational prefixes like "Here is the JSON:"
-    start_idx = cleaned.find("{")
-    end_idx = cleaned.rfind("}")
-    if start_idx != -1 and end_idx != -1:
-        cleaned = cleaned[start_idx:end_idx+1]
-
-    import re
-    # If the LLM still outputs `9/10` or `"9/10"` inside JSON values, clean it to valid numeric integers `9`
-    # E.g. `"grammar": 9/10` -> `"grammar": 9`
-    cleaned = re.sub(r'(:\s*)["\']?(\d+)/10["\']?', r'\1\2', cleaned)
-    
-    try:
-        raw_json = json.loads(cleaned)
-        # ✅ FIX: Convert keys to lowercase safely so the frontend doesn't miss them
-        result_json = {str(k).lower(): v for k, v in raw_json.items()}
-        result_json["human_percentage"] = human_percentage
-    except Exception as e:
+    # Tolerant parse + schema check; only missing fields are re-asked (see utils/structured_output.py)
+    evaluation, result_text = generate_structured(
+        lambda p, fixup: safe_generate(p, is_json=True, site="evaluation", use_cache=not fixup),
+        evaluation_prompt, DiscussionEvaluation, is_error=is_error_marker, defaults=EVALUATION_DEFAULTS
+    )
+    if evaluation is None:
         print("⚠️ Could not parse JSON")
         print(result_text)
         return {"error": "Evaluation parsing failed"}
 
+    # Keys are lowercased by the parser so the frontend doesn't miss them
+    result_json = evaluation.model_dump()
+    result_json["human_percentage"] = human_percentage
+
     print("\n📈 HUMAN PERFORMANCE METRICS")
     print("--------------------------------")
     print(f"Grammar: {result_json.get('grammar')}/10")
@@ -0,0 +1,201 @@
+import collections
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# -------------------------
+# ⚙️ Cache Settings
+# -------------------------
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "1") != "0"
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "2000"))
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", str(24 * 3600)))
+LLM_CACHE_DB = os.getenv("LLM_CACHE_DB", "")  # Empty = memory only
+LLM_CACHE_DB_MAX_ENTRIES = int(os.getenv("LLM_CACHE_DB_MAX_ENTRIES", "20000"))
+LLM_CACHE_DB_MAX_BYTES = int(os.getenv("LLM_CACHE_DB_MAX_BYTES", str(256 * 1024 * 1024)))
+LLM_CACHE_DB_SWEEP_EVERY = int(os.getenv("LLM_CACHE_DB_SWEEP_EVERY", "100"))  # Disk writes between sweeps
+
+
+def cache_key(model, prompt, is_json):
+    """Content address for a request: sha256 over (model, prompt, JSON mode)."""
+    payload = json.dumps([model, prompt, bool(is_json)], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    """
+    Two-tier response cache.
+
+    Memory tier: LRU bounded by entry count and total text size.
+    Disk tier (optional): SQLite table that survives restarts; hits are
+    promoted back into memory. Every `db_sweep_every` writes, expired rows are
+    deleted and the oldest ones trimmed to `db_max_entries`/`db_max_bytes`.
+    Both tiers honour the same TTL.
+
+    The disk tier does blocking I/O: callers on an event loop should run
+    `get`/`put` in an executor when `disk_backed` is set.
+    """
+
+    def __init__(self, max_entries=LLM_CACHE_MAX_ENTRIES, max_bytes=LLM_CACHE_MAX_BYTES,
+                 ttl=LLM_CACHE_TTL, db_path=LLM_CACHE_DB, db_max_entries=LLM_CACHE_DB_MAX_ENTRIES,
+                 db_max_bytes=LLM_CACHE_DB_MAX_BYTES, db_sweep_every=LLM_CACHE_DB_SWEEP_EVERY):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.db_path = db_path or None
+        self.db_max_entries = db_max_entries
+        self.db_max_bytes = db_max_bytes
+        self.db_sweep_every = max(1, db_sweep_every)
+        self._db_writes = 0
+        self._db_entries = None
+
+        self._lock = threading.Lock()
+        self._entries = collections.OrderedDict()  # key -> (text, stored_at)
+        self._bytes = 0
+        self._counts = collections.Counter()
+
+        self._db = None
+        if self.db_path:
+            try:
+                self._db = sqlite3.connect(self.db_path, check_same_thread=False)
+                self._db.execute("PRAGMA journal_mode=WAL")
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS llm_cache ("
+                    "key TEXT PRIMARY KEY, text TEXT NOT NULL, stored_at REAL NOT NULL)"
+                )
+                self._db.execute("CREATE INDEX IF NOT EXISTS llm_cache_stored_at ON llm_cache (stored_at)")
+                self._db.commit()
+                self._sweep_disk()  # A file left by an earlier run may be over the limits
+                print(f"[INFO] ✅ LLM cache disk tier at: {self.db_path}")
+            except Exception as e:
+                self._db = None
+                print(f"[WARNING] ⚠️ LLM cache disk tier disabled: {e}")
+
+    @property
+    def disk_backed(self):
+        return self._db is not None
+
+    def _expired(self, stored_at):
+        return self.ttl > 0 and time.time() - stored_at > self.ttl
+
+    def _sweep_disk(self):
+        """Drop expired rows, then the oldest beyond the entry/size limits. Caller holds the lock (or is __init__)."""
+        if self.ttl > 0:
+            expired = self._db.execute("DELETE FROM llm_cache WHERE stored_at < ?", (time.time() - self.ttl,)).rowcount
+            self._counts["expired"] += expired
+        # Newest first, with a running total of text bytes: everything past either limit goes
+        trimmed = self._db.execute(
+            "DELETE FROM llm_cache WHERE key IN ("
+            " SELECT key FROM ("
+            "  SELECT key, ROW_NUMBER() OVER newest AS n, SUM(LENGTH(CAST(text AS BLOB))) OVER newest AS total"
+            "  FROM llm_cache WINDOW newest AS (ORDER BY stored_at DESC, key)"
+            " ) WHERE n > ? OR total > ?)",
+            (self.db_max_entries, self.db_max_bytes)
+        ).rowcount
+        self._counts["disk_evictions"] += trimmed
+        self._db.commit()
+        self._db_entries = self._db.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+
+    def _put_memory(self, key, text, stored_at):
+        size = len(text.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._bytes -= len(self._entries.pop(key)[0].encode("utf-8"))
+        self._entries[key] = (text, stored_at)
+        self._bytes += size
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            _, (old_text, _) = self._entries.popitem(last=False)
+            self._bytes -= len(old_text.encode("utf-8"))
+            self._counts["evictions"] += 1
+
+    def get(self, key):
+        """Return cached text or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if not self._expired(entry[1]):
+                    self._entries.move_to_end(key)
+                    self._counts["hits"] += 1
+                    return entry[0]
+                self._bytes -= len(self._entries.pop(key)[0].encode("utf-8"))
+                self._counts["expired"] += 1
+
+            if self._db is not None:
+                try:
+                    row = self._db.execute(
+                        "SELECT text, stored_at FROM llm_cache WHERE key = ?", (key,)
+                    ).fetchone()
+                except sqlite3.Error as e:
+                    print(f"[WARNING] ⚠️ LLM cache disk read failed: {e}")
+                    row = None
+                if row is not None:
+                    if not self._expired(row[1]):
+                        self._put_memory(key, row[0], row[1])
+                        self._counts["hits"] += 1
+                        self._counts["disk_hits"] += 1
+                        return row[0]
+                    try:
+                        self._db.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                        self._db.commit()
+                    except sqlite3.Error as e:
+                        print(f"[WARNING] ⚠️ LLM cache disk delete failed: {e}")
+                    self._counts["expired"] += 1
+
+            self._counts["misses"] += 1
+            return None
+
+    def put(self, key, text):
+        with self._lock:
+            stored_at = time.time()
+            self._put_memory(key, text, stored_at)
+            if self._db is not None:
+                try:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO llm_cache (key, text, stored_at) VALUES (?, ?, ?)",
+                        (key, text, stored_at)
+                    )
+                    self._db.commit()
+                    self._db_writes += 1
+                    if self._db_writes % self.db_sweep_every == 0:
+                        self._sweep_disk()
+                except sqlite3.Error as e:
+                    print(f"[WARNING] ⚠️ LLM cache disk write failed: {e}")
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            if self._db is not None:
+                try:
+                    self._db.execute("DELETE FROM llm_cache")
+                    self._db.commit()
+                    self._db_entries = 0
+                except sqlite3.Error as e:
+                    print(f"[WARNING] ⚠️ LLM cache disk clear failed: {e}")
+
+    def stats(self):
+        with self._lock:
+            hits = self._counts.get("hits", 0)
+            misses = self._counts.get("misses", 0)
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl,
+                "disk_tier": self.db_path if self._db is not None else None,
+                "disk_entries": self._db_entries,  # As of the last sweep
+                "disk_max_entries": self.db_max_entries if self._db is not None else None,
+                "disk_max_bytes": self.db_max_bytes if self._db is not None else None,
+                "disk_evictions": self._counts.get("disk_evictions", 0),
+                "hits": hits,
+                "disk_hits": self._counts.get("disk_hits", 0),
+                "misses": misses,
+                "evictions": self._counts.get("evictions", 0),
+                "expired": self._counts.get("expired", 0),
+                "hit_rate": round(hits / (hits + misses), 3) if hits + misses else None,
+            }
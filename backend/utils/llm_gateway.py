@@ -0,0 +1,437 @@
+import asyncio
+import collections
+import concurrent.futures
+import os
+import queue
+import threading
+import time
+
+from utils.call_policy import SiteStats, backoff_delay, is_transient_error, policy_for
+from utils.llm_cache import cache_key
+from utils.rate_limiter import RateLimiter, RateLimitExceeded, estimate_tokens, is_provider_rate_limit
+
+# -------------------------
+# ⚙️ Gateway Settings
+# -------------------------
+LLM_MODEL = os.getenv("LLM_MODEL", "gemini-2.5-flash")
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LATENCY_WINDOW = 500  # Number of recent calls kept for percentile stats
+
+
+class _LoopSink:
+    """`queue.Queue.put()` stand-in that hands items to an asyncio.Queue on another loop."""
+
+    def __init__(self, loop, items):
+        self._loop = loop
+        self._items = items
+
+    def put(self, item):
+        try:
+            self._loop.call_soon_threadsafe(self._items.put_nowait, item)
+        except RuntimeError:
+            pass  # The consumer's loop has shut down
+
+
+class LLMGateway:
+    """
+    Long-lived gateway for every LLM call made by the simulator.
+
+    One shared provider (see utils/providers.py) is driven from a single
+    background asyncio loop. A semaphore bounds how many requests are in
+    flight; everything else waits in the queue. Each call carries its own
+    deadline (queue time included), and when it expires the underlying
+    request task is cancelled instead of being left running on a leaked
+    worker thread.
+
+    If a cache is attached, identical (model, prompt, JSON mode) requests are
+    answered from it without touching the network. Everything else passes the
+    process-wide rate limiter before it may take a concurrency slot.
+
+    Each call names its call site (agent_turn, feedback, evaluation, ...).
+    The site's policy decides how often transient errors are retried with
+    jittered backoff, and whether a duplicate request is fired once the
+    first one runs past the site's p95 latency (first answer wins).
+    """
+
+    def __init__(self, provider, max_concurrency=LLM_MAX_CONCURRENCY, cache=None, limiter=None):
+        self.provider = provider
+        self.model = provider.model
+        self.max_concurrency = max_concurrency
+        self.cache = cache
+        self.limiter = limiter or RateLimiter()
+
+        self._loop = asyncio.new_event_loop()
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._thread = threading.Thread(
+            target=self._run_loop, name="llm-gateway", daemon=True
+        )
+        self._thread.start()
+
+        # Stats (guarded by _lock, read from any thread)
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._in_flight = 0
+        self._counts = collections.Counter()
+        self._latencies = collections.deque(maxlen=LATENCY_WINDOW)
+        self.sites = SiteStats()
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_forever()
+
+    def _bump(self, field, delta):
+        with self._lock:
+            setattr(self, field, getattr(self, field) + delta)
+
+    async def _call(self, prompt, is_json, deadline, site="default"):
+        """Wait for rate-limit capacity and a free slot, then run one provider request."""
+        self._bump("_queued", 1)
+        queued = True
+        try:
+            await self.limiter.acquire(estimate_tokens(prompt), deadline)
+            async with self._semaphore:
+                self._bump("_queued", -1)
+                queued = False
+                self._bump("_in_flight", 1)
+                started = time.perf_counter()
+                try:
+                    text = await self.provider.generate(prompt, is_json=is_json)
+                except Exception as e:
+                    if is_provider_rate_limit(e):
+                        self.limiter.penalize()
+                    raise
+                finally:
+                    self._bump("_in_flight", -1)
+                elapsed = time.perf_counter() - started
+                with self._lock:
+                    self._latencies.append(elapsed)
+                self.sites.record_latency(site, elapsed)
+                return text
+        finally:
+            if queued:
+                self._bump("_queued", -1)
+
+    async def _stream_attempt(self, prompt, sink, deadline, site, parts):
+        """One streaming provider request; chunks go to `sink` and are collected in `parts`."""
+        self._bump("_queued", 1)
+        queued = True
+        try:
+            await self.limiter.acquire(estimate_tokens(prompt), deadline)
+            async with self._semaphore:
+                self._bump("_queued", -1)
+                queued = False
+                self._bump("_in_flight", 1)
+                started = time.perf_counter()
+                try:
+                    async for piece in self.provider.stream(prompt):
+                        parts.append(piece)
+                        sink.put(("chunk", piece))
+                except Exception as e:
+                    if is_provider_rate_limit(e):
+                        self.limiter.penalize()
+                    raise
+                finally:
+                    self._bump("_in_flight", -1)
+                elapsed = time.perf_counter() - started
+                with self._lock:
+                    self._latencies.append(elapsed)
+                self.sites.record_latency(site, elapsed)
+        finally:
+            if queued:
+                self._bump("_queued", -1)
+
+    async def _stream_call(self, prompt, sink, key, deadline, site="default"):
+        """
+        Run one streaming request, pushing text chunks into `sink` as they
+        arrive. Transient errors before the first chunk are retried under the
+        site's policy; once text has gone out, an error ends the stream.
+        """
+        policy = policy_for(site)
+        self.sites.count(site, "calls")
+        attempt = 0
+        try:
+            while True:
+                parts = []
+                try:
+                    await self._stream_attempt(prompt, sink, deadline, site, parts)
+                    break
+                except RateLimitExceeded:
+                    raise  # Our own backpressure: retrying would only add load
+                except Exception as e:
+                    if parts or attempt >= policy.retries or not is_transient_error(e):
+                        raise
+                    delay = backoff_delay(attempt)
+                    if time.monotonic() + delay >= deadline:
+                        raise
+                    attempt += 1
+                    self.sites.count(site, "retries")
+                    print(f"[RETRY] {site} stream attempt {attempt} in {delay:.1f}s after: {e}")
+                    await asyncio.sleep(delay)
+            with self._lock:
+                self._counts["completed"] += 1
+                self._counts["streamed"] += 1
+            if key is not None and parts:
+                self._cache_put(key, "".join(parts))
+        except asyncio.CancelledError:
+            with self._lock:
+                self._counts["cancelled"] += 1
+            raise
+        except RateLimitExceeded as e:
+            with self._lock:
+                self._counts["rate_limited"] += 1
+            sink.put(("error", e))
+        except Exception as e:
+            with self._lock:
+                self._counts["failed"] += 1
+            sink.put(("error", e))
+        finally:
+            sink.put(("done", None))
+
+    async def _hedged_call(self, prompt, is_json, deadline, site):
+        """One logical attempt; may fire a duplicate request past the site's p95."""
+        policy = policy_for(site)
+        primary = asyncio.ensure_future(self._call(prompt, is_json, deadline, site))
+        delay = self.sites.hedge_delay(site) if policy.hedge else None
+        if delay is None:
+            return await primary
+
+        tasks = {primary}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if done:
+                return primary.result()
+            if not self.sites.hedge_allowed(site):
+                return await primary
+
+            self.sites.count(site, "hedges_fired")
+            hedge = asyncio.ensure_future(self._call(prompt, is_json, deadline, site))
+            tasks.add(hedge)
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            self.sites.count(site, "hedges_won")
+                        return task.result()
+                if not tasks:
+                    # Both failed: surface the primary's error
+                    return primary.result()
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _call_with_retries(self, prompt, is_json, deadline, site):
+        policy = policy_for(site)
+        attempt = 0
+        while True:
+            try:
+                return await self._hedged_call(prompt, is_json, deadline, site)
+            except RateLimitExceeded:
+                raise  # Our own backpressure: retrying would only add load
+            except Exception as e:
+                if attempt >= policy.retries or not is_transient_error(e):
+                    raise
+                delay = backoff_delay(attempt)
+                if time.monotonic() + delay >= deadline:
+                    raise
+                attempt += 1
+                self.sites.count(site, "retries")
+                print(f"[RETRY] {site} attempt {attempt} in {delay:.1f}s after: {e}")
+                await asyncio.sleep(delay)
+
+    def _cache_put(self, key, text):
+        """Store without holding up the gateway loop (the disk tier commits to SQLite)."""
+        if self.cache.disk_backed:
+            self._loop.run_in_executor(None, self.cache.put, key, text)
+        else:
+            self.cache.put(key, text)
+
+    async def _cache_get(self, key):
+        """Cache lookup from any event loop; the disk tier is read on an executor thread."""
+        if self.cache.disk_backed:
+            return await asyncio.get_running_loop().run_in_executor(None, self.cache.get, key)
+        return self.cache.get(key)
+
+    async def _call_with_deadline(self, prompt, is_json, timeout, key=None, site="default"):
+        if key is not None:
+            cached = await self._cache_get(key)
+            if cached is not None:
+                return cached
+        self.sites.count(site, "calls")
+        try:
+            deadline = time.monotonic() + timeout
+            text = await asyncio.wait_for(self._call_with_retries(prompt, is_json, deadline, site), timeout)
+            with self._lock:
+                self._counts["completed"] += 1
+            if key is not None and text:
+                self._cache_put(key, text)
+            return text
+        except asyncio.TimeoutError:
+            with self._lock:
+                self._counts["timeouts"] += 1
+            raise
+        except asyncio.CancelledError:
+            with self._lock:
+                self._counts["cancelled"] += 1
+            raise
+        except RateLimitExceeded:
+            with self._lock:
+                self._counts["rate_limited"] += 1
+            raise
+        except Exception:
+            with self._lock:
+                self._counts["failed"] += 1
+            raise
+
+    def submit(self, prompt, is_json=False, timeout=60, use_cache=True, site="default"):
+        """
+        Schedule a call and return a `concurrent.futures.Future`.
+        Calling `.cancel()` on it aborts the in-flight request(s).
+        Pass `use_cache=False` where a fresh, varied answer matters, and
+        `site` to pick the retry/hedge policy (see utils/call_policy.py).
+        """
+        # The cache lookup runs on the gateway loop too: with a disk tier it
+        # does SQLite I/O, which must not block a caller that is an event loop
+        key = None
+        if self.cache is not None and use_cache:
+            key = cache_key(self.model, prompt, is_json)
+
+        return asyncio.run_coroutine_threadsafe(
+            self._call_with_deadline(prompt, is_json, timeout, key, site), self._loop
+        )
+
+    def generate(self, prompt, is_json=False, timeout=60, use_cache=True, site="default"):
+        """Blocking call. Raises `concurrent.futures.TimeoutError` past the deadline."""
+        future = self.submit(prompt, is_json=is_json, timeout=timeout, use_cache=use_cache, site=site)
+        try:
+            # The loop enforces the deadline; the small grace only covers hand-off.
+            return future.result(timeout=timeout + 1)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise
+
+    def stream(self, prompt, timeout=60, use_cache=True, site="default"):
+        """
+        Blocking iterator over text chunks as the model produces them.
+        A cache hit yields the whole answer as one chunk. Raises
+        `concurrent.futures.TimeoutError` once the deadline passes; closing the
+        iterator early cancels the request. `site` picks the retry policy for
+        transient errors that happen before the first chunk.
+        """
+        key = None
+        if self.cache is not None and use_cache:
+            key = cache_key(self.model, prompt, False)
+            cached = self.cache.get(key)
+            if cached is not None:
+                yield cached
+                return
+
+        sink = queue.Queue()
+        deadline = time.monotonic() + timeout
+        future = asyncio.run_coroutine_threadsafe(self._stream_call(prompt, sink, key, deadline, site), self._loop)
+        try:
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise concurrent.futures.TimeoutError()
+                try:
+                    kind, value = sink.get(timeout=remaining)
+                except queue.Empty:
+                    raise concurrent.futures.TimeoutError()
+                if kind == "chunk":
+                    yield value
+                elif kind == "error":
+                    raise value
+                else:
+                    return
+        except concurrent.futures.TimeoutError:
+            with self._lock:
+                self._counts["timeouts"] += 1
+            raise
+        finally:
+            future.cancel()
+
+    async def astream(self, prompt, timeout=60, use_cache=True, site="default"):
+        """
+        `stream()` for callers that already run on an event loop: same
+        chunks, deadline and cache behaviour, but waits without holding a
+        thread. Closing or cancelling the consumer cancels the request.
+        """
+        key = None
+        if self.cache is not None and use_cache:
+            key = cache_key(self.model, prompt, False)
+            cached = await self._cache_get(key)
+            if cached is not None:
+                yield cached
+                return
+
+        items = asyncio.Queue()
+        sink = _LoopSink(asyncio.get_running_loop(), items)
+        deadline = time.monotonic() + timeout
+        future = asyncio.run_coroutine_threadsafe(self._stream_call(prompt, sink, key, deadline, site), self._loop)
+        try:
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise concurrent.futures.TimeoutError()
+                try:
+                    kind, value = await asyncio.wait_for(items.get(), remaining)
+                except asyncio.TimeoutError:
+                    raise concurrent.futures.TimeoutError()
+                if kind == "chunk":
+                    yield value
+                elif kind == "error":
+                    raise value
+                else:
+                    return
+        except concurrent.futures.TimeoutError:
+            with self._lock:
+                self._counts["timeouts"] += 1
+            raise
+        finally:
+            future.cancel()
+
+    async def agenerate(self, prompt, is_json=False, timeout=60, use_cache=True, site="default"):
+        """Awaitable variant for callers that already run on an event loop."""
+        return await asyncio.wrap_future(
+            self.submit(prompt, is_json=is_json, timeout=timeout, use_cache=use_cache, site=site)
+        )
+
+    def stats(self):
+        """Snapshot of queue depth, concurrency and latency percentiles."""
+        with self._lock:
+            latencies = sorted(self._latencies)
+            counts = dict(self._counts)
+            queued, in_flight = self._queued, self._in_flight
+
+        def percentile(p):
+            if not latencies:
+                return None
+            index = min(len(latencies) - 1, int(round(p / 100 * (len(latencies) - 1))))
+            return round(latencies[index] * 1000, 1)
+
+        return {
+            "provider": self.provider.name,
+            "model": self.model,
+            "max_concurrency": self.max_concurrency,
+            "queue_depth": queued,
+            "in_flight": in_flight,
+            "completed": counts.get("completed", 0),
+            "failed": counts.get("failed", 0),
+            "timeouts": counts.get("timeouts", 0),
+            "cancelled": counts.get("cancelled", 0),
+            "rate_limited": counts.get("rate_limited", 0),
+            "streamed": counts.get("streamed", 0),
+            "latency_ms": {
+                "p50": percentile(50),
+                "p95": percentile(95),
+                "p99": percentile(99),
+                "samples": len(latencies),
+            },
+            "rate_limit": self.limiter.stats(),
+            "call_sites": self.sites.snapshot(),
+        }
+
+    def shutdown(self):
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
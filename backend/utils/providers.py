@@ -0,0 +1,625 @@
+import asyncio
+import hashlib
+import io
+import json
+import math
+import os
+import random
+import re
+import shutil
+import struct
+import subprocess
+import wave
+
+from utils.readiness import LoadState, Loader
+
+# -------------------------
+# ⚙️ Provider Selection
+# -------------------------
+# GD_PROVIDERS=stub switches every backend to the offline stubs at once;
+# the per-kind variables below override it individually.
+GD_PROVIDERS = os.getenv("GD_PROVIDERS", "live")
+_STUB_PROFILE = GD_PROVIDERS == "stub"
+
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "stub" if _STUB_PROFILE else "gemini")
+TTS_PROVIDER = os.getenv("TTS_PROVIDER", "tone" if _STUB_PROFILE else "gtts")
+STT_PROVIDER = os.getenv("STT_PROVIDER", "echo" if _STUB_PROFILE else "whisper_vosk")
+
+# Stub LLM latency as "mean_ms,jitter_ms" (uniform jitter around the mean)
+STUB_LLM_LATENCY_MS = os.getenv("STUB_LLM_LATENCY_MS", "0,0")
+STUB_SEED = os.getenv("STUB_SEED", "0")
+
+# Local TTS (TTS_PROVIDER=piper | espeak). Voices per agent as "Agent 1=voice,Agent 2=voice";
+# unlisted agents use the first voice. Falls back to gTTS if the engine can't start.
+LOCAL_TTS_VOICES = os.getenv("LOCAL_TTS_VOICES", "")
+PIPER_VOICES_DIR = os.getenv("PIPER_VOICES_DIR", "./piper_voices")  # <voice>.onnx + <voice>.onnx.json
+ESPEAK_BINARY = os.getenv("ESPEAK_BINARY", "espeak-ng")
+ESPEAK_SPEED = int(os.getenv("ESPEAK_SPEED", "165"))  # Words per minute
+
+
+def _seeded_rng(*parts):
+    """Deterministic RNG derived from the stub seed and the given inputs."""
+    digest = hashlib.sha256("|".join([STUB_SEED, *map(str, parts)]).encode("utf-8")).digest()
+    return random.Random(int.from_bytes(digest[:8], "big"))
+
+
+# -------------------------
+# 🧠 LLM Providers
+# -------------------------
+class LLMProvider:
+    """Text generation backend. Both methods run on the gateway's event loop."""
+    name = "base"
+    model = "unknown"
+
+    async def generate(self, prompt, is_json=False):
+        raise NotImplementedError
+
+    async def stream(self, prompt):
+        """Async iterator of text pieces. Default: one piece with the full answer."""
+        yield await self.generate(prompt)
+
+    def readiness(self):
+        return {}
+
+
+class GeminiLLM(LLMProvider):
+    """The google-genai SDK import and client setup run per MODEL_LOAD_MODE, not at app import."""
+    name = "gemini"
+
+    def __init__(self, api_key, model):
+        self.model = model
+        self._api_key = api_key
+        self._client = None
+        self.load_state = LoadState("gemini_client")
+        self._loader = Loader("gemini", self._load)
+
+    def _load(self):
+        def connect():
+            from google import genai
+            self._client = genai.Client(api_key=self._api_key)
+        self.load_state.run(connect)
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._loader.wait()
+            if self._client is None:
+                raise RuntimeError(f"Gemini client unavailable: {self.load_state.error}")
+        return self._client
+
+    def readiness(self):
+        return {"gemini_client": self.load_state.snapshot()}
+
+    async def generate(self, prompt, is_json=False):
+        kwargs = {}
+        if is_json:
+            kwargs["config"] = {"response_mime_type": "application/json"}
+        response = await self.client.aio.models.generate_content(
+            model=self.model,
+            contents=prompt,
+            **kwargs
+        )
+        return response.text if response and hasattr(response, "text") else None
+
+    async def stream(self, prompt):
+        stream = await self.client.aio.models.generate_content_stream(
+            model=self.model,
+            contents=prompt
+        )
+        async for chunk in stream:
+            piece = getattr(chunk, "text", None)
+            if piece:
+                yield piece
+
+
+class StubLLM(LLMProvider):
+    """
+    Offline, deterministic LLM. Replies are picked from canned templates by
+    hashing the prompt, and latency follows STUB_LLM_LATENCY_MS.
+    """
+    name = "stub"
+    model = "stub"
+
+    OPENERS = ["I think", "Honestly,", "I feel", "To be fair,", "I agree, but"]
+    CLAIMS = [
+        "{topic} has real benefits if we use it responsibly.",
+        "we should look at how {topic} affects students first.",
+        "{topic} sounds good, but the costs are often ignored.",
+        "the data on {topic} is still pretty mixed.",
+        "{topic} works best when people actually talk to each other.",
+    ]
+    FOLLOW_UPS = [
+        "That's my main point.",
+        "We can't ignore that.",
+        "What do you all think?",
+        "It's worth keeping in mind.",
+    ]
+
+    def __init__(self, latency_ms=STUB_LLM_LATENCY_MS):
+        mean, _, jitter = latency_ms.partition(",")
+        self.latency_mean = float(mean or 0) / 1000
+        self.latency_jitter = float(jitter or 0) / 1000
+
+    def _latency(self, prompt):
+        rng = _seeded_rng("latency", prompt)
+        return max(0.0, self.latency_mean + rng.uniform(-self.latency_jitter, self.latency_jitter))
+
+    def _reply(self, prompt, is_json):
+        rng = _seeded_rng("reply", prompt)
+        if is_json or "JSON" in prompt:
+            score = lambda: rng.randint(5, 9)
+            return json.dumps({
+                "grammar_score": score(), "clarity_score": score(),
+                "relevance_score": score(), "politeness_score": score(),
+                "grammar": score(), "clarity": score(), "relevance": score(),
+                "politeness": score(), "team_collaboration": score(), "overall": score(),
+                "strengths": ["Clear opinions", "Polite tone", "Stayed on topic"],
+                "improvements": ["Give examples", "Build on others", "Be more concise"],
+                "feedback": "Stub feedback: solid effort, keep practising.",
+                "final_feedback": "Stub evaluation: solid participation overall.",
+            })
+        match = re.search(r"Topic:\s*(.+)", prompt)
+        topic = match.group(1).strip() if match else "this topic"
+        return " ".join([
+            rng.choice(self.OPENERS),
+            rng.choice(self.CLAIMS).format(topic=topic),
+            rng.choice(self.FOLLOW_UPS),
+        ])
+
+    async def generate(self, prompt, is_json=False):
+        await asyncio.sleep(self._latency(prompt))
+        return self._reply(prompt, is_json)
+
+    async def stream(self, prompt):
+        words = self._reply(prompt, False).split(" ")
+        step = self._latency(prompt) / max(1, len(words))
+        for word in words:
+            await asyncio.sleep(step)
+            yield word + " "
+
+
+# -------------------------
+# 🔊 TTS Providers
+# -------------------------
+def concat_wav(clips):
+    """Join WAV clips that share one format (one voice) into a single WAV."""
+    params, frames = None, []
+    for clip in clips:
+        with wave.open(io.BytesIO(clip), "rb") as wf:
+            params = params or wf.getparams()
+            frames.append(wf.readframes(wf.getnframes()))
+    out = io.BytesIO()
+    with wave.open(out, "wb") as wf:
+        wf.setnchannels(params.nchannels)
+        wf.setsampwidth(params.sampwidth)
+        wf.setframerate(params.framerate)
+        wf.writeframes(b"".join(frames))
+    return out.getvalue()
+
+
+def parse_voice_map(spec, defaults):
+    """Parse "Agent 1=voice_a,Agent 2=voice_b" into a dict layered over `defaults`."""
+    voices = dict(defaults)
+    for item in spec.split(","):
+        agent, sep, voice = item.partition("=")
+        if sep and agent.strip() and voice.strip():
+            voices[agent.strip()] = voice.strip()
+    return voices
+
+
+class TTSProvider:
+    """Speech synthesis backend. `voice` is the agent name."""
+    name = "base"
+    mime_type = "audio/mpeg"
+
+    def synthesize(self, text, voice):
+        raise NotImplementedError
+
+    def voice_id(self, voice):
+        """Everything besides the text that changes the audio (used as a cache key)."""
+        return f"{self.name}:{voice}"
+
+    def concat(self, clips):
+        """Join per-sentence clips into one playable clip."""
+        return b"".join(clips)
+
+
+class GTTSProvider(TTSProvider):
+    name = "gtts"
+
+    ACCENT_MAP = {
+        "Agent 1": "co.in",
+        "Agent 2": "com",
+        "Agent 3": "co.uk",
+        "Agent 4": "com.au"
+    }
+
+    def __init__(self):
+        from gtts import gTTS
+        self._gtts = gTTS
+
+    def voice_id(self, voice):
+        # Agents sharing an accent share cached clips
+        return f"gtts:en:{self.ACCENT_MAP.get(voice, 'com')}"
+
+    def synthesize(self, text, voice):
+        tld = self.ACCENT_MAP.get(voice, "com")
+        tts = self._gtts(text, lang="en", tld=tld, slow=False)
+        audio_bytes = io.BytesIO()
+        tts.write_to_fp(audio_bytes)
+        return audio_bytes.getvalue()
+
+
+class ToneTTS(TTSProvider):
+    """Offline stub: a sine tone per agent, 0.4s per word, as 8 kHz mono WAV."""
+    name = "tone"
+    mime_type = "audio/wav"
+    SAMPLE_RATE = 8000
+    SECONDS_PER_WORD = 0.4
+
+    def __init__(self):
+        self._word_blocks = {}  # voice -> PCM for one word
+
+    def _pcm(self, text, voice):
+        block = self._word_blocks.get(voice)
+        if block is None:
+            freq = 220 + (int(hashlib.md5(voice.encode("utf-8")).hexdigest(), 16) % 8) * 55
+            frames = int(self.SAMPLE_RATE * self.SECONDS_PER_WORD)
+            block = b"".join(
+                struct.pack("<h", int(8000 * math.sin(2 * math.pi * freq * n / self.SAMPLE_RATE)))
+                for n in range(frames)
+            )
+            self._word_blocks[voice] = block
+        return block * max(1, len(text.split()))
+
+    def _wav(self, pcm):
+        out = io.BytesIO()
+        with wave.open(out, "wb") as wf:
+            wf.setnchannels(1)
+            wf.setsampwidth(2)
+            wf.setframerate(self.SAMPLE_RATE)
+            wf.writeframes(pcm)
+        return out.getvalue()
+
+    def synthesize(self, text, voice):
+        return self._wav(self._pcm(text, voice))
+
+    def concat(self, clips):
+        return concat_wav(clips)
+
+
+class PiperTTS(TTSProvider):
+    """
+    Local neural TTS (Piper, in-process ONNX). Every agent's voice model is
+    loaded and warmed up once at startup, so turns never pay model load time.
+    """
+    name = "piper"
+    mime_type = "audio/wav"
+
+    DEFAULT_VOICES = {
+        "Agent 1": "en_US-lessac-medium",
+        "Agent 2": "en_US-ryan-medium",
+        "Agent 3": "en_GB-alan-medium",
+        "Agent 4": "en_GB-jenny_dioco-medium"
+    }
+
+    def __init__(self, voices_dir=PIPER_VOICES_DIR, voice_spec=LOCAL_TTS_VOICES):
+        from piper import PiperVoice
+
+        self.voices = parse_voice_map(voice_spec, self.DEFAULT_VOICES)
+        self._models = {}  # voice name -> loaded PiperVoice
+        for agent, voice in self.voices.items():
+            if voice in self._models:
+                continue
+            path = os.path.join(voices_dir, f"{voice}.onnx")
+            try:
+                model = PiperVoice.load(path)
+                self._render(model, "Ready.")  # Warm up the ONNX session
+                self._models[voice] = model
+                print(f"[INFO] ✅ Piper voice loaded for {agent}: {voice}")
+            except Exception as e:
+                print(f"[WARNING] ⚠️ Piper voice {voice} unavailable ({e})")
+        if not self._models:
+            raise RuntimeError(f"no Piper voices could be loaded from {voices_dir}")
+        self._default = next(iter(self._models))
+
+    def _voice_name(self, voice):
+        name = self.voices.get(voice)
+        return name if name in self._models else self._default
+
+    @staticmethod
+    def _render(model, text):
+        out = io.BytesIO()
+        with wave.open(out, "wb") as wf:
+            model.synthesize_wav(text, wf)
+        return out.getvalue()
+
+    def voice_id(self, voice):
+        return f"piper:{self._voice_name(voice)}"
+
+    def synthesize(self, text, voice):
+        return self._render(self._models[self._voice_name(voice)], text)
+
+    def concat(self, clips):
+        return concat_wav(clips)
+
+
+class EspeakTTS(TTSProvider):
+    """
+    Local formant TTS via the espeak-ng binary; tiny, but robotic.
+
+    This is the fallback engine, not the low-latency one: each sentence runs
+    its own espeak-ng process (tens of ms to start; its --stdout WAV can't be
+    split per utterance from one long-lived process). Piper keeps its models
+    loaded in-process and is the path to use when turn latency matters.
+    """
+    name = "espeak"
+    mime_type = "audio/wav"
+
+    DEFAULT_VOICES = {
+        "Agent 1": "en-us+m3",
+        "Agent 2": "en-us+f3",
+        "Agent 3": "en-gb+m1",
+        "Agent 4": "en-gb-scotland+f2"
+    }
+
+    def __init__(self, binary=ESPEAK_BINARY, voice_spec=LOCAL_TTS_VOICES, speed=ESPEAK_SPEED):
+        self.binary = shutil.which(binary)
+        if not self.binary:
+            raise RuntimeError(f"{binary} not found on PATH")
+        self.speed = speed
+        self.voices = parse_voice_map(voice_spec, self.DEFAULT_VOICES)
+        # Warm-up: first runs pay for loading voice data from disk
+        for voice in set(self.voices.values()):
+            self._render("Ready.", voice)
+        print(f"[INFO] ✅ espeak-ng ready with voices: {sorted(set(self.voices.values()))}")
+
+    def _render(self, text, voice_name):
+        # Text goes in on stdin, so model output starting with "-" can't be read as an option
+        result = subprocess.run(
+            [self.binary, "--stdout", "--stdin", "-v", voice_name, "-s", str(self.speed)],
+            input=text.encode("utf-8"), capture_output=True, timeout=30, check=True
+        )
+        return result.stdout
+
+    def _voice_name(self, voice):
+        return self.voices.get(voice, next(iter(self.voices.values())))
+
+    def voice_id(self, voice):
+        return f"espeak:{self._voice_name(voice)}:{self.speed}"
+
+    def synthesize(self, text, voice):
+        return self._render(text, self._voice_name(voice))
+
+    def concat(self, clips):
+        return concat_wav(clips)
+
+
+# -------------------------
+# 🎤 STT Providers
+# -------------------------
+class STTProvider:
+    """
+    Speech recognition backend. `transcribe` takes a file-like upload and
+    returns the text, "" when the recording holds no speech, or None on failure.
+    """
+    name = "base"
+
+    def transcribe(self, audio_file):
+        raise NotImplementedError
+
+    async def atranscribe(self, audio_file):
+        """Awaitable transcription; by default runs `transcribe` on a worker thread."""
+        return await asyncio.get_running_loop().run_in_executor(None, self.transcribe, audio_file)
+
+    def open_stream(self):
+        """Live recognition session for chunked audio (see utils/stt_stream.py)."""
+        from utils.stt_stream import BufferedSTTStream
+        return BufferedSTTStream(self)
+
+    async def aopen_stream(self):
+        """`open_stream` on a worker thread (a Vosk stream starts FFmpeg and a recognizer)."""
+        return await asyncio.get_running_loop().run_in_executor(None, self.open_stream)
+
+    def stream_mode(self):
+        """How `open_stream` would recognize right now: "vosk" (live), or "buffered (<why>)"."""
+        return "buffered"
+
+    def stats(self):
+        return None
+
+    def readiness(self):
+        """Load state per model ({name: {"state", "seconds", "error"}}); empty if nothing loads."""
+        return {}
+
+    def status(self):
+        return {
+            "stt_provider": self.name,
+            "stt_available": True,
+            "whisper_loaded": False,
+            "vosk_model_loaded": False,
+            "ffmpeg_available": False,
+            "vosk_model_path": "Not found",
+        }
+
+
+class WhisperVoskSTT(STTProvider):
+    """
+    Whisper first, Vosk as fallback (see utils/stt.py). With STT_WORKERS > 0
+    transcription runs on a pool of worker processes with warm models
+    (utils/stt_pool.py); with 0 it runs in the API process.
+
+    Models load per MODEL_LOAD_MODE (in the background by default), so the
+    app serves text-only traffic while they warm up; voice requests wait for
+    loading to finish. Each model's state is reported by `readiness()`.
+    """
+    name = "whisper_vosk"
+
+    def __init__(self):
+        from utils import stt
+        self._stt = stt
+        self.pool = None
+        self.models = {name: LoadState(name) for name in ("ffmpeg", "vosk", "whisper")}
+        self._loader = Loader("stt", self._load)
+
+    def _load(self):
+        from utils.stt_pool import STT_WORKERS, STTWorkerPool
+        stt = self._stt
+        # FFmpeg and Vosk first: cheap, and Vosk alone can already transcribe
+        self.models["ffmpeg"].run(stt.probe_ffmpeg, check=lambda: stt.ffmpeg_available)
+        if STT_WORKERS > 0:
+            for state in self.models.values():
+                state.start()
+            self.pool = STTWorkerPool(
+                load=stt.load_worker_models, transcribe=stt.transcribe_audio,
+                status=stt.model_status, preload=stt.load_vosk, preload_module="utils.stt_preload",
+                stats=stt.engine_stats
+            )
+            print(f"[INFO] 🎤 STT worker pool started with {STT_WORKERS} process(es)")
+            # Live /stt_stream recognition runs in this process, so it needs its own
+            # Vosk (already here if the workers were forked from it)
+            if stt.vosk_model is None:
+                self.models["vosk"].run(stt.load_vosk, check=lambda: stt.vosk_model is not None)
+            else:
+                self.models["vosk"].ready()
+        else:
+            self.models["vosk"].run(stt.load_vosk, check=lambda: stt.vosk_model is not None)
+            self.models["whisper"].run(stt.load_whisper, check=lambda: stt.whisper_model is not None)
+
+    def _pool_models(self):
+        """Whisper loads inside the workers: settle its state from the first ready one."""
+        if not self.pool or self.models["whisper"].done:
+            return
+        models = self.pool.status()
+        if not models:
+            return
+        if models.get("whisper_loaded"):
+            self.models["whisper"].ready()
+        else:
+            self.models["whisper"].failed(models.get("error") or "not loaded in STT worker")
+
+    def transcribe(self, audio_file):
+        self._loader.wait()
+        if not self.pool:
+            return self._stt.transcribe_audio(audio_file)
+        try:
+            return self.pool.transcribe(audio_file)
+        except Exception as e:
+            # Same contract as transcribe_audio: None when nothing could be transcribed
+            print(f"[ERROR] ❌ Transcription failed: {e}")
+            return None
+
+    async def atranscribe(self, audio_file):
+        if not self._loader.finished.is_set():
+            await asyncio.get_running_loop().run_in_executor(None, self._loader.wait)
+        if not self.pool:
+            return await super().atranscribe(audio_file)
+        audio = audio_file.read()
+        audio_file.seek(0)
+        future = self.pool.submit(audio)
+        try:
+            return await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            # Request went away: free the worker instead of finishing the job
+            self.pool.cancel(future)
+            raise
+        except Exception as e:
+            print(f"[ERROR] ❌ Transcription failed: {e}")
+            return None
+
+    def readiness(self):
+        self._pool_models()
+        return {f"stt_{name}": state.snapshot() for name, state in self.models.items()}
+
+    def stream_mode(self):
+        # Vosk decodes incrementally once _load() has it in this process (with or
+        # without the worker pool); until then, or without it, buffer until stop.
+        if self._stt.vosk_model is None:
+            return "buffered (vosk not loaded)" if self.models["vosk"].done else "buffered (vosk loading)"
+        if not shutil.which("ffmpeg"):
+            return "buffered (no ffmpeg)"
+        return "vosk"
+
+    def open_stream(self):
+        if self.stream_mode() == "vosk":
+            from utils.stt_stream import VoskSTTStream
+            try:
+                return VoskSTTStream(self, self._stt.vosk_model)
+            except Exception as e:
+                print(f"[WARNING] ⚠️ Live recognition unavailable ({e}); buffering the recording")
+        return super().open_stream()
+
+    def stats(self):
+        stats = self.pool.stats() if self.pool else {"engine": self._stt.engine_stats()}
+        self._stt.summarize_engine_stats(stats.get("engine"))
+        return stats
+
+    def status(self):
+        if not self._loader.finished.is_set():
+            models = {"ffmpeg_available": self._stt.ffmpeg_available}
+        else:
+            models = self.pool.status() if self.pool else self._stt.model_status()
+        whisper_loaded = bool(models.get("whisper_loaded"))
+        vosk_loaded = bool(models.get("vosk_model_loaded"))
+        return {
+            "stt_provider": self.name,
+            "stt_available": whisper_loaded or vosk_loaded,
+            "whisper_loaded": whisper_loaded,
+            "whisper_engine": models.get("whisper_engine"),
+            "vosk_model_loaded": vosk_loaded,
+            "ffmpeg_available": bool(models.get("ffmpeg_available")),
+            "vosk_model_path": self._stt.VOSK_MODEL_PATH if os.path.exists(self._stt.VOSK_MODEL_PATH) else "Not found",
+        }
+
+
+class EchoSTT(STTProvider):
+    """Offline stub: UTF-8 uploads are echoed back; anything else gets a fixed sentence."""
+    name = "echo"
+
+    def transcribe(self, audio_file):
+        data = audio_file.read()
+        audio_file.seek(0)
+        if not data:
+            return None
+        try:
+            text = data.decode("utf-8").strip()
+        except UnicodeDecodeError:
+            text = ""
+        return text or f"I would like to add a point about this ({len(data)} bytes of audio)."
+
+
+# -------------------------
+# 🏭 Factories
+# -------------------------
+def create_llm_provider(api_key, model):
+    if LLM_PROVIDER == "stub":
+        return StubLLM()
+    if LLM_PROVIDER == "gemini":
+        return GeminiLLM(api_key=api_key, model=model)
+    raise ValueError(f"Unknown LLM_PROVIDER: {LLM_PROVIDER}")
+
+
+LOCAL_TTS_ENGINES = {"piper": PiperTTS, "espeak": EspeakTTS}
+
+
+def create_tts_provider(kind=None):
+    kind = kind or TTS_PROVIDER
+    if kind == "tone":
+        return ToneTTS()
+    if kind in LOCAL_TTS_ENGINES:
+        try:
+            return LOCAL_TTS_ENGINES[kind]()
+        except Exception as e:
+            print(f"[WARNING] ⚠️ Local TTS '{kind}' unavailable ({e}); falling back to gTTS")
+            return GTTSProvider()
+    if kind == "gtts":
+        return GTTSProvider()
+    raise ValueError(f"Unknown TTS_PROVIDER: {kind}")
+
+
+def create_stt_provider():
+    if STT_PROVIDER == "echo":
+        return EchoSTT()
+    if STT_PROVIDER == "whisper_vosk":
+        return WhisperVoskSTT()
+    raise ValueError(f"Unknown STT_PROVIDER: {STT_PROVIDER}")
@@ -0,0 +1,157 @@
+import asyncio
+import collections
+import os
+import threading
+import time
+
+# -------------------------
+# ⚙️ Rate Limit Settings (0 disables a bucket)
+# -------------------------
+LLM_RPM = float(os.getenv("LLM_RPM", "1000"))          # Requests per minute
+LLM_TPM = float(os.getenv("LLM_TPM", "1000000"))       # Tokens per minute (prompt + expected output)
+LLM_EXPECTED_OUTPUT_TOKENS = int(os.getenv("LLM_EXPECTED_OUTPUT_TOKENS", "300"))
+LLM_429_COOLDOWN = float(os.getenv("LLM_429_COOLDOWN", "5"))  # Seconds to pause after a provider 429
+
+
+class RateLimitExceeded(Exception):
+    """Raised when a call cannot get capacity before its deadline (backpressure)."""
+
+    def __init__(self, retry_after):
+        super().__init__(f"LLM rate limit reached, retry in {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+
+def is_provider_rate_limit(error):
+    """True for provider-side 429 / quota errors."""
+    return getattr(error, "code", None) == 429 or "429" in str(error) or "RESOURCE_EXHAUSTED" in str(error)
+
+
+def estimate_tokens(prompt):
+    """Cheap token estimate (~4 characters per token) plus the expected reply."""
+    return len(prompt) // 4 + LLM_EXPECTED_OUTPUT_TOKENS
+
+
+class TokenBucket:
+    """Refills continuously at `per_minute / 60` units per second up to `per_minute`."""
+
+    def __init__(self, per_minute):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.level = per_minute
+        self.updated = time.monotonic()
+
+    def refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount):
+        amount = min(amount, self.capacity)  # Oversized requests wait for a full bucket
+        return max(0.0, (amount - self.level) / self.rate)
+
+    def take(self, amount):
+        self.level -= min(amount, self.capacity)
+
+
+class RateLimiter:
+    """
+    Process-wide requests-per-minute and tokens-per-minute limiter for LLM calls.
+
+    Runs on the gateway's event loop. Waiters are served in arrival order; a
+    call whose wait would overrun its deadline is rejected at once with
+    `RateLimitExceeded` instead of queueing pointlessly, and so is one still
+    queued behind earlier waiters when its deadline passes. A provider 429
+    pauses all calls for LLM_429_COOLDOWN seconds.
+    """
+
+    def __init__(self, rpm=LLM_RPM, tpm=LLM_TPM):
+        self.requests = TokenBucket(rpm) if rpm > 0 else None
+        self.tokens = TokenBucket(tpm) if tpm > 0 else None
+        self._order = asyncio.Lock()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()  # Guards stats read from other threads
+        self._waiting = 0
+        self._counts = collections.Counter()
+        self._waited = 0.0
+
+    def _wait_time(self, tokens, now):
+        wait = max(0.0, self._paused_until - now)
+        if self.requests:
+            self.requests.refill(now)
+            wait = max(wait, self.requests.wait_time(1))
+        if self.tokens:
+            self.tokens.refill(now)
+            wait = max(wait, self.tokens.wait_time(tokens))
+        return wait
+
+    async def acquire(self, tokens, deadline):
+        """Wait for capacity for one request of `tokens`; `deadline` is a time.monotonic() value."""
+        if not self.requests and not self.tokens:
+            return
+        started = time.monotonic()
+        with self._lock:
+            self._waiting += 1
+        try:
+            # The head of the queue holds the lock while it sleeps for capacity,
+            # so time spent queued behind it counts against this call's deadline too
+            try:
+                await asyncio.wait_for(self._order.acquire(), max(0.0, deadline - started))
+            except asyncio.TimeoutError:
+                with self._lock:
+                    self._counts["rejected"] += 1
+                raise RateLimitExceeded(self._wait_time(tokens, time.monotonic()))
+            try:
+                while True:
+                    now = time.monotonic()
+                    wait = self._wait_time(tokens, now)
+                    if wait <= 0:
+                        if self.requests:
+                            self.requests.take(1)
+                        if self.tokens:
+                            self.tokens.take(tokens)
+                        with self._lock:
+                            self._counts["granted"] += 1
+                            waited = now - started
+                            if waited > 0.001:
+                                self._counts["throttled"] += 1
+                                self._waited += waited
+                        return
+                    if now + wait > deadline:
+                        with self._lock:
+                            self._counts["rejected"] += 1
+                        raise RateLimitExceeded(wait)
+                    await asyncio.sleep(wait)
+            finally:
+                self._order.release()
+        finally:
+            with self._lock:
+                self._waiting -= 1
+
+    def penalize(self, seconds=LLM_429_COOLDOWN):
+        """Provider said 429: hold every call back for a while."""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        with self._lock:
+            self._counts["provider_429"] += 1
+
+    def stats(self):
+        now = time.monotonic()
+
+        def bucket(b):
+            if b is None:
+                return None
+            level = min(b.capacity, b.level + (now - b.updated) * b.rate)
+            return {"per_minute": b.capacity, "available": round(level, 1),
+                    "utilisation": round(1 - level / b.capacity, 3)}
+
+        with self._lock:
+            granted = self._counts.get("granted", 0)
+            return {
+                "requests": bucket(self.requests),
+                "tokens": bucket(self.tokens),
+                "waiting": self._waiting,
+                "granted": granted,
+                "throttled": self._counts.get("throttled", 0),
+                "rejected": self._counts.get("rejected", 0),
+                "provider_429": self._counts.get("provider_429", 0),
+                "paused_for_s": round(max(0.0, self._paused_until - now), 1),
+                "avg_wait_ms": round(self._waited / granted * 1000, 1) if granted else 0.0,
+            }
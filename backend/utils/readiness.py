@@ -0,0 +1,123 @@
+import os
+import threading
+import time
+
+# -------------------------
+# ⚙️ Model Loading Settings
+# -------------------------
+# background: start loading at import and serve traffic meanwhile (default)
+# lazy:       load on first use
+# eager:      load before the app finishes importing (the old behaviour)
+MODEL_LOAD_MODE = os.getenv("MODEL_LOAD_MODE", "background")
+MODEL_LOAD_WAIT = float(os.getenv("MODEL_LOAD_WAIT", "300"))  # Max seconds a request waits for a loading model
+
+
+class LoadState:
+    """Readiness of one model or client: pending → loading → ready | failed."""
+
+    def __init__(self, name):
+        self.name = name
+        self.state = "pending"
+        self.error = None
+        self._started = None
+        self._seconds = None
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+
+    def start(self):
+        with self._lock:
+            if self.state == "pending":
+                self.state = "loading"
+                self._started = time.perf_counter()
+
+    def _finish(self, state, error=None):
+        with self._lock:
+            if self.state in ("ready", "failed"):
+                return
+            self.state, self.error = state, error
+            if self._started is not None:
+                self._seconds = time.perf_counter() - self._started
+        self._done.set()
+
+    def ready(self):
+        self._finish("ready")
+
+    def failed(self, error):
+        self._finish("failed", str(error))
+
+    def run(self, load, check=None):
+        """Run `load`; ready if it returns without raising (and `check()` holds)."""
+        self.start()
+        try:
+            result = load()
+        except Exception as e:
+            self.failed(e)
+            return None
+        if check is not None and not check():
+            self.failed("not available")
+        else:
+            self.ready()
+        return result
+
+    def wait(self, timeout=MODEL_LOAD_WAIT):
+        """Block until loading finished; True if the model is ready."""
+        self._done.wait(timeout)
+        return self.state == "ready"
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+    def snapshot(self):
+        with self._lock:
+            seconds = self._seconds
+            if seconds is None and self._started is not None:
+                seconds = time.perf_counter() - self._started
+            return {
+                "state": self.state,
+                "seconds": round(seconds, 2) if seconds is not None else None,
+                "error": self.error,
+            }
+
+
+class Loader:
+    """
+    Runs a load function once according to MODEL_LOAD_MODE: now, on a
+    background thread, or on the first `ensure()` call.
+    """
+
+    def __init__(self, name, load, mode=MODEL_LOAD_MODE):
+        self.name = name
+        self._load = load
+        self._lock = threading.Lock()
+        self._launched = False
+        self.finished = threading.Event()
+        if mode == "eager":
+            self.ensure(block=True)
+        elif mode == "background":
+            self.ensure()
+
+    def _run(self):
+        try:
+            self._load()
+        except Exception as e:
+            print(f"[ERROR] ❌ Loading {self.name} failed: {e}")
+        finally:
+            self.finished.set()
+
+    def ensure(self, block=False):
+        """Start loading if nobody has yet; with block=True also wait for it."""
+        with self._lock:
+            launch = not self._launched
+            self._launched = True
+        if launch:
+            if block:
+                self._run()
+            else:
+                threading.Thread(target=self._run, name=f"load-{self.name}", daemon=True).start()
+        if block:
+            self.finished.wait()
+
+    def wait(self, timeout=MODEL_LOAD_WAIT):
+        self.ensure()
+        return self.finished.wait(timeout)
@@ -0,0 +1,453 @@
+import asyncio
+import collections
+import concurrent.futures
+import copy
+import functools
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# -------------------------
+# ⚙️ Simulation Store Settings
+# -------------------------
+# memory: state lives in this process (single uvicorn worker)
+# sqlite: state and signals in a shared SQLite (WAL) file, so any worker can serve any simulation
+SIMULATION_STORE = os.getenv("SIMULATION_STORE", "memory")
+SIMULATION_STORE_PATH = os.getenv("SIMULATION_STORE_PATH", "./gd_simulations.db")
+SIMULATION_SIGNAL_POLL = float(os.getenv("SIMULATION_SIGNAL_POLL", "0.05"))  # Seconds between cross-worker checks
+SIMULATION_SIGNAL_TTL = float(os.getenv("SIMULATION_SIGNAL_TTL", "3600"))    # Seconds signals are kept
+SIMULATION_STORE_THREADS = int(os.getenv("SIMULATION_STORE_THREADS", "16"))  # Threads for store calls made by coroutines
+
+
+class SimulationStore:
+    """
+    Live simulation state plus a per-simulation signal channel.
+
+    State is a JSON-serializable dict per simulation. `update()` applies a
+    function to it atomically (also across workers for shared stores), so
+    check-and-set steps like reserving an interrupt can't race.
+
+    Signals are ordered messages (interrupt, human_input, playback_finished)
+    numbered per store. A consumer remembers the last number it has seen
+    (`cursor()`) and `wait()`s for anything newer, so a signal published
+    between two waits is never lost. Waiters sleep on a per-simulation
+    condition that `publish()` (or `wake()`, for events that aren't signals)
+    notifies directly; `await_signals()` is the same wait for coroutines and
+    sleeps on an asyncio.Event instead of holding a thread.
+
+    Coroutines use the `a`-prefixed variants (`aget`, `aupdate`, ...). A store
+    whose calls can block (disk, other workers' locks) runs them on its own
+    thread pool; the in-process store answers inline.
+    """
+    name = "base"
+    poll = None     # Seconds between checks for other workers' signals (None: local only)
+    shared = False  # True when other worker processes see the same state and signals
+
+    def __init__(self):
+        self._waiters_lock = threading.Lock()
+        self._async_waiters = collections.defaultdict(set)  # sim_id -> {(loop, asyncio.Event)}
+        self._executor = None  # Set by stores whose calls block
+
+    def create(self, sim_id, state):
+        raise NotImplementedError
+
+    def get(self, sim_id):
+        """Copy of the simulation's state, or None."""
+        raise NotImplementedError
+
+    def update(self, sim_id, fn):
+        """Atomically run fn(state), which may modify it in place; returns fn's result (None if unknown sim)."""
+        raise NotImplementedError
+
+    def publish(self, sim_id, kind, data=None):
+        raise NotImplementedError
+
+    def cursor(self, sim_id):
+        """Number of the newest signal so far; wait() after it sees only later ones."""
+        raise NotImplementedError
+
+    def wait(self, sim_id, kinds, after, timeout, until=None):
+        """
+        Signals of the given kinds newer than `after`, waiting up to `timeout`.
+        Returns [] on timeout, or early once `until()` holds (re-checked on
+        every wake-up; call `wake()` when it may have changed).
+        """
+        raise NotImplementedError
+
+    def wake(self, sim_id):
+        """Wake this worker's waiters on the simulation so they re-check `until`."""
+        raise NotImplementedError
+
+    async def arun(self, fn, *args):
+        """Run `fn(*args)`, which makes store calls, without blocking the event loop."""
+        if self._executor is None:
+            return fn(*args)
+        return await asyncio.get_running_loop().run_in_executor(self._executor, functools.partial(fn, *args))
+
+    def submit(self, fn, *args):
+        """Run `fn(*args)` without waiting for it (e.g. cleanup in a generator that is closing)."""
+        if self._executor is None:
+            fn(*args)
+        else:
+            self._executor.submit(fn, *args)
+
+    async def aget(self, sim_id):
+        return await self.arun(self.get, sim_id)
+
+    async def afield(self, sim_id, key, default=None):
+        return await self.arun(self.field, sim_id, key, default)
+
+    async def aupdate(self, sim_id, fn):
+        return await self.arun(self.update, sim_id, fn)
+
+    async def apublish(self, sim_id, kind, data=None):
+        return await self.arun(self.publish, sim_id, kind, data)
+
+    async def acursor(self, sim_id):
+        return await self.arun(self.cursor, sim_id)
+
+    def _wake_async(self, sim_id):
+        """Set the event of every coroutine waiting on the simulation (from any thread)."""
+        with self._waiters_lock:
+            waiters = list(self._async_waiters.get(sim_id, ()))
+        for loop, event in waiters:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                pass  # That loop has shut down
+
+    def _poll_signals(self, sim_id, kinds, after, memo):
+        """Signals newer than `after`; `memo` is per-wait scratch space for cheap re-checks."""
+        raise NotImplementedError
+
+    async def await_signals(self, sim_id, kinds, after, timeout, until=None):
+        """`wait()` for coroutines: same arguments and result, without blocking the event loop."""
+        kinds = tuple(kinds)
+        deadline = time.monotonic() + timeout
+        waiter = (asyncio.get_running_loop(), asyncio.Event())
+        with self._waiters_lock:
+            self._async_waiters[sim_id].add(waiter)
+        self._count("waits")
+        memo = {}
+        try:
+            while True:
+                # Cleared before looking, so a publish from here on sets it again
+                waiter[1].clear()
+                found = await self.arun(self._poll_signals, sim_id, kinds, after, memo)
+                if found or (until is not None and until()):
+                    return found
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._count("wait_timeouts")
+                    return found
+                try:
+                    await asyncio.wait_for(waiter[1].wait(), min(self.poll or remaining, remaining))
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            with self._waiters_lock:
+                self._async_waiters[sim_id].discard(waiter)
+                if not self._async_waiters[sim_id]:
+                    del self._async_waiters[sim_id]
+
+    def _count(self, key):
+        raise NotImplementedError
+
+    def __contains__(self, sim_id):
+        return self.get(sim_id) is not None
+
+    def field(self, sim_id, key, default=None):
+        state = self.get(sim_id)
+        return state.get(key, default) if state else default
+
+    def stats(self):
+        return {"store": self.name}
+
+
+class Signal:
+    __slots__ = ("seq", "kind", "data", "created")
+
+    def __init__(self, seq, kind, data, created):
+        self.seq = seq
+        self.kind = kind
+        self.data = data
+        self.created = created
+
+
+class InProcessSimulationStore(SimulationStore):
+    """Dict-backed store for a single worker; waits wake on a condition variable."""
+    name = "memory"
+
+    def __init__(self):
+        super().__init__()
+        self._lock = threading.Lock()
+        self._conds = {}  # sim_id -> Condition sharing self._lock
+        self._states = {}
+        self._signals = collections.defaultdict(collections.deque)  # sim_id -> Signals, oldest first
+        self._seq = 0
+        self._counts = collections.Counter()
+
+    def _cond(self, sim_id):
+        """Condition for one simulation's waiters. Caller holds the lock."""
+        cond = self._conds.get(sim_id)
+        if cond is None:
+            cond = self._conds[sim_id] = threading.Condition(self._lock)
+        return cond
+
+    def create(self, sim_id, state):
+        with self._lock:
+            self._states[sim_id] = copy.deepcopy(state)
+
+    def get(self, sim_id):
+        with self._lock:
+            state = self._states.get(sim_id)
+            return copy.deepcopy(state) if state is not None else None
+
+    def field(self, sim_id, key, default=None):
+        with self._lock:
+            state = self._states.get(sim_id)
+            return copy.deepcopy(state.get(key, default)) if state is not None else default
+
+    def update(self, sim_id, fn):
+        with self._lock:
+            state = self._states.get(sim_id)
+            if state is None:
+                return None
+            self._counts["updates"] += 1
+            return fn(state)
+
+    def publish(self, sim_id, kind, data=None):
+        with self._lock:
+            self._seq += 1
+            now = time.time()
+            signals = self._signals[sim_id]
+            signals.append(Signal(self._seq, kind, data, now))
+            while signals and now - signals[0].created > SIMULATION_SIGNAL_TTL:
+                signals.popleft()
+            self._counts["published"] += 1
+            self._cond(sim_id).notify_all()
+            seq = self._seq
+        self._wake_async(sim_id)
+        return seq
+
+    def wake(self, sim_id):
+        with self._lock:
+            self._cond(sim_id).notify_all()
+        self._wake_async(sim_id)
+
+    def _count(self, key):
+        with self._lock:
+            self._counts[key] += 1
+
+    def cursor(self, sim_id):
+        with self._lock:
+            return self._seq
+
+    def _newer(self, sim_id, kinds, after):
+        return [s for s in self._signals.get(sim_id, ()) if s.seq > after and s.kind in kinds]
+
+    def _poll_signals(self, sim_id, kinds, after, memo):
+        with self._lock:
+            return self._newer(sim_id, kinds, after)
+
+    def wait(self, sim_id, kinds, after, timeout, until=None):
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            cond = self._cond(sim_id)
+            self._counts["waits"] += 1
+            while True:
+                found = self._newer(sim_id, kinds, after)
+                if found or (until is not None and until()):
+                    return found
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._counts["wait_timeouts"] += 1
+                    return found
+                cond.wait(remaining)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "store": self.name,
+                "simulations": len(self._states),
+                "updates": self._counts.get("updates", 0),
+                "signals_published": self._counts.get("published", 0),
+                "waits": self._counts.get("waits", 0),
+                "wait_timeouts": self._counts.get("wait_timeouts", 0),
+            }
+
+
+class SQLiteSimulationStore(SimulationStore):
+    """
+    Shared store in one SQLite file in WAL mode, for several uvicorn workers
+    on the same host. `update()` runs in a BEGIN IMMEDIATE transaction, so
+    read-modify-write is serialized across processes. Signals published by
+    this worker wake its local waiters at once; signals from other workers are
+    picked up within SIMULATION_SIGNAL_POLL (a cheap `PRAGMA data_version`
+    check tells whether anything was committed at all).
+    """
+    name = "sqlite"
+    shared = True
+
+    def __init__(self, path=SIMULATION_STORE_PATH, poll=SIMULATION_SIGNAL_POLL):
+        super().__init__()
+        self.path = path
+        self.poll = poll
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._conds = {}  # sim_id -> Condition for this worker's waiters
+        self._counts = collections.Counter()
+        self._counts_lock = threading.Lock()
+        # Calls wait on disk and, under busy_timeout, on other workers' transactions
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=SIMULATION_STORE_THREADS, thread_name_prefix="sim-store"
+        )
+        db = self._db()
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("""CREATE TABLE IF NOT EXISTS simulations (
+            sim_id TEXT PRIMARY KEY, state TEXT NOT NULL, updated REAL NOT NULL)""")
+        db.execute("""CREATE TABLE IF NOT EXISTS signals (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT, sim_id TEXT NOT NULL,
+            kind TEXT NOT NULL, data TEXT, created REAL NOT NULL)""")
+        db.execute("CREATE INDEX IF NOT EXISTS signals_sim ON signals (sim_id, seq)")
+        print(f"[INFO] ✅ Simulation store: SQLite WAL at {path}")
+
+    def _db(self):
+        """One connection per thread (sqlite3 connections aren't shareable across threads)."""
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.execute("PRAGMA busy_timeout=30000")
+            self._local.db = db
+        return db
+
+    def _cond(self, sim_id):
+        with self._lock:
+            cond = self._conds.get(sim_id)
+            if cond is None:
+                cond = self._conds[sim_id] = threading.Condition()
+            return cond
+
+    def _count(self, key):
+        with self._counts_lock:
+            self._counts[key] += 1
+
+    def create(self, sim_id, state):
+        self._db().execute(
+            "INSERT OR REPLACE INTO simulations (sim_id, state, updated) VALUES (?, ?, ?)",
+            (sim_id, json.dumps(state), time.time())
+        )
+
+    def get(self, sim_id):
+        row = self._db().execute("SELECT state FROM simulations WHERE sim_id = ?", (sim_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def update(self, sim_id, fn):
+        db = self._db()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            row = db.execute("SELECT state FROM simulations WHERE sim_id = ?", (sim_id,)).fetchone()
+            if row is None:
+                db.execute("ROLLBACK")
+                return None
+            state = json.loads(row[0])
+            result = fn(state)
+            db.execute("UPDATE simulations SET state = ?, updated = ? WHERE sim_id = ?",
+                       (json.dumps(state), time.time(), sim_id))
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        self._count("updates")
+        return result
+
+    def publish(self, sim_id, kind, data=None):
+        db = self._db()
+        now = time.time()
+        seq = db.execute(
+            "INSERT INTO signals (sim_id, kind, data, created) VALUES (?, ?, ?, ?)",
+            (sim_id, kind, json.dumps(data), now)
+        ).lastrowid
+        if seq % 100 == 0:
+            db.execute("DELETE FROM signals WHERE created < ?", (now - SIMULATION_SIGNAL_TTL,))
+        self._count("published")
+        self.wake(sim_id)
+        return seq
+
+    def wake(self, sim_id):
+        cond = self._cond(sim_id)
+        with cond:
+            cond.notify_all()
+        self._wake_async(sim_id)
+
+    def cursor(self, sim_id):
+        row = self._db().execute("SELECT MAX(seq) FROM signals").fetchone()
+        return row[0] or 0
+
+    def _newer(self, sim_id, kinds, after):
+        marks = ",".join("?" * len(kinds))
+        rows = self._db().execute(
+            f"SELECT seq, kind, data, created FROM signals WHERE sim_id = ? AND seq > ? AND kind IN ({marks}) ORDER BY seq",
+            (sim_id, after, *kinds)
+        ).fetchall()
+        return [Signal(seq, kind, json.loads(data) if data else None, created) for seq, kind, data, created in rows]
+
+    def _poll_signals(self, sim_id, kinds, after, memo):
+        # data_version ignores this connection's own commits, which other threads of
+        # this worker make too, so local publishes count as a change as well. It is
+        # also per connection, and arun() may poll from a different thread each time.
+        with self._counts_lock:
+            published = self._counts["published"]
+        db = self._db()
+        version = (id(db), db.execute("PRAGMA data_version").fetchone()[0], published)
+        if memo.get("version") == version:
+            return []
+        memo["version"] = version
+        return self._newer(sim_id, kinds, after)
+
+    def wait(self, sim_id, kinds, after, timeout, until=None):
+        kinds = tuple(kinds)
+        deadline = time.monotonic() + timeout
+        cond = self._cond(sim_id)
+        memo = {}
+        self._count("waits")
+        while True:
+            # Only queries signals when something was committed since the last look
+            found = self._poll_signals(sim_id, kinds, after, memo)
+            if found:
+                return found
+            if until is not None and until():
+                return []
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self._count("wait_timeouts")
+                return []
+            # Local publishes and wake() notify at once; other workers are seen on the next poll
+            with cond:
+                cond.wait(min(self.poll, remaining))
+
+    def stats(self):
+        db = self._db()
+        simulations = db.execute("SELECT COUNT(*) FROM simulations").fetchone()[0]
+        with self._counts_lock:
+            return {
+                "store": self.name,
+                "path": self.path,
+                "simulations": simulations,
+                "updates": self._counts.get("updates", 0),
+                "signals_published": self._counts.get("published", 0),
+                "waits": self._counts.get("waits", 0),
+                "wait_timeouts": self._counts.get("wait_timeouts", 0),
+            }
+
+
+def create_simulation_store(kind=None):
+    kind = kind or SIMULATION_STORE
+    if kind == "memory":
+        return InProcessSimulationStore()
+    if kind == "sqlite":
+        return SQLiteSimulationStore()
+    raise ValueError(f"Unknown SIMULATION_STORE: {kind}")
@@ -0,0 +1,186 @@
+import collections
+import concurrent.futures
+import os
+import threading
+
+# -------------------------
+# ⚙️ Speculation Settings
+# -------------------------
+SPECULATION_DEPTH = int(os.getenv("SPECULATION_DEPTH", "2"))      # Agent turns generated ahead
+SPECULATION_WORKERS = int(os.getenv("SPECULATION_WORKERS", "16"))  # Shared by all simulations
+
+_executor = concurrent.futures.ThreadPoolExecutor(
+    max_workers=SPECULATION_WORKERS, thread_name_prefix="speculate"
+)
+
+_stats_lock = threading.Lock()
+_stats = collections.Counter()
+
+
+def _count(field, n=1):
+    with _stats_lock:
+        _stats[field] += n
+
+
+def speculation_stats():
+    """Process-wide hit/waste counters for speculative agent turns."""
+    with _stats_lock:
+        counts = dict(_stats)
+    hits = counts.get("hits", 0)
+    misses = counts.get("misses", 0)
+    scheduled = counts.get("scheduled", 0)
+    wasted = counts.get("wasted", 0)
+    return {
+        "depth": SPECULATION_DEPTH,
+        "workers": SPECULATION_WORKERS,
+        "scheduled": scheduled,
+        "hits": hits,
+        "misses": misses,
+        "cancelled_before_start": counts.get("cancelled", 0),
+        "wasted": wasted,
+        "hit_rate": round(hits / (hits + misses), 3) if hits + misses else None,
+        "waste_rate": round(wasted / scheduled, 3) if scheduled else None,
+    }
+
+
+class _SpeculativeTurn:
+    __slots__ = ("index", "stale", "finished", "future", "text", "view_after", "started")
+
+    def __init__(self, index):
+        self.index = index
+        self.stale = False     # Set by invalidate(); only this turn's own run sees it
+        self.finished = False  # Text and audio are ready (set under the pipeline lock)
+        self.future = None
+        self.text = None
+        self.view_after = None
+        self.started = False
+
+
+class SpeculativePipeline:
+    """
+    Generates up to `depth` upcoming agent turns of a round ahead of time.
+
+    Turn j is conditioned on the real transcript plus the speculated text of
+    turns before it, and is only scheduled once that text exists, so a chain
+    never blocks a worker waiting on its predecessor. `invalidate(i)` marks
+    turns i and later stale and drops them; earlier turns are untouched. Queued
+    ones are cancelled outright, running ones finish their LLM call but skip
+    TTS. Each dropped turn that did any work is counted as waste exactly once:
+    by its run if that sees the flag, otherwise by `invalidate`.
+
+    `on_done(index)` is called whenever a speculated turn finishes (or is
+    cancelled), so a consumer can sleep until then instead of polling.
+    """
+
+    def __init__(self, speaking_order, generate_text, synthesize, depth=SPECULATION_DEPTH, on_done=None):
+        self.speaking_order = speaking_order
+        self.depth = depth
+        self._generate_text = generate_text  # (agent, TranscriptView) -> text
+        self._synthesize = synthesize        # (text, agent) -> audio
+        self._on_done = on_done
+        self._lock = threading.Lock()
+        self._turns = {}  # index -> _SpeculativeTurn
+        self._limit = -1  # Highest index allowed to be speculated right now
+
+    def has(self, index):
+        with self._lock:
+            return index in self._turns
+
+    def _schedule(self, index, view):
+        """Submit turn `index` built on `view`. Caller holds the lock."""
+        if index >= len(self.speaking_order) or index > self._limit or index in self._turns:
+            return
+        turn = _SpeculativeTurn(index)
+        self._turns[index] = turn
+        turn.future = _executor.submit(self._run, turn, view)
+        if self._on_done is not None:
+            turn.future.add_done_callback(lambda _: self._on_done(index))
+        _count("scheduled")
+        print(f"⏳ Speculating text for {self.speaking_order[index].name} (turn {index + 1})...")
+
+    def _run(self, turn, view):
+        turn.started = True
+        agent = self.speaking_order[turn.index]
+        text = self._generate_text(agent, view)
+
+        # Built through the same Transcript windowing as a live turn's prompt
+        view_after = view.extended(agent.name, text)
+        with self._lock:
+            if turn.stale:
+                _count("wasted")
+                return None
+            turn.text = text
+            turn.view_after = view_after
+            # Text is ready: the next turn can start while this one runs TTS
+            self._schedule(turn.index + 1, turn.view_after)
+
+        audio = self._synthesize(text, agent.name)
+        with self._lock:
+            if turn.stale:
+                _count("wasted")
+                return None
+            turn.finished = True
+        return text, audio
+
+    def advance(self, spoken_index, view):
+        """Turn `spoken_index` was just spoken; top the chain up to `depth` turns ahead."""
+        with self._lock:
+            self._limit = spoken_index + self.depth
+            nxt = spoken_index + 1
+            if nxt not in self._turns:
+                self._schedule(nxt, view)
+                return
+            # Walk to the end of the existing chain and extend it if its text is ready
+            last = nxt
+            while last + 1 in self._turns:
+                last += 1
+            tail = self._turns[last]
+            if tail.view_after is not None:
+                self._schedule(last + 1, tail.view_after)
+
+    def ready(self, index):
+        """
+        True once `result(index)` won't block. Lock-free (a dict read), so it is
+        safe to call from a wait predicate while other locks are held.
+        """
+        turn = self._turns.get(index)
+        return turn is None or turn.future.done()
+
+    def result(self, index, timeout):
+        """
+        Return (text, audio) for a speculated turn, or None if it was discarded.
+        Raises `concurrent.futures.TimeoutError` if it is still being generated.
+        """
+        with self._lock:
+            turn = self._turns.get(index)
+        if turn is None:
+            return None
+        value = turn.future.result(timeout=timeout)
+        with self._lock:
+            self._turns.pop(index, None)
+        if value is not None:
+            _count("hits")
+        return value
+
+    def invalidate(self, from_index):
+        """Discard speculated turns at `from_index` and later (e.g. a human interrupt)."""
+        with self._lock:
+            stale = [i for i in self._turns if i >= from_index]
+            if not stale:
+                return
+            for i in stale:
+                turn = self._turns.pop(i)
+                turn.stale = True
+                if turn.future.cancel():
+                    _count("cancelled")
+                elif turn.finished:
+                    # Finished (text and audio) but never used; a run still going counts itself
+                    _count("wasted")
+            print(f"🗑️ Invalidated {len(stale)} speculative turn(s) from turn {from_index + 1}")
+
+    def record_miss(self):
+        """A turn had to be generated live."""
+        _count("misses")
+
+    def close(self):
+        self.invalidate(0)
@@ -0,0 +1,351 @@
+import collections
+import json
+import re
+import threading
+from typing import List
+
+from pydantic import BaseModel, ConfigDict, ValidationError, field_validator
+
+# -------------------------
+# 📐 Output Schemas
+# -------------------------
+
+
+def _coerce_score(v):
+    """Accept 8, 8.0, "8", "8/10", "Score: 8" and clamp to 0-10."""
+    if isinstance(v, bool):
+        raise ValueError("score must be a number")
+    if isinstance(v, (int, float)):
+        return max(0, min(10, int(v)))
+    if isinstance(v, str):
+        m = re.search(r'\d+(?:\.\d+)?', v)
+        if m:
+            return max(0, min(10, int(float(m.group()))))
+    raise ValueError("score must be a number from 0 to 10")
+
+
+def _coerce_list(v):
+    """Accept a list, a JSON-encoded list, or a bulleted / newline separated string."""
+    if isinstance(v, list):
+        return [str(item).strip() for item in v if str(item).strip()]
+    if isinstance(v, str):
+        parsed = extract_json(v)
+        if isinstance(parsed, list):
+            return _coerce_list(parsed)
+        lines = [re.sub(r'^\s*(?:[-*•]|\d+[.)])\s*', '', line).strip() for line in v.splitlines()]
+        items = [line for line in lines if line]
+        if items:
+            return items
+    raise ValueError("expected a list of strings")
+
+
+class HumanFeedback(BaseModel):
+    """Per-response scores (human_response_scores / generate_human_feedback)."""
+    model_config = ConfigDict(extra="allow")
+
+    grammar_score: int
+    clarity_score: int
+    relevance_score: int
+    politeness_score: int
+    feedback: str
+
+    @field_validator('grammar_score', 'clarity_score', 'relevance_score', 'politeness_score', mode='before')
+    @classmethod
+    def score(cls, v):
+        return _coerce_score(v)
+
+
+class DiscussionEvaluation(BaseModel):
+    """Final evaluation from end_discussion."""
+    model_config = ConfigDict(extra="allow")
+
+    grammar: int
+    clarity: int
+    relevance: int
+    politeness: int
+    team_collaboration: int
+    overall: int
+    strengths: List[str]
+    improvements: List[str]
+    final_feedback: str
+
+    @field_validator('grammar', 'clarity', 'relevance', 'politeness', 'team_collaboration', 'overall', mode='before')
+    @classmethod
+    def score(cls, v):
+        return _coerce_score(v)
+
+    @field_validator('strengths', 'improvements', mode='before')
+    @classmethod
+    def items(cls, v):
+        return _coerce_list(v)
+
+
+# -------------------------
+# 📊 Parser Stats
+# -------------------------
+_stats_lock = threading.Lock()
+_stats = collections.Counter()
+
+
+def _count(field):
+    with _stats_lock:
+        _stats[field] += 1
+
+
+def structured_output_stats():
+    """Process-wide parse outcomes for LLM JSON answers."""
+    with _stats_lock:
+        counts = dict(_stats)
+    return {
+        "clean": counts.get("clean", 0),
+        "repaired": counts.get("repaired", 0),
+        "fixups": counts.get("fixups", 0),
+        "fixups_recovered": counts.get("fixups_recovered", 0),
+        "defaulted": counts.get("defaulted", 0),
+        "failed": counts.get("failed", 0),
+    }
+
+
+# -------------------------
+# 🔧 Tolerant Extraction
+# -------------------------
+_CLOSERS = {"{": "}", "[": "]"}
+_SCORE_FRACTION = re.compile(r'\s*/\s*10(?![\d.])')
+
+
+def _scan(text):
+    """
+    Single pass over `text` from the first `{` or `[` to its matching close.
+
+    Repairs the usual LLM slips on the way: markdown fences and chatter around
+    the JSON are skipped, bare `9/10` scores become `9`, trailing commas are
+    dropped, and anything after the top-level value (e.g. `]学]`) is ignored.
+    A truncated answer is cut back to the last complete member and closed; if
+    it stopped inside a string, the whole top-level member holding that string
+    is dropped, so a cut-off sentence is re-asked for rather than accepted.
+    Returns (json_text, repaired) or (None, False) when there is no JSON.
+    """
+    start = -1
+    for i, ch in enumerate(text):
+        if ch in _CLOSERS:
+            start = i
+            break
+    if start == -1:
+        return None, False
+
+    out = []
+    stack = []
+    cuts = []  # (len(out), open brackets) at each comma outside a string
+    repaired = False
+    in_string = False
+    escaped = False
+    i = start
+    n = len(text)
+    while i < n:
+        ch = text[i]
+        if in_string:
+            out.append(ch)
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+            i += 1
+            continue
+
+        if ch == '"':
+            in_string = True
+        elif ch in _CLOSERS:
+            stack.append(_CLOSERS[ch])
+        elif ch in "}]":
+            if not stack or ch != stack[-1]:
+                repaired = True  # Stray closer
+                i += 1
+                continue
+            # Drop a trailing comma before the closer
+            j = len(out) - 1
+            while j >= 0 and out[j].isspace():
+                j -= 1
+            if j >= 0 and out[j] == ",":
+                del out[j]
+                repaired = True
+            stack.pop()
+            out.append(ch)
+            if not stack:
+                return "".join(out), repaired
+            i += 1
+            continue
+        elif ch == ",":
+            cuts.append((len(out), tuple(stack)))
+        elif ch.isdigit():
+            m = _SCORE_FRACTION.match(text, i + 1)
+            if m:
+                out.append(ch)
+                i = m.end()
+                repaired = True
+                continue
+        out.append(ch)
+        i += 1
+
+    # Ran out of input with open brackets: the answer was truncated
+    if in_string or stack:
+        repaired = True
+        body = "".join(out)
+        if in_string:
+            # Closing the string would pass a cut-off value off as complete
+            candidates = [(body[:pos], open_stack) for pos, open_stack in reversed(cuts) if len(open_stack) == 1]
+        else:
+            candidates = [(body, list(stack))]
+            candidates.extend((body[:pos], open_stack) for pos, open_stack in reversed(cuts))
+        for candidate, open_stack in candidates:
+            closed = candidate + "".join(reversed(open_stack))
+            try:
+                json.loads(closed, strict=False)
+                return closed, repaired
+            except ValueError:
+                continue
+        return None, repaired
+    return "".join(out), repaired
+
+
+def extract_json(text, stats=None):
+    """
+    Best-effort JSON value from an LLM answer, or None.
+    `stats` is a list that receives "clean" or "repaired" for the caller.
+    """
+    if not text:
+        return None
+    text = str(text)
+    try:
+        value = json.loads(text, strict=False)
+        if stats is not None:
+            stats.append("clean")
+        return value
+    except ValueError:
+        pass
+    candidate, repaired = _scan(text)
+    if candidate is None:
+        return None
+    try:
+        value = json.loads(candidate, strict=False)
+    except ValueError:
+        return None
+    if stats is not None:
+        stats.append("repaired" if repaired else "clean")
+    return value
+
+
+def parse_json_list(value):
+    """A stored JSON list, salvaged if possible; falls back to the raw text as one item."""
+    if not value:
+        return []
+    parsed = extract_json(value)
+    if isinstance(parsed, list):
+        return parsed
+    return [str(value).strip()]
+
+
+# -------------------------
+# ✅ Validation + Fix-up
+# -------------------------
+def _validate(data, model):
+    """Returns (instance, data, []) or (None, valid_fields, bad_field_names)."""
+    try:
+        return model.model_validate(data), data, []
+    except ValidationError as e:
+        bad = sorted({str(err["loc"][0]) for err in e.errors() if err.get("loc")})
+        valid = {k: v for k, v in data.items() if k not in bad}
+        return None, valid, bad
+
+
+def _field_template(model, fields):
+    example = {}
+    for name in fields:
+        field = model.model_fields.get(name)
+        annotation = getattr(field, "annotation", None)
+        if annotation is int:
+            example[name] = 0
+        elif annotation is not None and getattr(annotation, "__origin__", None) is list:
+            example[name] = []
+        else:
+            example[name] = ""
+    return json.dumps(example, indent=2)
+
+
+def parse_structured(text, model):
+    """
+    Parse an LLM answer into `model`.
+    Returns (instance, partial, missing): on success `missing` is empty; otherwise
+    `partial` holds the fields that did validate and `missing` names the rest.
+    """
+    outcome = []
+    raw = extract_json(text, outcome)
+    if not isinstance(raw, dict):
+        return None, {}, list(model.model_fields)
+    data = {str(k).strip().lower(): v for k, v in raw.items()}
+    instance, partial, missing = _validate(data, model)
+    if instance is not None:
+        _count(outcome[0] if outcome else "clean")
+    return instance, partial, missing
+
+
+def _with_defaults(valid, defaults, model):
+    """Fill the fields still missing after a fix-up from `defaults`; None if that doesn't validate either."""
+    missing = [name for name in model.model_fields if name not in valid]
+    instance, _, _ = _validate({**defaults, **valid}, model)
+    if instance is not None:
+        _count("defaulted")
+        print(f"[WARNING] ⚠️ Structured output still missing {missing}, using defaults")
+    return instance
+
+
+def generate_structured(generate, prompt, model, is_error=None, defaults=None):
+    """
+    Run `generate(prompt, fixup=False)` and parse the answer into `model`.
+
+    If only some fields are missing or invalid, ask once more for just those
+    fields (`generate(fixup_prompt, fixup=True)`) and merge them in, instead of
+    regenerating the whole answer. If the fix-up doesn't supply them either,
+    `defaults` (a dict of field values), when given, fills the gaps so a
+    partial answer is still used. Returns (instance or None, raw_text).
+    """
+    text = generate(prompt, fixup=False)
+    if is_error and is_error(text):
+        _count("failed")
+        return None, text
+
+    instance, partial, missing = parse_structured(text, model)
+    if instance is not None:
+        return instance, text
+    if not partial:
+        # Nothing usable came back: a fix-up would be a full regeneration
+        _count("failed")
+        return None, text
+
+    _count("fixups")
+    print(f"[INFO] 🔧 Structured output missing {missing}, asking for those fields only")
+    fixup_prompt = f"""{prompt}
+
+Your previous answer was incomplete. These fields were already provided:
+{json.dumps(partial, indent=2, ensure_ascii=False)}
+
+Return ONLY the missing fields below, strictly as JSON, no extra text:
+{_field_template(model, missing)}
+"""
+    fixup_text = generate(fixup_prompt, fixup=True)
+    fixed = None if is_error and is_error(fixup_text) else extract_json(fixup_text)
+    valid = partial
+    if isinstance(fixed, dict):
+        merged = dict(partial)
+        merged.update({str(k).strip().lower(): v for k, v in fixed.items()})
+        instance, valid, _ = _validate(merged, model)
+        if instance is not None:
+            _count("fixups_recovered")
+            return instance, text
+    if defaults is not None:
+        instance = _with_defaults(valid, defaults, model)
+        if instance is not None:
+            return instance, text
+    _count("failed")
+    return None, text
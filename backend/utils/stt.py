@@ -0,0 +1,483 @@
+import collections
+import concurrent.futures
+import json
+import os
+import shutil
+import subprocess
+import threading
+import time
+
+import numpy as np
+
+from utils.vad import trim_silence, vad_stats
+
+# -------------------------
+# 🎬 FFmpeg Setup
+# -------------------------
+# ✅ IMPROVED: Better FFmpeg detection
+def setup_ffmpeg():
+    """Detect and setup FFmpeg path"""
+    # Check if ffmpeg is already in PATH
+    if shutil.which("ffmpeg"):
+        print("[INFO] ✅ FFmpeg found in system PATH")
+        return True
+    
+    # Common FFmpeg installation paths
+    common_paths = [
+        r"C:\ffmpeg\bin",
+        r"C:\Program Files\ffmpeg\bin",
+        r"/usr/local/bin",
+        r"/usr/bin"
+    ]
+    
+    for path in common_paths:
+        if os.path.exists(os.path.join(path, "ffmpeg.exe" if os.name == 'nt' else "ffmpeg")):
+            os.environ["PATH"] += os.pathsep + path
+            print(f"[INFO] ✅ FFmpeg found at: {path}")
+            return True
+    
+    print("[ERROR] ❌ FFmpeg not found!")
+    print("[INFO] 💡 Install FFmpeg:")
+    print("  Windows: Download from https://ffmpeg.org/download.html")
+    print("  Linux: sudo apt-get install ffmpeg")
+    print("  Mac: brew install ffmpeg")
+    return False
+
+
+# -------------------------
+# 🎤 Speech Model Setup
+# -------------------------
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+VOSK_MODEL_PATH = os.path.join(BASE_DIR, "vosk-model-small-en-us-0.15")
+
+# Whisper engine: "openai" (PyTorch) or "faster" (faster-whisper / CTranslate2, int8 on CPU)
+WHISPER_BACKEND = os.getenv("WHISPER_BACKEND", "openai")
+WHISPER_MODEL = os.getenv("WHISPER_MODEL", "small")                    # tiny | base | small | medium | ...
+WHISPER_COMPUTE_TYPE = os.getenv("WHISPER_COMPUTE_TYPE", "int8")       # faster-whisper only
+WHISPER_BEAM_SIZE = int(os.getenv("WHISPER_BEAM_SIZE", "1"))           # 1 = greedy decoding
+WHISPER_CPU_THREADS = int(os.getenv("WHISPER_CPU_THREADS", "0"))       # faster-whisper only, 0 = auto
+
+# How Vosk backs up Whisper: "sequential" (only after Whisper fails), "race" (both at once)
+# or "hedge" (Vosk starts if Whisper hasn't answered within STT_HEDGE_DELAY seconds). Sequential
+# keeps Whisper's accuracy; a hedge delay below Whisper's usual latency hands most turns to Vosk
+STT_STRATEGY = os.getenv("STT_STRATEGY", "sequential")
+STT_HEDGE_DELAY = float(os.getenv("STT_HEDGE_DELAY", "2"))
+STT_PREFER_WHISPER_WINDOW = float(os.getenv("STT_PREFER_WHISPER_WINDOW", "0.5"))  # Grace after Vosk finishes
+
+ffmpeg_available = False
+whisper_model = None
+whisper_backend = None
+vosk_model = None
+
+
+def create_whisper_model(backend=WHISPER_BACKEND, size=WHISPER_MODEL, compute_type=WHISPER_COMPUTE_TYPE):
+    """Load a Whisper model on the given engine (raises if the engine isn't installed)."""
+    if backend == "faster":
+        from faster_whisper import WhisperModel
+        return WhisperModel(size, device="auto", compute_type=compute_type, cpu_threads=WHISPER_CPU_THREADS)
+    if backend == "openai":
+        import whisper
+        return whisper.load_model(size)
+    raise ValueError(f"Unknown WHISPER_BACKEND: {backend}")
+
+
+def run_whisper(model, backend, audio, beam_size=WHISPER_BEAM_SIZE):
+    """Transcribe float32 16 kHz mono samples; returns the stripped text."""
+    if backend == "faster":
+        segments, _ = model.transcribe(audio, beam_size=beam_size)
+        return "".join(segment.text for segment in segments).strip()
+    options = {"beam_size": beam_size} if beam_size > 1 else {}
+    return model.transcribe(audio, **options)["text"].strip()
+
+
+def warm_up_whisper(model, backend):
+    """One pass over a second of silence so the first real turn doesn't pay for lazy init."""
+    run_whisper(model, backend, np.zeros(SAMPLE_RATE, dtype=np.float32))
+
+
+def load_whisper():
+    global whisper_model, whisper_backend
+    print(f"[INFO] 🧠 Loading Whisper model ({WHISPER_BACKEND}, {WHISPER_MODEL})...")
+    try:
+        started = time.perf_counter()
+        model = create_whisper_model()
+        warm_up_whisper(model, WHISPER_BACKEND)
+        whisper_model, whisper_backend = model, WHISPER_BACKEND
+        print(f"[INFO] ✅ Whisper model loaded and warmed up in {time.perf_counter() - started:.1f}s")
+    except Exception as e:
+        whisper_model, whisper_backend = None, None
+        print(f"[ERROR] ❌ Failed to load Whisper model: {e}")
+
+
+def load_vosk():
+    global vosk_model
+    print("[INFO] Loading Vosk speech recognition model...")
+    print("[DEBUG] Looking for model at:", VOSK_MODEL_PATH)
+    print("[DEBUG] Exists:", os.path.exists(VOSK_MODEL_PATH))
+
+    if os.path.exists(VOSK_MODEL_PATH):
+        try:
+            from vosk import Model
+            vosk_model = Model(VOSK_MODEL_PATH)
+            print(f"[INFO] ✅ Vosk model loaded from: {VOSK_MODEL_PATH}")
+        except Exception as e:
+            vosk_model = None
+            print(f"[ERROR] ❌ Failed to load Vosk model: {e}")
+    else:
+        vosk_model = None
+        print(f"[WARNING] ⚠️ Vosk model not found at: {VOSK_MODEL_PATH}")
+
+
+def probe_ffmpeg():
+    global ffmpeg_available
+    ffmpeg_available = setup_ffmpeg()
+
+
+def load_models():
+    """
+    Probe FFmpeg and load Whisper (primary) and Vosk (fallback).
+    The heavy imports happen here, so only the Whisper/Vosk STT provider pays for them.
+    """
+    probe_ffmpeg()
+    load_whisper()
+    load_vosk()
+
+
+def load_worker_models():
+    """
+    Model setup inside an STT worker process. A Vosk model loaded before the
+    worker was forked (by utils/stt_preload.py in the forkserver, or by the
+    parent with STT_START_METHOD=fork) is inherited and its memory shared
+    copy-on-write; only spawned workers load their own. Whisper is always
+    loaded per worker since torch state must not cross a fork.
+    """
+    probe_ffmpeg()
+    load_whisper()
+    if vosk_model is None:
+        load_vosk()
+
+
+_engine_lock = threading.Lock()
+_engine_counts = collections.defaultdict(collections.Counter)
+# Threads start on first use, so creating this at import costs nothing
+_engine_executor = concurrent.futures.ThreadPoolExecutor(max_workers=4, thread_name_prefix="stt-engine")
+
+
+def _record(engine, **counts):
+    with _engine_lock:
+        for key, value in counts.items():
+            _engine_counts[engine][key] += value
+
+
+def engine_stats():
+    """Counters from this process's transcription stages (summed across STT workers)."""
+    with _engine_lock:
+        engines = {name: dict(counts) for name, counts in _engine_counts.items()}
+    return {"vad": vad_stats(), "engines": engines}
+
+
+def summarize_engine_stats(stats):
+    """Add derived means and win rates to (possibly summed) engine_stats()."""
+    engines = (stats or {}).get("engines", {})
+    decided = engines.get("decisions", {})
+    total = sum(decided.values())
+    for name in ("whisper", "vosk"):
+        counts = engines.get(name)
+        if not counts:
+            continue
+        runs = counts.get("runs", 0)
+        counts["latency_ms_mean"] = round(counts.get("latency_ms_sum", 0) / runs, 1) if runs else None
+        counts["win_rate"] = round(counts.get("wins", 0) / total, 3) if total else None
+    return stats
+
+
+def model_status():
+    return {
+        "whisper_loaded": whisper_model is not None,
+        "whisper_engine": f"{whisper_backend}:{WHISPER_MODEL}" if whisper_model is not None else None,
+        "vosk_model_loaded": vosk_model is not None,
+        "ffmpeg_available": ffmpeg_available,
+    }
+
+
+# -------------------------
+# 🔊 Decoding
+# -------------------------
+SAMPLE_RATE = 16000  # What both Whisper and Vosk expect
+
+
+def read_upload(audio_file):
+    """Upload bytes, or None for a missing/empty recording."""
+    audio_data = audio_file.read()
+    audio_file.seek(0)
+    print(f"[DEBUG] 🎤 Received audio: {len(audio_data)} bytes")
+
+    if len(audio_data) < 1000:
+        print("[ERROR] ❌ Audio file too small (likely empty recording)")
+        return None
+    return audio_data
+
+
+def decode_audio(audio_data):
+    """
+    Decode an upload (WebM/Opus from the browser, or anything FFmpeg reads)
+    to 16 kHz mono 16-bit PCM in memory: bytes go in on FFmpeg's stdin and
+    raw samples come back on stdout. Returns an int16 NumPy array or None.
+    """
+    if not ffmpeg_available:
+        print("[ERROR] ❌ FFmpeg not available")
+        return None
+
+    ffmpeg_cmd = [
+        "ffmpeg",
+        "-hide_banner",
+        "-loglevel", "error",
+        "-i", "pipe:0",        # Upload bytes on stdin
+        "-ac", "1",            # Mono audio
+        "-ar", str(SAMPLE_RATE),  # 16kHz sample rate
+        "-f", "s16le",         # Raw 16-bit PCM, no container
+        "pipe:1"
+    ]
+    print("[DEBUG] 🔄 Decoding upload → 16kHz PCM in memory with FFmpeg...")
+    try:
+        result = subprocess.run(ffmpeg_cmd, input=audio_data, capture_output=True, timeout=30)
+    except subprocess.TimeoutExpired:
+        print("[ERROR] ❌ FFmpeg decode timeout (>30s)")
+        return None
+
+    if result.returncode != 0:
+        print(f"[ERROR] ❌ FFmpeg failed with code {result.returncode}")
+        print(f"[ERROR] FFmpeg stderr: {result.stderr.decode('utf-8', 'replace')}")
+        return None
+
+    pcm = np.frombuffer(result.stdout, dtype=np.int16)
+    print(f"[DEBUG] 📊 Decoded {len(pcm)} samples ({len(pcm) / SAMPLE_RATE:.2f}s)")
+    if len(pcm) < SAMPLE_RATE // 10:
+        print("[ERROR] ❌ Decoded audio too short (conversion likely failed)")
+        return None
+    return pcm
+
+
+# -------------------------
+# 📝 Transcription
+# -------------------------
+def transcribe_pcm_whisper(pcm):
+    """
+    ✅ PRIMARY: Transcribe decoded PCM using Whisper (more accurate)
+    """
+    try:
+        if whisper_model is None:
+            print("[ERROR] ❌ Whisper model not loaded")
+            return None
+
+        print("[DEBUG] 🧠 Transcribing with Whisper...")
+        # Both engines take float32 samples in [-1, 1] at 16 kHz directly
+        transcribed_text = run_whisper(whisper_model, whisper_backend, pcm.astype(np.float32) / 32768.0)
+
+        if transcribed_text:
+            print(f"[SUCCESS] ✅ Whisper transcribed: '{transcribed_text}'")
+            return transcribed_text
+        else:
+            print("[ERROR] ❌ Whisper returned empty transcription")
+            return None
+
+    except Exception as e:
+        print(f"[ERROR] ❌ Whisper transcription failed: {e}")
+        import traceback
+        print(f"[ERROR] Full traceback:\n{traceback.format_exc()}")
+        return None
+
+
+def transcribe_pcm_vosk(pcm):
+    """
+    ✅ FALLBACK: Transcribe decoded PCM with Vosk (used if Whisper fails)
+    """
+    try:
+        if vosk_model is None:
+            print("[ERROR] ❌ Vosk model not loaded")
+            return None
+
+        # Create recognizer
+        from vosk import KaldiRecognizer
+        print("[DEBUG] 🎯 Creating Vosk recognizer...")
+        rec = KaldiRecognizer(vosk_model, SAMPLE_RATE)
+        rec.SetWords(True)
+
+        result_text = ""
+        frames_processed = 0
+        data = pcm.tobytes()
+        chunk = 4000 * 2  # 4000 frames of 16-bit mono
+
+        print("[DEBUG] 🔍 Starting transcription...")
+        for start in range(0, len(data), chunk):
+            frames_processed += 1
+            if rec.AcceptWaveform(data[start:start + chunk]):
+                part_result = json.loads(rec.Result())
+                part_text = part_result.get("text", "")
+                if part_text:
+                    print(f"[DEBUG] 📝 Partial result: '{part_text}'")
+                    result_text += part_text + " "
+
+        # Get final result
+        final_result = json.loads(rec.FinalResult())
+        final_text = final_result.get("text", "")
+        if final_text:
+            print(f"[DEBUG] 📝 Final result: '{final_text}'")
+            result_text += final_text
+
+        result_text = result_text.strip()
+        print(f"[DEBUG] 📊 Processed {frames_processed} frame chunks")
+
+        if result_text:
+            print(f"[SUCCESS] ✅ Vosk transcribed: '{result_text}'")
+            return result_text
+        else:
+            print("[ERROR] ❌ No speech detected in audio")
+            print("[INFO] 💡 Possible causes:")
+            print("  - Audio too quiet")
+            print("  - Background noise too loud")
+            print("  - Recording too short")
+            print("  - Microphone not working properly")
+            return None
+
+    except Exception as e:
+        print(f"[ERROR] ❌ Vosk transcription failed: {e}")
+        import traceback
+        print(f"[ERROR] Full traceback:\n{traceback.format_exc()}")
+        return None
+
+
+# Returned instead of None when the recording decoded fine but holds no speech
+NO_SPEECH = ""
+
+
+def _decode_upload(audio_file):
+    """Decoded samples with silence trimmed; None if undecodable, NO_SPEECH if silent."""
+    audio_data = read_upload(audio_file)
+    pcm = decode_audio(audio_data) if audio_data is not None else None
+    if pcm is None:
+        return None
+    speech = trim_silence(pcm, SAMPLE_RATE)
+    if speech is None:
+        print("[ERROR] ❌ No speech detected in recording (silent clip rejected)")
+        return NO_SPEECH
+    print(f"[DEBUG] ✂️ VAD kept {len(speech) / SAMPLE_RATE:.2f}s of {len(pcm) / SAMPLE_RATE:.2f}s")
+    return speech
+
+
+def transcribe_audio_whisper(audio_file):
+    """Whisper only, straight from an upload."""
+    pcm = _decode_upload(audio_file)
+    return pcm if pcm is None or pcm is NO_SPEECH else transcribe_pcm_whisper(pcm)
+
+
+def transcribe_audio_vosk(audio_file):
+    """Vosk only, straight from an upload."""
+    pcm = _decode_upload(audio_file)
+    return pcm if pcm is None or pcm is NO_SPEECH else transcribe_pcm_vosk(pcm)
+
+
+def transcribe_audio(audio_file):
+    """
+    ✅ HYBRID: Whisper is primary (more accurate), Vosk the backup per STT_STRATEGY.
+    The upload is decoded and silence-trimmed once and the same samples feed
+    both engines. Silent recordings return NO_SPEECH without running a model.
+    """
+    if whisper_model is None and vosk_model is None:
+        print("[ERROR] ❌ Both Whisper and Vosk unavailable")
+        return None
+
+    pcm = _decode_upload(audio_file)
+    if pcm is None or pcm is NO_SPEECH:
+        return pcm
+
+    if whisper_model is None or vosk_model is None or STT_STRATEGY == "sequential":
+        return _transcribe_sequential(pcm)
+    return _transcribe_hedged(pcm)
+
+
+def _timed(engine, transcribe, pcm):
+    started = time.perf_counter()
+    text = transcribe(pcm)
+    _record(engine, runs=1, empty=0 if text else 1,
+            latency_ms_sum=round((time.perf_counter() - started) * 1000, 1))
+    return text
+
+
+def _decide(winner, reason):
+    _record("decisions", **{reason: 1})
+    if winner:
+        _record(winner, wins=1)
+
+
+def _transcribe_sequential(pcm):
+    print("[INFO] 🎯 Attempting transcription with Whisper (primary)...")
+    
+    # Try Whisper first
+    if whisper_model is not None:
+        result = _timed("whisper", transcribe_pcm_whisper, pcm)
+        if result:
+            _decide("whisper", "whisper")
+            return result
+        print("[WARNING] ⚠️ Whisper failed, trying Vosk fallback...")
+    else:
+        print("[WARNING] ⚠️ Whisper not available, using Vosk...")
+    
+    # Fallback to Vosk
+    if vosk_model is not None:
+        result = _timed("vosk", transcribe_pcm_vosk, pcm)
+        if result:
+            _decide("vosk", "vosk_fallback")
+            return result
+    
+    _decide(None, "none")
+    return None
+
+
+def _transcribe_hedged(pcm):
+    """
+    Whisper and Vosk on the same samples; the first usable text wins, except
+    that Whisper still wins if it lands within STT_PREFER_WHISPER_WINDOW of
+    Vosk. With the hedge strategy Vosk only starts once Whisper has run for
+    STT_HEDGE_DELAY. A losing engine can't be interrupted; it finishes in the
+    background and its result is discarded.
+    """
+    print(f"[INFO] 🎯 Transcribing with Whisper, Vosk as {STT_STRATEGY} backup...")
+    whisper = _engine_executor.submit(_timed, "whisper", transcribe_pcm_whisper, pcm)
+    if STT_STRATEGY == "hedge":
+        try:
+            result = whisper.result(timeout=STT_HEDGE_DELAY)
+        except concurrent.futures.TimeoutError:
+            print(f"[INFO] ⏱️ Whisper still running after {STT_HEDGE_DELAY:.1f}s, starting Vosk")
+        else:
+            if result:
+                _decide("whisper", "whisper")
+                return result
+            print("[WARNING] ⚠️ Whisper failed, trying Vosk fallback...")
+            result = _timed("vosk", transcribe_pcm_vosk, pcm)
+            _decide("vosk" if result else None, "vosk_fallback" if result else "none")
+            return result
+    vosk = _engine_executor.submit(_timed, "vosk", transcribe_pcm_vosk, pcm)
+
+    pending = {whisper, vosk}
+    while pending:
+        done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+        if whisper in done and whisper.result():
+            _decide("whisper", "whisper")
+            return whisper.result()
+        if vosk in done and vosk.result():
+            if whisper in pending:
+                # Prefer Whisper's (more accurate) text if it's about to finish anyway
+                try:
+                    result = whisper.result(timeout=STT_PREFER_WHISPER_WINDOW)
+                except concurrent.futures.TimeoutError:
+                    result = None
+                if result:
+                    _decide("whisper", "whisper_in_grace")
+                    return result
+            print("[INFO] 🏁 Vosk answered first")
+            _decide("vosk", "vosk_first")
+            return vosk.result()
+
+    _decide(None, "none")
+    return None
@@ -0,0 +1,336 @@
+import atexit
+import collections
+import concurrent.futures
+import io
+import itertools
+import multiprocessing
+import multiprocessing.connection
+import os
+import threading
+import time
+
+# -------------------------
+# ⚙️ STT Pool Settings
+# -------------------------
+STT_WORKERS = int(os.getenv("STT_WORKERS", "2"))                  # 0 = transcribe in the API process
+STT_JOB_TIMEOUT = float(os.getenv("STT_JOB_TIMEOUT", "60"))       # Seconds before a job's worker is recycled
+# Not "fork" by default: the API process runs threads (dispatch, loaders, executors) whose locks a fork can copy held
+STT_START_METHOD = os.getenv(
+    "STT_START_METHOD", "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+)
+
+
+class STTTimeout(Exception):
+    """A transcription job ran past its deadline; its worker was restarted."""
+
+
+def _worker_main(conn, load, transcribe, status, stats):
+    """Worker process: warm the models once, then transcribe jobs until told to stop."""
+    try:
+        load()
+        conn.send(("ready", status() if status else {}))
+    except Exception as e:
+        conn.send(("ready", {"error": str(e)}))
+    while True:
+        try:
+            msg = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            return
+        if msg is None:
+            return
+        job_id, audio = msg
+        try:
+            text, error = transcribe(io.BytesIO(audio)), None
+        except Exception as e:
+            text, error = None, str(e)
+        conn.send(("done", job_id, text, error, stats() if stats else None))
+
+
+def _add_stats(total, stats):
+    """Sum nested numeric counters into `total` (dicts of dicts of numbers)."""
+    for key, value in (stats or {}).items():
+        if isinstance(value, dict):
+            _add_stats(total.setdefault(key, {}), value)
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            total[key] = round(total.get(key, 0) + value, 6)
+    return total
+
+
+class _Worker:
+    def __init__(self, index, process, conn):
+        self.index = index
+        self.process = process
+        self.conn = conn
+        self.ready = False
+        self.retired = False      # Taken out of service; the dispatch thread starts its replacement
+        self.status = {}
+        self.engine_stats = None  # Latest counters reported by the worker's `stats` callable
+        self.job = None           # (job_id, future, deadline) while busy
+        self.busy_since = None
+        self.busy_seconds = 0.0
+        self.jobs = 0
+        self.started = time.monotonic()
+
+
+class STTWorkerPool:
+    """
+    Transcription on a pool of worker processes, each with warm models.
+
+    Jobs wait in a FIFO queue and are handed to the first idle worker, so
+    throughput scales with cores and the API process never runs a model
+    itself. Queued jobs can be cancelled outright; a job that overruns its
+    timeout (or is cancelled while running) gets its worker terminated and
+    replaced, since a model call can't be interrupted from outside.
+    """
+
+    def __init__(self, load, transcribe, status=None, preload=None, preload_module=None, stats=None,
+                 workers=STT_WORKERS, timeout=STT_JOB_TIMEOUT, start_method=STT_START_METHOD):
+        self.timeout = timeout
+        self._target = (load, transcribe, status, stats)
+        self._ctx = multiprocessing.get_context(start_method)
+        if start_method == "forkserver":
+            # Workers fork from a server that has imported the engine module and run
+            # `preload_module` (which loads shared models at import), so they share that memory
+            self._ctx.set_forkserver_preload([load.__module__] + ([preload_module] if preload_module else []))
+        elif preload and start_method == "fork":
+            preload()  # Loaded once here, shared with every forked worker
+        self._lock = threading.Lock()
+        self._queue = collections.deque()  # (job_id, audio, future, deadline)
+        self._ids = itertools.count(1)
+        self._counts = collections.Counter()
+        self._cancel_requested = set()  # Futures of running jobs to abort
+        self._retired_stats = {}        # Engine counters of workers that were replaced
+        self._retiring = []             # Workers waiting for _replace_retired
+        self._workers = [self._spawn(i) for i in range(workers)]
+        self._wakeup_r, self._wakeup_w = multiprocessing.Pipe(duplex=False)
+        self._closed = False
+        self._thread = threading.Thread(target=self._dispatch_loop, name="stt-dispatch", daemon=True)
+        self._thread.start()
+        atexit.register(self.shutdown)
+
+    def _spawn(self, index):
+        parent, child = self._ctx.Pipe()
+        process = self._ctx.Process(
+            target=_worker_main, args=(child, *self._target),
+            name=f"stt-worker-{index}", daemon=True
+        )
+        process.start()
+        child.close()
+        return _Worker(index, process, parent)
+
+    def _restart(self, worker):
+        """
+        Kill a stuck worker and queue its slot for a fresh one. Caller holds the
+        lock; the replacement is started by `_replace_retired`, outside it.
+        """
+        worker.process.terminate()
+        worker.ready, worker.retired = False, True
+        _add_stats(self._retired_stats, worker.engine_stats)
+        self._retiring.append(worker)
+        self._counts["restarts"] += 1
+
+    def _replace_retired(self):
+        """Reap retired workers and start their replacements (dispatch thread, lock not held)."""
+        with self._lock:
+            retiring, self._retiring = self._retiring, []
+        for worker in retiring:
+            worker.process.join(timeout=5)
+            worker.conn.close()
+            if self._closed:
+                continue
+            fresh = self._spawn(worker.index)
+            fresh.busy_seconds, fresh.jobs, fresh.started = worker.busy_seconds, worker.jobs, worker.started
+            with self._lock:
+                self._workers[worker.index] = fresh
+
+    def _wake(self):
+        try:
+            self._wakeup_w.send_bytes(b"1")
+        except OSError:
+            pass
+
+    def submit(self, audio, timeout=None):
+        """Queue raw audio bytes; returns a `concurrent.futures.Future` with the text (or None)."""
+        future = concurrent.futures.Future()
+        deadline = time.monotonic() + (timeout or self.timeout)
+        with self._lock:
+            job_id = next(self._ids)
+            self._queue.append((job_id, audio, future, deadline))
+            self._counts["submitted"] += 1
+        self._wake()
+        return future
+
+    def cancel(self, future):
+        """Cancel a job: dropped if still queued, its worker recycled if running."""
+        if future.cancel():
+            self._wake()
+            return True
+        with self._lock:
+            if future.done():
+                return False
+            self._cancel_requested.add(future)
+        self._wake()
+        return True
+
+    def transcribe(self, audio_file, timeout=None):
+        """Blocking convenience wrapper for a file-like upload."""
+        audio = audio_file.read()
+        audio_file.seek(0)
+        return self.submit(audio, timeout).result()
+
+    def _finish(self, worker, job_id, text, error, engine_stats=None):
+        if engine_stats is not None:
+            worker.engine_stats = engine_stats
+        job = worker.job
+        if job is None or job[0] != job_id:
+            return
+        worker.job = None
+        worker.busy_seconds += time.monotonic() - worker.busy_since
+        worker.jobs += 1
+        future = job[1]
+        if future.done():
+            return
+        if error:
+            self._counts["failed"] += 1
+            print(f"[ERROR] ❌ STT job {job_id} failed in worker {worker.index}: {error}")
+            future.set_exception(RuntimeError(error))
+        else:
+            self._counts["completed"] += 1
+            future.set_result(text)
+
+    def _dispatch_loop(self):
+        while not self._closed:
+            with self._lock:
+                conns = [w.conn for w in self._workers if not w.retired]
+            ready = multiprocessing.connection.wait(conns + [self._wakeup_r], timeout=0.25)
+            with self._lock:
+                if self._wakeup_r in ready:
+                    while self._wakeup_r.poll():
+                        self._wakeup_r.recv_bytes()
+                for worker in list(self._workers):
+                    if worker.retired or worker.conn not in ready:
+                        continue
+                    try:
+                        msg = worker.conn.recv()
+                    except (EOFError, OSError):
+                        self._crashed(worker)
+                        continue
+                    if msg[0] == "ready":
+                        worker.ready, worker.status = True, msg[1]
+                    elif msg[0] == "done":
+                        self._finish(worker, *msg[1:])
+                self._check_running()
+                self._assign()
+            self._replace_retired()
+
+    def _crashed(self, worker):
+        """Caller holds the lock."""
+        if self._closed:
+            return
+        print(f"[ERROR] ❌ STT worker {worker.index} died; restarting")
+        if worker.job and not worker.job[1].done():
+            worker.job[1].set_exception(RuntimeError("STT worker crashed"))
+            self._counts["failed"] += 1
+        self._restart(worker)
+
+    def _check_running(self):
+        """Recycle workers whose job timed out or was cancelled. Caller holds the lock."""
+        now = time.monotonic()
+        for worker in list(self._workers):
+            if worker.retired or worker.job is None:
+                continue
+            job_id, future, deadline = worker.job
+            if future in self._cancel_requested:
+                self._cancel_requested.discard(future)
+                self._counts["cancelled"] += 1
+                future.set_exception(concurrent.futures.CancelledError())
+            elif now > deadline:
+                self._counts["timeouts"] += 1
+                print(f"[ERROR] ❌ STT job {job_id} timed out in worker {worker.index}; restarting it")
+                future.set_exception(STTTimeout(f"transcription exceeded {self.timeout:.0f}s"))
+            elif not worker.process.is_alive():
+                self._crashed(worker)
+                continue
+            else:
+                continue
+            worker.busy_seconds += now - worker.busy_since
+            worker.job = None
+            self._restart(worker)
+
+    def _assign(self):
+        """Hand queued jobs to idle workers. Caller holds the lock."""
+        now = time.monotonic()
+        for worker in self._workers:
+            if not self._queue:
+                return
+            if not worker.ready or worker.job is not None:
+                continue
+            while self._queue:
+                job_id, audio, future, deadline = self._queue.popleft()
+                if future.cancelled():
+                    self._counts["cancelled"] += 1
+                    continue
+                if now > deadline:
+                    self._counts["timeouts"] += 1
+                    future.set_exception(STTTimeout("transcription queued past its deadline"))
+                    continue
+                if not future.set_running_or_notify_cancel():
+                    continue
+                worker.job = (job_id, future, deadline)
+                worker.busy_since = now
+                worker.conn.send((job_id, audio))
+                break
+
+    def status(self):
+        """Model status reported by the first ready worker."""
+        with self._lock:
+            for worker in self._workers:
+                if worker.ready:
+                    return dict(worker.status)
+        return {}
+
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            workers = []
+            for w in self._workers:
+                busy = w.busy_seconds + (now - w.busy_since if w.job else 0.0)
+                uptime = max(1e-9, now - w.started)
+                workers.append({
+                    "worker": w.index,
+                    "pid": w.process.pid,
+                    "ready": w.ready,
+                    "busy": w.job is not None,
+                    "jobs": w.jobs,
+                    "utilisation": round(min(1.0, busy / uptime), 3),
+                })
+            engine = _add_stats({}, self._retired_stats)
+            for w in self._workers:
+                _add_stats(engine, w.engine_stats)
+            return {
+                "workers": workers,
+                "queued": len(self._queue),
+                "submitted": self._counts.get("submitted", 0),
+                "completed": self._counts.get("completed", 0),
+                "failed": self._counts.get("failed", 0),
+                "timeouts": self._counts.get("timeouts", 0),
+                "cancelled": self._counts.get("cancelled", 0),
+                "restarts": self._counts.get("restarts", 0),
+                "engine": engine,
+            }
+
+    def shutdown(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._wake()
+        with self._lock:
+            for worker in self._workers:
+                try:
+                    worker.conn.send(None)
+                except OSError:
+                    pass
+            for worker in self._workers:
+                worker.process.join(timeout=5)
+                if worker.process.is_alive():
+                    worker.process.terminate()
@@ -0,0 +1,8 @@
+"""
+Imported by the STT pool's forkserver (see STTWorkerPool): loads the Vosk
+model there once, before any worker is forked from it, so every worker
+shares that copy's memory copy-on-write instead of loading its own.
+"""
+from utils import stt
+
+stt.load_vosk()
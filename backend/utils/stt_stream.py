@@ -0,0 +1,269 @@
+import asyncio
+import collections
+import concurrent.futures
+import io
+import itertools
+import json
+import os
+import queue
+import subprocess
+import threading
+import time
+import uuid
+
+# -------------------------
+# ⚙️ Streaming STT Settings
+# -------------------------
+STT_STREAM_TTL = float(os.getenv("STT_STREAM_TTL", "300"))              # Seconds a finished transcript is kept
+STT_STREAM_FINAL_WAIT = float(os.getenv("STT_STREAM_FINAL_WAIT", "15"))  # Max wait for a stream still finishing
+
+SAMPLE_RATE = 16000
+CHUNK_BYTES = 4000 * 2  # 4000 frames of 16-bit mono, same step as the batch Vosk path
+
+
+class BufferedSTTStream:
+    """
+    Fallback stream: chunks are only collected, and the whole recording is
+    transcribed by the provider at stop. No interim results.
+    """
+    kind = "buffered"
+
+    def __init__(self, provider):
+        self.provider = provider
+        self._audio = bytearray()
+
+    def feed(self, chunk):
+        """Add an audio chunk; returns the interim transcript, or None if unchanged."""
+        self._audio.extend(chunk)
+        return None
+
+    async def afinish(self):
+        if not self._audio:
+            return None
+        return await self.provider.atranscribe(io.BytesIO(bytes(self._audio)))
+
+    def close(self):
+        self._audio = bytearray()
+
+
+class VoskSTTStream(BufferedSTTStream):
+    """
+    Live recognition while the user is still talking.
+
+    Browser chunks (WebM/Opus) are queued for a writer thread that pipes them
+    into a long-running FFmpeg process; a reader thread takes 16 kHz PCM off
+    its stdout and feeds it to a KaldiRecognizer as it arrives. `feed` only
+    queues and returns the reader's latest transcript snapshot, so it never
+    blocks the event loop on the pipe or the decoder. At stop only FFmpeg's
+    tail and the recognizer's final result remain, so the text is ready
+    almost at once.
+    If nothing was recognized the buffered recording goes through the
+    provider's normal (Whisper first) path instead.
+    """
+    kind = "vosk"
+
+    def __init__(self, provider, model):
+        super().__init__(provider)
+        from vosk import KaldiRecognizer
+        self._rec = KaldiRecognizer(model, SAMPLE_RATE)
+        self._rec.SetWords(True)
+        self._lock = threading.Lock()
+        self._segments = []   # Finalized utterance segments
+        self._partial = ""
+        self._snapshot = ""   # Latest interim text, replaced whole by the reader (read without the lock)
+        self._reported = ""
+        self._chunks = queue.Queue()  # Audio for the decoder; None closes its stdin
+        self._decoder = subprocess.Popen(
+            ["ffmpeg", "-hide_banner", "-loglevel", "error",
+             "-i", "pipe:0", "-ac", "1", "-ar", str(SAMPLE_RATE), "-f", "s16le", "pipe:1"],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+        )
+        self._writer = threading.Thread(target=self._write_chunks, name="stt-stream-in", daemon=True)
+        self._writer.start()
+        self._reader = threading.Thread(target=self._read_pcm, name="stt-stream", daemon=True)
+        self._reader.start()
+
+    def _write_chunks(self):
+        stdin = self._decoder.stdin
+        while True:
+            chunk = self._chunks.get()
+            try:
+                if chunk is None:
+                    stdin.close()
+                    return
+                stdin.write(chunk)
+                stdin.flush()
+            except (BrokenPipeError, ValueError, OSError):
+                return  # Decoder gave up; afinish() falls back to the buffered recording
+
+    def _read_pcm(self):
+        stdout = self._decoder.stdout
+        while True:
+            pcm = stdout.read(CHUNK_BYTES)
+            if not pcm:
+                return
+            with self._lock:
+                if self._rec.AcceptWaveform(pcm):
+                    text = json.loads(self._rec.Result()).get("text", "")
+                    if text:
+                        self._segments.append(text)
+                    self._partial = ""
+                else:
+                    self._partial = json.loads(self._rec.PartialResult()).get("partial", "")
+                self._snapshot = self._text()
+
+    def _text(self):
+        """Caller holds the lock."""
+        return " ".join(self._segments + ([self._partial] if self._partial else []))
+
+    def feed(self, chunk):
+        super().feed(chunk)
+        self._chunks.put(chunk)
+        text = self._snapshot
+        if text == self._reported:
+            return None
+        self._reported = text
+        return text
+
+    def _finish_sync(self):
+        self._chunks.put(None)
+        self._writer.join(timeout=10)
+        self._reader.join(timeout=10)
+        self._decoder.wait(timeout=5)
+        with self._lock:
+            final = json.loads(self._rec.FinalResult()).get("text", "")
+            if final:
+                self._segments.append(final)
+            self._partial = ""
+            return " ".join(self._segments).strip()
+
+    async def afinish(self):
+        text = await asyncio.get_running_loop().run_in_executor(None, self._finish_sync)
+        if text:
+            print(f"[SUCCESS] ✅ Vosk stream transcribed: '{text}'")
+            return text
+        print("[WARNING] ⚠️ Live recognition found no speech; transcribing the full recording...")
+        return await super().afinish()
+
+    def close(self):
+        if self._decoder.poll() is None:
+            self._decoder.kill()
+        self._chunks.put(None)  # Lets the writer thread exit
+        super().close()
+
+
+class STTStreamRegistry:
+    """
+    Final transcripts of finished streams, keyed by stream id, so
+    /submit_human_input can take a `stream_id` instead of an upload. A stream
+    that is still finishing hands out a future the request can await.
+
+    With a shared simulation `store`, `afinish()` also publishes the final
+    text as an `stt_final` signal, and `result()` for a stream this worker
+    never saw waits for that signal instead, so the submit can land on any
+    worker.
+    """
+
+    def __init__(self, ttl=STT_STREAM_TTL, store=None):
+        self.ttl = ttl
+        self.store = store if store is not None and store.shared else None
+        self._lock = threading.Lock()
+        self._streams = collections.OrderedDict()  # stream_id -> (sim_id, future, opened_at)
+        self._ids = itertools.count(1)
+        # Stream ids are only unique per process; other workers may look them up
+        self._prefix = f"{uuid.uuid4().hex[:8]}-" if self.store else ""
+        self._counts = collections.Counter()
+        self._finish_ms = collections.deque(maxlen=500)
+
+    def _expire(self, now):
+        """Caller holds the lock."""
+        while self._streams:
+            stream_id, (_, future, opened_at) = next(iter(self._streams.items()))
+            if now - opened_at <= self.ttl:
+                break
+            self._streams.popitem(last=False)
+            if not future.done():
+                future.cancel()
+            self._counts["expired"] += 1
+
+    def open(self, sim_id, kind):
+        now = time.time()
+        with self._lock:
+            self._expire(now)
+            stream_id = f"{sim_id}-{self._prefix}{next(self._ids)}"
+            self._streams[stream_id] = (sim_id, concurrent.futures.Future(), now)
+            self._counts["opened"] += 1
+            self._counts[f"opened_{kind}"] += 1
+            return stream_id
+
+    def record_interim(self):
+        with self._lock:
+            self._counts["interim_results"] += 1
+
+    def finish(self, stream_id, text, finish_seconds=None):
+        with self._lock:
+            entry = self._streams.get(stream_id)
+            if finish_seconds is not None:
+                self._finish_ms.append(finish_seconds * 1000)
+            self._counts["finished" if text else "empty"] += 1
+        if entry and not entry[1].done():
+            entry[1].set_result(text)
+
+    async def afinish(self, sim_id, stream_id, text, finish_seconds=None):
+        """`finish()`, then publish the text for other workers when the store is shared."""
+        self.finish(stream_id, text, finish_seconds)
+        if self.store:
+            await self.store.apublish(sim_id, "stt_final", {"stream_id": stream_id, "text": text})
+
+    def abandon(self, stream_id):
+        """Client went away before stopping."""
+        with self._lock:
+            entry = self._streams.pop(stream_id, None)
+            self._counts["abandoned"] += 1
+        if entry and not entry[1].done():
+            entry[1].cancel()
+
+    async def result(self, sim_id, stream_id, timeout=STT_STREAM_FINAL_WAIT):
+        """Final text of a stream (waiting for one still finishing); None if unknown or empty."""
+        with self._lock:
+            entry = self._streams.pop(stream_id, None)
+        if entry is None and self.store:
+            return await self._shared_result(sim_id, stream_id, timeout)
+        if entry is None or entry[0] != sim_id:
+            return None
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(entry[1]), timeout)
+        except (asyncio.TimeoutError, concurrent.futures.CancelledError):
+            return None
+
+    async def _shared_result(self, sim_id, stream_id, timeout):
+        """Final text of a stream recorded on another worker, from its `stt_final` signal."""
+        deadline = time.monotonic() + timeout
+        after = 0  # The signal was most likely published before this request arrived
+        while True:
+            signals = await self.store.await_signals(
+                sim_id, ("stt_final",), after, max(0.0, deadline - time.monotonic())
+            )
+            if not signals:
+                return None
+            for signal in signals:
+                if signal.data["stream_id"] == stream_id:
+                    return signal.data["text"]
+            after = signals[-1].seq
+
+    def stats(self):
+        with self._lock:
+            finish = sorted(self._finish_ms)
+            return {
+                "open": len(self._streams),
+                "opened": self._counts.get("opened", 0),
+                "opened_vosk": self._counts.get("opened_vosk", 0),
+                "opened_buffered": self._counts.get("opened_buffered", 0),
+                "finished": self._counts.get("finished", 0),
+                "empty": self._counts.get("empty", 0),
+                "abandoned": self._counts.get("abandoned", 0),
+                "expired": self._counts.get("expired", 0),
+                "interim_results": self._counts.get("interim_results", 0),
+                "final_ms_p50": round(finish[len(finish) // 2], 1) if finish else None,
+                "final_ms_p95": round(finish[int(len(finish) * 0.95)], 1) if finish else None,
+            }
@@ -0,0 +1,106 @@
+import collections
+import os
+import threading
+
+# -------------------------
+# ⚙️ Transcript Settings
+# -------------------------
+TRANSCRIPT_WINDOW = int(os.getenv("TRANSCRIPT_WINDOW", "12"))              # Verbatim recent lines
+TRANSCRIPT_SUMMARY_LINES = int(os.getenv("TRANSCRIPT_SUMMARY_LINES", "12"))  # Compacted older lines
+TRANSCRIPT_SUMMARY_WORDS = int(os.getenv("TRANSCRIPT_SUMMARY_WORDS", "18"))  # Words kept per compacted line
+
+
+class TranscriptView:
+    """Immutable snapshot handed to prompt building and pre-generation."""
+    __slots__ = ("rendered", "last_speaker", "last_text", "count", "_state")
+
+    def __init__(self, rendered, last_speaker, last_text, count, state=None):
+        self.rendered = rendered
+        self.last_speaker = last_speaker
+        self.last_text = last_text
+        self.count = count
+        self._state = state  # Private Transcript copy behind `rendered`, for extended()
+
+    def __len__(self):
+        return self.count
+
+    def extended(self, agent, text):
+        """
+        View with one more (e.g. speculated) line appended after this one,
+        windowed and compacted exactly as the live transcript would be.
+        """
+        transcript = self._state._copy()  # The view's own copy is never mutated or shared
+        transcript.append(agent, text)
+        return transcript.snapshot()
+
+
+class Transcript:
+    """
+    Per-simulation discussion transcript built incrementally.
+
+    Each utterance is rendered once on append. The most recent lines are kept
+    verbatim; lines that fall out of that window are compacted to their opening
+    words, and only the newest compacted lines are kept. The rendered text (and
+    therefore prompt size) stays bounded however long the discussion runs.
+    """
+
+    def __init__(self, window=TRANSCRIPT_WINDOW, summary_lines=TRANSCRIPT_SUMMARY_LINES,
+                 summary_words=TRANSCRIPT_SUMMARY_WORDS):
+        self.summary_words = summary_words
+        self._recent = collections.deque()
+        self._window = window
+        self._summary = collections.deque(maxlen=summary_lines)
+        self._dropped = 0  # Lines compacted away entirely
+        self._count = 0
+        self._last = ("", "")
+        self._view = None
+        self._lock = threading.Lock()
+
+    def _compact(self, agent, text):
+        words = text.split()
+        short = " ".join(words[:self.summary_words])
+        if len(words) > self.summary_words:
+            short += "..."
+        return f"- {agent}: {short}"
+
+    def _copy(self):
+        """Independent transcript with the same lines and limits. Caller holds the lock."""
+        other = Transcript(self._window, self._summary.maxlen, self.summary_words)
+        other._recent.extend(self._recent)
+        other._summary.extend(self._summary)
+        other._dropped, other._count, other._last = self._dropped, self._count, self._last
+        return other
+
+    def append(self, agent, text):
+        with self._lock:
+            self._recent.append((agent, text, f"- {agent}: {text}"))
+            while len(self._recent) > self._window:
+                old_agent, old_text, _ = self._recent.popleft()
+                if len(self._summary) == self._summary.maxlen:
+                    self._dropped += 1
+                self._summary.append(self._compact(old_agent, old_text))
+            self._count += 1
+            self._last = (agent, text)
+            self._view = None
+
+    def _render(self):
+        parts = []
+        if self._summary:
+            header = "Earlier in the discussion (condensed):"
+            if self._dropped:
+                header = f"Earlier in the discussion (condensed, {self._dropped} older remarks omitted):"
+            parts.append(header)
+            parts.extend(self._summary)
+            parts.append("Most recent remarks:")
+        parts.extend(line for _, _, line in self._recent)
+        return "\n".join(parts)
+
+    def snapshot(self):
+        """O(1) after the first call per append; safe to pass across threads."""
+        with self._lock:
+            if self._view is None:
+                self._view = TranscriptView(self._render(), self._last[0], self._last[1], self._count, self._copy())
+            return self._view
+
+    def __len__(self):
+        return self._count
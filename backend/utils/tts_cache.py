@@ -0,0 +1,191 @@
+import collections
+import hashlib
+import os
+import threading
+
+from utils.providers import TTSProvider
+
+# -------------------------
+# ⚙️ TTS Cache Settings
+# -------------------------
+TTS_CACHE_ENABLED = os.getenv("TTS_CACHE_ENABLED", "1") != "0"
+TTS_CACHE_MAX_BYTES = int(os.getenv("TTS_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))            # Memory tier
+TTS_CACHE_DIR = os.getenv("TTS_CACHE_DIR", "./tts_cache")                                  # Empty = memory only
+TTS_CACHE_DISK_MAX_BYTES = int(os.getenv("TTS_CACHE_DISK_MAX_BYTES", str(256 * 1024 * 1024)))
+
+
+def normalize_text(text):
+    """Collapse whitespace so trivially different renderings share one clip."""
+    return " ".join(text.split())
+
+
+def tts_cache_key(voice_id, text):
+    """Content address for a clip: sha256 over (voice identity, normalized text)."""
+    payload = f"{voice_id}\n{normalize_text(text)}"
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class TTSCache:
+    """
+    Two-tier audio clip cache.
+
+    Memory tier: LRU bounded by total bytes.
+    Disk tier (optional): one file per clip in `disk_dir`, bounded by total
+    bytes and evicted least-recently-used first (file mtime is touched on
+    every hit, so the order survives restarts). Disk hits are promoted back
+    into memory.
+    """
+
+    def __init__(self, max_bytes=TTS_CACHE_MAX_BYTES, disk_dir=TTS_CACHE_DIR,
+                 disk_max_bytes=TTS_CACHE_DISK_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.disk_max_bytes = disk_max_bytes
+        self.disk_dir = disk_dir or None
+
+        self._lock = threading.Lock()
+        self._entries = collections.OrderedDict()  # key -> audio bytes
+        self._bytes = 0
+        self._disk = collections.OrderedDict()     # key -> file size, oldest first
+        self._disk_bytes = 0
+        self._counts = collections.Counter()
+
+        if self.disk_dir:
+            try:
+                os.makedirs(self.disk_dir, exist_ok=True)
+                self._load_disk_index()
+                print(f"[INFO] ✅ TTS cache disk tier at: {self.disk_dir} ({len(self._disk)} clips)")
+            except OSError as e:
+                self.disk_dir = None
+                print(f"[WARNING] ⚠️ TTS cache disk tier disabled: {e}")
+
+    def _path(self, key):
+        return os.path.join(self.disk_dir, f"{key}.audio")
+
+    def _load_disk_index(self):
+        files = []
+        for entry in os.scandir(self.disk_dir):
+            if entry.is_file() and entry.name.endswith(".audio"):
+                stat = entry.stat()
+                files.append((stat.st_mtime, entry.name[:-len(".audio")], stat.st_size))
+        for _, key, size in sorted(files):
+            self._disk[key] = size
+            self._disk_bytes += size
+        self._evict_disk()
+
+    def _evict_disk(self):
+        """Drop the least recently used clips past the disk budget. Caller holds the lock."""
+        while self._disk and self._disk_bytes > self.disk_max_bytes:
+            key, size = self._disk.popitem(last=False)
+            self._disk_bytes -= size
+            self._counts["disk_evictions"] += 1
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+    def _put_memory(self, key, audio):
+        size = len(audio)
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._bytes -= len(self._entries.pop(key))
+        self._entries[key] = audio
+        self._bytes += size
+        while self._entries and self._bytes > self.max_bytes:
+            _, old = self._entries.popitem(last=False)
+            self._bytes -= len(old)
+            self._counts["evictions"] += 1
+
+    def get(self, key):
+        """Return cached audio bytes or None."""
+        with self._lock:
+            audio = self._entries.get(key)
+            if audio is not None:
+                self._entries.move_to_end(key)
+                self._counts["hits"] += 1
+                return audio
+
+            if self.disk_dir and key in self._disk:
+                path = self._path(key)
+                try:
+                    with open(path, "rb") as f:
+                        audio = f.read()
+                    os.utime(path)
+                except OSError as e:
+                    print(f"[WARNING] ⚠️ TTS cache disk read failed: {e}")
+                    self._disk_bytes -= self._disk.pop(key)
+                    audio = None
+                if audio is not None:
+                    self._disk.move_to_end(key)
+                    self._put_memory(key, audio)
+                    self._counts["hits"] += 1
+                    self._counts["disk_hits"] += 1
+                    return audio
+
+            self._counts["misses"] += 1
+            return None
+
+    def put(self, key, audio):
+        if not audio:
+            return
+        with self._lock:
+            self._put_memory(key, audio)
+            if self.disk_dir and len(audio) <= self.disk_max_bytes:
+                path = self._path(key)
+                tmp = f"{path}.{threading.get_ident()}.tmp"
+                try:
+                    with open(tmp, "wb") as f:
+                        f.write(audio)
+                    os.replace(tmp, path)  # Atomic: readers never see half a clip
+                except OSError as e:
+                    print(f"[WARNING] ⚠️ TTS cache disk write failed: {e}")
+                    return
+                if key in self._disk:
+                    self._disk_bytes -= self._disk.pop(key)
+                self._disk[key] = len(audio)
+                self._disk_bytes += len(audio)
+                self._evict_disk()
+
+    def stats(self):
+        with self._lock:
+            hits = self._counts.get("hits", 0)
+            misses = self._counts.get("misses", 0)
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "disk_tier": self.disk_dir,
+                "disk_entries": len(self._disk),
+                "disk_bytes": self._disk_bytes,
+                "disk_max_bytes": self.disk_max_bytes,
+                "hits": hits,
+                "disk_hits": self._counts.get("disk_hits", 0),
+                "misses": misses,
+                "evictions": self._counts.get("evictions", 0),
+                "disk_evictions": self._counts.get("disk_evictions", 0),
+                "hit_rate": round(hits / (hits + misses), 3) if hits + misses else None,
+            }
+
+
+class CachedTTS(TTSProvider):
+    """Wraps a TTS provider so repeated (text, voice) pairs are synthesized once."""
+
+    def __init__(self, provider, cache):
+        self.provider = provider
+        self.cache = cache
+        self.name = provider.name
+        self.mime_type = provider.mime_type
+
+    def synthesize(self, text, voice):
+        key = tts_cache_key(self.provider.voice_id(voice), text)
+        audio = self.cache.get(key)
+        if audio is None:
+            audio = self.provider.synthesize(normalize_text(text), voice)
+            self.cache.put(key, audio)
+        return audio
+
+    def concat(self, clips):
+        return self.provider.concat(clips)
+
+    def voice_id(self, voice):
+        return self.provider.voice_id(voice)
@@ -0,0 +1,176 @@
+import asyncio
+import collections
+import concurrent.futures
+import os
+import re
+import threading
+import time
+
+# -------------------------
+# ⚙️ TTS Pipeline Settings
+# -------------------------
+TTS_WORKERS = int(os.getenv("TTS_WORKERS", "8"))                    # Sentence clips synthesized at once
+TTS_MIN_CHUNK_WORDS = int(os.getenv("TTS_MIN_CHUNK_WORDS", "4"))    # Shorter sentences join the next one
+STATS_WINDOW = 500
+
+_executor = concurrent.futures.ThreadPoolExecutor(max_workers=TTS_WORKERS, thread_name_prefix="tts")
+
+# A sentence ends at . ! or ? plus any closing quotes/brackets, followed by whitespace.
+# The closers stay with their sentence (`He said "no."` is one chunk).
+SENTENCE_END = re.compile(r'[.!?]+["\')\]]*(?=\s)')
+
+
+def split_complete_sentences(buffer):
+    """Split off finished sentences; return (sentences, unfinished_remainder)."""
+    sentences, start = [], 0
+    for m in SENTENCE_END.finditer(buffer):
+        sentence = buffer[start:m.end()].strip()
+        if sentence:
+            sentences.append(sentence)
+        start = m.end()
+    return sentences, buffer[start:].lstrip()
+
+
+_stats_lock = threading.Lock()
+_stats = collections.Counter()
+_first_chunk = collections.deque(maxlen=STATS_WINDOW)
+
+
+def tts_pipeline_stats():
+    """Process-wide sentence chunk counters and time to the first clip of an utterance."""
+    with _stats_lock:
+        counts = dict(_stats)
+        first = sorted(_first_chunk)
+    return {
+        "workers": TTS_WORKERS,
+        "utterances": counts.get("utterances", 0),
+        "chunks": counts.get("chunks", 0),
+        "failed_chunks": counts.get("failed", 0),
+        "cancelled_chunks": counts.get("cancelled", 0),
+        "first_chunk_ms_p50": round(first[len(first) // 2] * 1000, 1) if first else None,
+    }
+
+
+class SentenceTTSPipeline:
+    """
+    Turns (possibly streamed) text into audio clips one sentence at a time.
+
+    `feed()` accepts text as it arrives; every completed sentence is submitted
+    to the shared TTS pool right away, so synthesis overlaps with the rest of
+    the LLM generation and with each other. `drain()` hands back finished
+    clips strictly in sentence order. Very short sentences are merged into the
+    next one so the player isn't fed a string of tiny clips.
+    """
+
+    def __init__(self, synthesize, voice, min_words=TTS_MIN_CHUNK_WORDS):
+        self._synthesize = synthesize  # (text, voice) -> audio bytes
+        self.voice = voice
+        self.min_words = min_words
+        self._buffer = ""
+        self._carry = ""    # Short sentence waiting to be merged
+        self._pending = collections.deque()  # Futures in sentence order
+        self._closed = False
+        self._started = time.perf_counter()
+        self._first_emitted = False
+        with _stats_lock:
+            _stats["utterances"] += 1
+
+    def _submit(self, chunk):
+        self._pending.append(_executor.submit(self._run, chunk))
+        with _stats_lock:
+            _stats["chunks"] += 1
+
+    def _run(self, chunk):
+        try:
+            return self._synthesize(chunk, self.voice)
+        except Exception as e:
+            print(f"[ERROR] TTS failed for chunk: {e}")
+            with _stats_lock:
+                _stats["failed"] += 1
+            return None
+
+    def _queue_sentence(self, sentence):
+        chunk = f"{self._carry} {sentence}".strip() if self._carry else sentence
+        if len(chunk.split()) < self.min_words:
+            self._carry = chunk
+            return
+        self._carry = ""
+        self._submit(chunk)
+
+    def feed(self, text):
+        """Add streamed text; completed sentences start synthesizing immediately."""
+        if self._closed:
+            raise RuntimeError("feed() after close()")
+        sentences, self._buffer = split_complete_sentences(self._buffer + text)
+        for sentence in sentences:
+            self._queue_sentence(sentence)
+
+    def close(self):
+        """No more text: synthesize whatever is left over."""
+        if self._closed:
+            return
+        self._closed = True
+        rest = f"{self._carry} {self._buffer}".strip()
+        self._carry, self._buffer = "", ""
+        if rest:
+            self._submit(rest)
+
+    def drain(self, wait=False):
+        """
+        Yield finished clips in order. With wait=False stop at the first clip
+        still being synthesized; with wait=True block until all are done.
+        """
+        while self._pending:
+            future = self._pending[0]
+            if not wait and not future.done():
+                return
+            audio = future.result()
+            self._pending.popleft()
+            if audio:
+                self._emitted()
+                yield audio
+
+    async def adrain(self):
+        """drain(wait=True) for coroutines: awaits each clip in order without blocking the loop."""
+        while self._pending:
+            audio = await asyncio.wrap_future(self._pending[0])
+            self._pending.popleft()
+            if audio:
+                self._emitted()
+                yield audio
+
+    def _emitted(self):
+        if not self._first_emitted:
+            self._first_emitted = True
+            with _stats_lock:
+                _first_chunk.append(time.perf_counter() - self._started)
+
+    def cancel(self):
+        """Drop queued chunks, e.g. when the listener went away."""
+        cancelled = 0
+        while self._pending:
+            if self._pending.popleft().cancel():
+                cancelled += 1
+        self._closed = True
+        if cancelled:
+            with _stats_lock:
+                _stats["cancelled"] += cancelled
+
+
+def synthesize_sentences(synthesize, text, voice):
+    """Synthesize complete text sentence by sentence in parallel; returns clips in order."""
+    pipeline = SentenceTTSPipeline(synthesize, voice)
+    pipeline.feed(text)
+    pipeline.close()
+    return list(pipeline.drain(wait=True))
+
+
+async def asynthesize_sentences(synthesize, text, voice):
+    """synthesize_sentences() for coroutines; cancelling it drops the queued sentences."""
+    pipeline = SentenceTTSPipeline(synthesize, voice)
+    try:
+        pipeline.feed(text)
+        pipeline.close()
+        return [audio async for audio in pipeline.adrain()]
+    finally:
+        pipeline.cancel()
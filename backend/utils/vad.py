@@ -0,0 +1,104 @@
+import collections
+import os
+import threading
+
+import numpy as np
+
+# -------------------------
+# ⚙️ VAD Settings
+# -------------------------
+VAD_ENABLED = os.getenv("VAD_ENABLED", "1") != "0"
+VAD_FRAME_MS = int(os.getenv("VAD_FRAME_MS", "30"))
+VAD_MIN_DBFS = float(os.getenv("VAD_MIN_DBFS", "-45"))           # Frames quieter than this are never speech
+VAD_MARGIN_DB = float(os.getenv("VAD_MARGIN_DB", "12"))          # Speech must be this far above the noise floor
+VAD_PAD_MS = int(os.getenv("VAD_PAD_MS", "200"))                 # Kept around each speech region
+VAD_MAX_PAUSE_MS = int(os.getenv("VAD_MAX_PAUSE_MS", "600"))     # Longer pauses are shortened to this
+VAD_MIN_SPEECH_MS = int(os.getenv("VAD_MIN_SPEECH_MS", "250"))   # Less than this in total = silent clip
+
+_stats_lock = threading.Lock()
+_stats = collections.Counter()
+
+
+def vad_stats():
+    """Process-wide clip counts and seconds of audio in/out of the VAD."""
+    with _stats_lock:
+        return {
+            "clips": _stats.get("clips", 0),
+            "silent_rejected": _stats.get("silent", 0),
+            "input_seconds": round(_stats.get("input_seconds", 0.0), 2),
+            "output_seconds": round(_stats.get("output_seconds", 0.0), 2),
+            "trimmed_seconds": round(_stats.get("input_seconds", 0.0) - _stats.get("output_seconds", 0.0), 2),
+        }
+
+
+def _frame_levels(pcm, frame):
+    """RMS level in dBFS of each whole frame of int16 samples."""
+    n = len(pcm) // frame
+    frames = pcm[:n * frame].astype(np.float32).reshape(n, frame) / 32768.0
+    rms = np.sqrt(np.mean(frames * frames, axis=1))
+    return 20 * np.log10(np.maximum(rms, 1e-6))
+
+
+def speech_regions(pcm, sample_rate):
+    """
+    [(start, end)] sample ranges holding speech, padded and with short gaps
+    merged. The threshold adapts to the clip: a margin above its noise floor
+    (10th percentile frame level), never below VAD_MIN_DBFS and never so high
+    that the loudest frames wouldn't count.
+    """
+    frame = max(1, sample_rate * VAD_FRAME_MS // 1000)
+    levels = _frame_levels(pcm, frame)
+    if not len(levels):
+        return []
+    floor, peak = np.percentile(levels, 10), levels.max()
+    threshold = max(VAD_MIN_DBFS, min(floor + VAD_MARGIN_DB, peak - VAD_MARGIN_DB))
+    voiced = np.flatnonzero(levels >= threshold)
+    if not len(voiced):
+        return []
+
+    pad = VAD_PAD_MS * sample_rate // 1000
+    regions = []
+    start = end = voiced[0]
+    for i in voiced[1:]:
+        if (i - end - 1) * frame > 2 * pad:
+            regions.append((start, end))
+            start = i
+        end = i
+    regions.append((start, end))
+    return [(max(0, s * frame - pad), min(len(pcm), (e + 1) * frame + pad)) for s, e in regions]
+
+
+def trim_silence(pcm, sample_rate):
+    """
+    Drop leading/trailing silence and shorten long pauses in int16 mono PCM.
+    Returns the trimmed samples, or None if the clip holds no speech.
+    """
+    input_seconds = len(pcm) / sample_rate
+    if not VAD_ENABLED:
+        return pcm
+
+    regions = speech_regions(pcm, sample_rate)
+    speech = sum(end - start for start, end in regions)
+    if speech * 1000 < VAD_MIN_SPEECH_MS * sample_rate:
+        with _stats_lock:
+            _stats["clips"] += 1
+            _stats["silent"] += 1
+            _stats["input_seconds"] += input_seconds
+        return None
+
+    max_pause = VAD_MAX_PAUSE_MS * sample_rate // 1000
+    pieces, last_end = [], None
+    for start, end in regions:
+        if last_end is not None and start - last_end > max_pause:
+            pieces.append(np.zeros(max_pause, dtype=pcm.dtype))  # Shortened pause
+        elif last_end is not None:
+            pieces.append(pcm[last_end:start])
+        pieces.append(pcm[start:end])
+        last_end = end
+    trimmed = np.concatenate(pieces)
+
+    with _stats_lock:
+        _stats["clips"] += 1
+        _stats["input_seconds"] += input_seconds
+        _stats["output_seconds"] += len(trimmed) / sample_rate
+    return trimmed
@@ -27,6 +27,7 @@ function DiscussionPage() {
   const [isProcessing, setIsProcessing] = useState(false);
   const [textInput, setTextInput] = useState('');
   const [recordingDuration, setRecordingDuration] = useState(0);
+  const [interimText, setInterimText] = useState('');
   const [systemStatus, setSystemStatus] = useState(null);
 
   // INTERRUPT SYSTEM STATE
@@ -112,6 +113,8 @@ function DiscussionPage() {
       const res = await fetch("http://127.0.0.1:8001/health");
       const data = await res.json();
       setSystemStatus(data);
+      // Speech models warm up in the background after a restart; re-check until they settle
+      if (data.models_loading && data.models_loading.length > 0) setTimeout(checkSystemHealth, 2000);
     } catch (err) {
       console.error("❌ Could not check system health:", err);
     }
@@ -217,6 +220,37 @@ function DiscussionPage() {
     }
   };
 
+  // LIVE TRANSCRIPTION: chunks go to /stt_stream while the user talks, the
+  // server pushes interim text back, and at stop only the final result is
+  // awaited. If the socket never opens we fall back to uploading the blob.
+  const openSttStream = () => {
+    const ws = new WebSocket(`ws://127.0.0.1:8001/stt_stream/${simId}`);
+    const session = { ws, streamId: null, final: null };
+    session.finalPromise = new Promise((resolve) => { session.resolveFinal = resolve; });
+    ws.onopen = () => {
+      // Chunks recorded while connecting, in order
+      audioChunksRef.current.forEach(chunk => ws.send(chunk));
+    };
+    ws.onmessage = (event) => {
+      const data = JSON.parse(event.data);
+      if (data.type === 'ready') session.streamId = data.stream_id;
+      else if (data.type === 'partial') setInterimText(data.text);
+      else if (data.type === 'final') session.resolveFinal(data);
+      else if (data.type === 'error') session.resolveFinal(null);
+    };
+    ws.onerror = () => session.resolveFinal(null);
+    ws.onclose = () => session.resolveFinal(null);
+    return session;
+  };
+
+  const finishSttStream = async (session) => {
+    if (!session || session.ws.readyState !== WebSocket.OPEN || !session.streamId) return null;
+    session.ws.send(JSON.stringify({ type: 'stop' }));
+    const timeout = new Promise(resolve => setTimeout(() => resolve(null), 10000));
+    const final = await Promise.race([session.finalPromise, timeout]);
+    return final && final.text ? final : null;
+  };
+
   const startRecording = async () => {
     if (systemStatus && (!systemStatus.whisper_loaded || !systemStatus.ffmpeg_available)) {
       alert("Voice recording not available. Please use text input instead.");
@@ -236,23 +270,34 @@ function DiscussionPage() {
       const mediaRecorder = new MediaRecorder(stream, options);
       mediaRecorderRef.current = mediaRecorder;
       audioChunksRef.current = [];
+      setInterimText('');
+      const session = openSttStream();
 
       mediaRecorder.ondataavailable = (event) => {
-        if (event.data.size > 0) audioChunksRef.current.push(event.data);
+        if (event.data.size > 0) {
+          audioChunksRef.current.push(event.data);
+          if (session.ws.readyState === WebSocket.OPEN) session.ws.send(event.data);
+        }
       };
 
       mediaRecorder.onstop = async () => {
         const audioBlob = new Blob(audioChunksRef.current, { type: 'audio/webm' });
         stream.getTracks().forEach(t => t.stop());
         if (audioBlob.size > 1000) {
-          await submitVoice(audioBlob);
+          setIsProcessing(true);
+          const final = await finishSttStream(session);
+          session.ws.close();
+          setInterimText('');
+          await submitVoice(audioBlob, final ? final.stream_id : null);
         } else {
+          session.ws.close();
+          setInterimText('');
           alert("Recording too short. Please try again or use text input.");
           setIsProcessing(false);
         }
       };
 
-      mediaRecorder.start(1000);
+      mediaRecorder.start(250);
       setIsRecording(true);
       setIsHumanSpeaking(true);
     } catch (error) {
@@ -273,7 +318,7 @@ function DiscussionPage() {
     }
   };
 
-  const submitVoice = async (audioBlob) => {
+  const submitVoice = async (audioBlob, streamId = null) => {
     setIsProcessing(true);
     const formData = new FormData();
     formData.append('audio', audioBlob, 'recording.webm');
@@ -282,9 +327,10 @@ function DiscussionPage() {
         id: `system-${Date.now()}`, agent: 'System',
         text: '⏳ Transcribing your audio...', isSystem: true
       }]);
-      const response = await fetch(`http://127.0.0.1:8001/submit_human_input/${simId}`, {
-        method: 'POST', body: formData
-      });
+      // A finished live stream already holds the transcript; otherwise upload the recording
+      const response = streamId
+        ? await fetch(`http://127.0.0.1:8001/submit_human_input/${simId}?stream_id=${encodeURIComponent(streamId)}`, { method: 'POST' })
+        : await fetch(`http://127.0.0.1:8001/submit_human_input/${simId}`, { method: 'POST', body: formData });
       if (!response.ok) throw new Error(`Server error: ${response.status}`);
       const data = await response.json();
       if (data.success) {
@@ -414,10 +460,20 @@ function DiscussionPage() {
 
           // Await audio completion before processing the next queued event.
           // This is what keeps one agent's audio from overlapping the next.
-          if (data.audio) {
+          // The backend serves clips by URL; inline base64 is kept as a fallback.
+          if (data.audio_url || data.audio) {
             await new Promise((resolve) => {
-              const audio = new Audio(`data:audio/mp3;base64,${data.audio}`);
+              const audio = new Audio(
+                data.audio_url
+                  ? `http://127.0.0.1:8001${data.audio_url}`
+                  : `data:audio/mp3;base64,${data.audio}`
+              );
               const onFinish = () => {
+                // Tell the backend playback really ended so the next turn starts without dead air
+                if (data.utterance_id) {
+                  fetch(`http://127.0.0.1:8001/playback_finished/${simId}?utterance_id=${data.utterance_id}`, { method: "POST" })
+                    .catch(() => {});
+                }
                 // Audio clip ended, clear the speaking flag so the button disables briefly before the next agent, OR passes to human
                 setIsAgentSpeakingBoth(false);
                 setParticipants(prev =>
@@ -437,6 +493,20 @@ function DiscussionPage() {
           }
         }
 
+        else if (data.type === 'error') {
+          // A turn failed (or the human turn timed out); nothing was added to the discussion
+          setIsAgentSpeakingBoth(false);
+          if (data.agent) {
+            setParticipants(prev =>
+              prev.map(p => p.name === data.agent ? { ...p, status: 'waiting' } : p)
+            );
+          }
+          setMessages(prev => [
+            ...prev.filter(m => !(data.agent && m.agent === data.agent && m.isThinking)),
+            { id: `system-${Date.now()}`, agent: 'System', text: `⚠️ ${data.message}`, isSystem: true }
+          ]);
+        }
+
         else if (data.type === 'complete') {
           setRound(data.round);
           setIsAgentSpeakingBoth(false);
@@ -679,6 +749,9 @@ function DiscussionPage() {
               <span style={{ fontWeight: 'bold', color: '#856404', flex: 1 }}>
                 🎤 You can talk now. Recording: {formatDuration(recordingDuration)}
                 <span style={{ fontWeight: 'normal', fontSize: '13px', marginLeft: '8px' }}>(auto-stops after 5s silence)</span>
+                {interimText && (
+                  <span style={{ display: 'block', fontWeight: 'normal', fontStyle: 'italic', marginTop: '4px' }}>“{interimText}”</span>
+                )}
               </span>
               <button onClick={stopRecording} style={{
                 padding: '8px 16px', background: '#dc3545', color: 'white',
@@ -727,6 +800,9 @@ function DiscussionPage() {
               <div style={{ width: '12px', height: '12px', borderRadius: '50%', background: '#dc3545', animation: 'pulse 1s infinite' }} />
               <span style={{ fontWeight: 'bold', color: '#856404' }}>
                 🎤 You can talk now. Recording: {formatDuration(recordingDuration)}
+                {interimText && (
+                  <span style={{ display: 'block', fontWeight: 'normal', fontStyle: 'italic', marginTop: '4px' }}>“{interimText}”</span>
+                )}
               </span>
               <button onClick={stopRecording} style={{
                 marginLeft: 'auto', padding: '8px 16px', background: '#dc3545',